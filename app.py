@@ -1,93 +1,58 @@
 import streamlit as st
-import os, re
-from urllib.parse import urlencode
-import firebase_admin
-from firebase_admin import credentials, auth, firestore
 from dotenv import load_dotenv
 import requests
-from datetime import datetime
+import time
+from modules.recursos import leer_estilos, obtener_repositorio, obtener_config, obtener_cliente_google, registrar_arranque_sesion, iniciar_metricas
+from modules.instrumentacion import iniciar_rerun, finalizar_rerun
+from modules.auth_google import ErrorAutenticacion, registrar_usuario
 #load_dotenv()
 
+# Inicio de la ejecución, para medir el arranque de sesiones nuevas
+inicio_ejecucion = time.perf_counter()
+iniciar_rerun("app")
+
 # Configuración de la página
 st.set_page_config(page_title="Megamoda",page_icon="🛍️",layout="wide",initial_sidebar_state="expanded")
 
 # CSS personalizado para el diseño de lujo
-with open("estilos/css_login.html", "r") as file:
-    html_content = file.read()
-st.markdown(html_content, unsafe_allow_html=True)
+st.markdown(leer_estilos("estilos/css_login.html"), unsafe_allow_html=True)
+
+# Los datos (Firestore o el backend de BACKEND_DATOS) y los secretos se
+# inicializan una vez por proceso y se comparten entre todas las sesiones
+# (ver modules/recursos.py)
+repo = obtener_repositorio()
+iniciar_metricas()
+config = obtener_config()
+cliente_google = obtener_cliente_google()
 
 # Se ejecuta una única vez cuando carga la aplicación
 if 'has_run' not in st.session_state:
     st.session_state.has_run = True
-    service_account_key_path = st.secrets["firebase"]
-    collection_name = "usuarios"
-    st.session_state.redirect_uri = "https://megamodastore.streamlit.app"
-
-    # --- Inicialización de Firebase ADMIN SDK ---
-    if not firebase_admin._apps:
-        service_account_dict = dict(service_account_key_path)
-        cred = credentials.Certificate(service_account_dict)
-        #cred = credentials.Certificate(service_account_key_path)<-- para local
-        firebase_admin.initialize_app(cred)
-    st.session_state.db = firestore.client()
 
-    # Inicia el Cliente de Google
-    #st.session_state.google_client_id = os.getenv("GOOGLE_CLIENT_ID")
-    #st.session_state.google_client_secret = os.getenv("GOOGLE_SECRET_ID")
-    st.session_state.google_client_id = st.secrets["GOOGLE_CLIENT_ID"]
-    st.session_state.google_client_secret = st.secrets["GOOGLE_SECRET_ID"]
-
-    #Inicializa el carrito de compras
+    #Inicializa el carrito de compras (lista + índice por product_id)
     st.session_state.cart = []
+    st.session_state.cart_index = {}
+    registrar_arranque_sesion(inicio_ejecucion)
 
 # Autenticación de Google
 def google_auth():
     # URL de autorización de Google
-    auth_url = "https://accounts.google.com/o/oauth2/v2/auth"
-    params = {
-        "client_id": st.session_state.google_client_id,
-        "redirect_uri": st.session_state.redirect_uri,
-        "response_type": "code",
-        "scope": "openid email profile",
-        "access_type": "offline"
-    }
-    
-    google_auth_url = f"{auth_url}?{urlencode(params)}"
-    return google_auth_url
+    return cliente_google.url_autorizacion()
 
 # Intercambiar código por token
 def exchange_code_for_tokens(auth_code):
-    token_url = "https://oauth2.googleapis.com/token"
-    data = {
-        "client_id": st.session_state.google_client_id,
-        "client_secret": st.session_state.google_client_secret,
-        "code": auth_code,
-        "grant_type": "authorization_code",
-        "redirect_uri": st.session_state.redirect_uri
-    }
-    
-    response = requests.post(token_url, data=data)
-    
-    if response.status_code == 200:
-        return response.json()
-    else:
-        st.error(f"Error al obtener tokens: {response.text}")
+    try:
+        return cliente_google.intercambiar_codigo(auth_code)
+    except (ErrorAutenticacion, requests.RequestException) as e:
+        st.error(str(e))
         return None
 
-# Obtener datos del usuario
-def get_user_info(access_token):
-    user_info_url = "https://www.googleapis.com/oauth2/v2/userinfo"
-    
-    headers = {
-        "Authorization": f"Bearer {access_token}"
-    }
-    
-    response = requests.get(user_info_url, headers=headers)
-    
-    if response.status_code == 200:
-        return response.json()
-    else:
-        st.error(f"Error al obtener información del usuario: {response.text}")
+# Obtener datos del usuario (del id_token; /userinfo solo si hace falta)
+def get_user_info(tokens):
+    try:
+        return cliente_google.obtener_perfil(tokens)
+    except (ErrorAutenticacion, requests.RequestException) as e:
+        st.error(str(e))
         return None
 
 # Verificar o crear usuario en Firebase
@@ -98,58 +63,13 @@ def verificar_o_crear_usuario(code):
         if not tokens:
             return None
         
-        access_token = tokens.get("access_token")
-        if not access_token:
-            st.error("No se pudo obtener el token de acceso")
-            return None
-        
         # 2. Obtener información del usuario de Google
-        user_info = get_user_info(access_token)
+        user_info = get_user_info(tokens)
         if not user_info:
             return None
         
-        # 3. Extraer datos obligatorios
-        google_id = user_info.get('id')
-        email = user_info.get('email')
-        nombre = user_info.get('name')
-        foto = user_info.get('picture')
-        
-        # Verificar que los datos obligatorios estén presentes
-        if not all([google_id, email, nombre, foto]):
-            st.error("Faltan datos obligatorios del usuario de Google")
-            return None
-        
-        # 4. Verificar si el usuario ya existe en Firebase
-        doc_ref = st.session_state.db.collection('usuarios').document(google_id)
-        doc = doc_ref.get()
-        
-        if doc.exists:
-            # Usuario existente - cargar datos y actualizar último login
-            usuario_data = doc.to_dict()
-            usuario_data['last_login'] = datetime.now()
-            usuario_data['uid'] = google_id
-            
-            # Actualizar último login en Firebase
-            doc_ref.update({'last_login': datetime.now()})
-            
-            return usuario_data
-        else:
-            # Usuario nuevo - crear en Firebase
-            nuevo_usuario = {
-                'uid': google_id,
-                'email': email,
-                'nombre': re.sub(r"\s*\(.*?\)", "", nombre).strip(),
-                'foto': foto,
-                'verified_email': user_info.get('verified_email', False),
-                'locale': user_info.get('locale', 'en'),
-                'created_at': datetime.now(),
-                'last_login': datetime.now()
-            }
-            
-            # Guardar en Firebase
-            doc_ref.set(nuevo_usuario)
-            
-            return nuevo_usuario
+        # 3. Crear o actualizar el usuario con una sola escritura
+        return registrar_usuario(repo, user_info)
             
     except Exception as e:
         st.error(f"Error durante la verificación/creación del usuario: {str(e)}")
@@ -173,7 +93,7 @@ def google_login_button():
     #"""Recupera el usuario desde Firestore usando session_id del carrito"""
     #try:
         # Buscar el documento del carrito por session_id
-        #cart_doc = st.session_state.db.collection('carts').document(session_id).get()
+        #cart_doc = db.collection('carts').document(session_id).get()
         
         #if cart_doc.exists:
             #cart_data = cart_doc.to_dict()
@@ -181,7 +101,7 @@ def google_login_button():
             
             #if user_id:
                 # Buscar el usuario en la colección usuarios
-                #user_doc = st.session_state.db.collection('usuarios').document(user_id).get()
+                #user_doc = db.collection('usuarios').document(user_id).get()
                 
                 #if user_doc.exists:
                     #user_data = user_doc.to_dict()
@@ -202,54 +122,38 @@ def google_login_button():
         
 # Función para recuperar el usuario basado en un ID del carrito para usar con Paypal
 def get_user_from_cart(cart_id):
-    """Recupera el usuario desde Firestore usando el ID del carrito"""
+    """Recupera el usuario dueño del carrito (cada carrito se guarda con el id de su usuario)"""
     try:
-        cart_doc = st.session_state.db.collection('carts').document(cart_id).get()
-        if cart_doc.exists:
-            cart_data = cart_doc.to_dict()
-            user_id = cart_data.get('user_id')
-            if user_id:
-                user_doc = st.session_state.db.collection('usuarios').document(user_id).get()
-                if user_doc.exists:
-                    user_data = user_doc.to_dict()
-                    return user_data
+        return repo.obtener_usuario(cart_id)
     except Exception as e:
         st.error(f"Error al recuperar usuario del carrito: {str(e)}")
     return None
 
 def get_user_from_paypal_id(payment_id):
-    """Busca el usuario_id usando el payment_id de PayPal"""
-    db = st.session_state.db
+    """Recupera el usuario desde la copia del checkout guardada con el payment_id de PayPal"""
     try:
-        # Debug: mostrar el token que se está buscando
-        #st.write(f"DEBUG: Buscando payment_id: {payment_id}")
-        
-        doc_ref = db.collection('paypal_payments').document(payment_id)
-        doc = doc_ref.get()
-        
-        if doc.exists:
-            #st.write("DEBUG: Documento de paypal_payments encontrado")
-            data = doc.to_dict()
-            user_id = data.get('user_id')
-            st.write(f"DEBUG: user_id extraído: {user_id}")
-            
-            if user_id:
-                user_doc = db.collection('usuarios').document(user_id).get()
-                if user_doc.exists:
-                    #st.write("DEBUG: Usuario encontrado en colección usuarios")
-                    user_data = user_doc.to_dict()
-                    user_data['uid'] = user_id  # Asegurar que uid esté presente
-                    return user_data
-                else:
-                    st.error(f"Usuario con ID {user_id} no existe en colección usuarios")
-                    return None
-            else:
-                st.error("No se encontró user_id en el documento de paypal_payments")
-                return None
-        else:
+        checkout = repo.obtener_checkout(payment_id)
+        if not checkout:
             st.error(f"No se encontró documento con token: {payment_id}")
             return None
-            
+
+        user_data = checkout.get('usuario')
+        if not user_data:
+            # Pagos guardados antes de incluir el usuario en el checkout
+            user_id = checkout.get('user_id')
+            if not user_id:
+                st.error("No se encontró user_id en el documento de paypal_payments")
+                return None
+            user_data = repo.obtener_usuario(user_id)
+            if user_data is None:
+                st.error(f"Usuario con ID {user_id} no existe en colección usuarios")
+                return None
+            user_data['uid'] = user_id  # Asegurar que uid esté presente
+
+        # compraok.py usa el checkout sin volver a leerlo
+        st.session_state['paypal_checkout'] = checkout
+        return user_data
+
     except Exception as e:
         st.error(f"Error al recuperar el usuario: {e}")
         return None
@@ -342,4 +246,4 @@ else:
         st.session_state.login = True
         st.switch_page('pages/catalogo.py')
 
-
+finalizar_rerun()
@@ -0,0 +1,650 @@
+"""Prueba de carga: muchas sesiones concurrentes contra un worker de Streamlit.
+
+Uso:
+    python -m benchmarks.carga --sesiones 200 --rampa 20
+    python -m benchmarks.carga --sesiones 100 --backend sqlite --tracemalloc
+    python -m benchmarks.carga --latencia-paypal 0.5 --pausa 2 --json carga.json
+
+Levanta el servidor de Streamlit en este proceso (un único worker, como
+`streamlit run app.py`) y simula usuarios que se conectan por WebSocket igual
+que el navegador: vuelven de Google con ?code= (verificar_o_crear_usuario),
+navegan y buscan en el catálogo, agregan al carrito, pagan con PayPal y
+vuelven a compraok en una sesión nueva. Google, PayPal y OpenAI son el
+servidor local de benchmarks/servicios_falsos.py y Firestore el cliente en
+memoria de benchmarks/firestore_falso.py (o el repositorio 'memoria' o
+'sqlite'), todos con latencia configurable.
+
+Informa el throughput (recorridos y acciones por segundo), la latencia de
+cada acción vista por el usuario (p50/p95/p99/máximo), la memoria por sesión
+(RSS del proceso y, con --tracemalloc, lo asignado por Python y dónde) y los
+puntos calientes: un muestreador de pilas cuenta en qué línea de la
+aplicación está cada hilo y si está calculando, esperando un lock o
+esperando a un servicio. Los clientes corren en el mismo proceso que el
+servidor, así que también compiten por el GIL: el throughput medido es una
+cota inferior del de un worker dedicado.
+"""
+import argparse
+import asyncio
+import gc
+import json
+import linecache
+import os
+import random
+import re
+import socket
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from collections import Counter, defaultdict
+from pathlib import Path
+
+import websockets
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+from streamlit.runtime import Runtime
+from streamlit.web import bootstrap
+from streamlit.web.server import Server
+
+from benchmarks.firestore_falso import FirestoreFalso
+from benchmarks.paginas import RAIZ, productos_de_prueba
+from benchmarks.servicios_falsos import ServiciosFalsos
+from modules import recursos
+from modules.catalogo_cache import catalogo
+from modules.instrumentacion import metricas
+from modules.repositorio import crear_repositorio
+
+# Estados de script_finished con los que termina lo que pidió el cliente
+# (FINISHED_EARLY_FOR_RERUN sigue con otra ejecución: st.rerun, st.switch_page)
+FINALES = {
+    ForwardMsg.FINISHED_SUCCESSFULLY,
+    ForwardMsg.FINISHED_FRAGMENT_RUN_SUCCESSFULLY,
+    ForwardMsg.FINISHED_WITH_COMPILE_ERROR,
+}
+
+BUSQUEDAS = ("vestido negro", "zapatillas", "bolso de cuero", "camiseta blanca", "chaqueta denim", "seda")
+
+# URL de aprobación de PayPal en el <meta refresh> del carrito
+PATRON_PAGO = re.compile(r"token=EC-([\w-]+)")
+
+# Clasificación de las pilas muestreadas
+PATRON_LOCK = re.compile(r"\block\b|_lock\b|\.acquire\(|\.wait\(|\.result\(|\.join\(")
+MODULOS_ESPERA = ("threading.py", "queue.py", os.path.join("concurrent", "futures"))
+MODULOS_RED = ("socket.py", "ssl.py", "selectors.py", os.path.join("http", "client.py"), "urllib3", "requests", "httpx")
+APP = str(RAIZ)
+BENCHMARKS = str(RAIZ / "benchmarks")
+
+
+class ErrorCarga(Exception):
+    """La página mostró una excepción o no apareció lo que el usuario necesitaba"""
+
+
+class Sesion:
+    """Una pestaña del navegador: un WebSocket con su propia sesión de Streamlit"""
+
+    def __init__(self, url, timeout):
+        self.url = url
+        self.timeout = timeout
+        self.ws = None
+        self.pagina = ""
+        self.query_string = ""
+        # delta_path -> (elemento, fragment_id) de lo que hay en pantalla
+        self.elementos = {}
+        # widget id -> WidgetState de los widgets que cambió el usuario
+        self.valores = {}
+        # fragment_id -> segundos entre reruns (st.fragment(run_every=...))
+        self.automaticos = {}
+
+    async def abrir(self, query_string=""):
+        self.ws = await websockets.connect(
+            self.url, subprotocols=["streamlit"], max_size=None,
+            open_timeout=self.timeout, ping_interval=None,
+        )
+        self.query_string = query_string
+        await self.ejecutar()
+
+    async def cerrar(self):
+        if self.ws is not None:
+            await self.ws.close()
+            self.ws = None
+
+    async def ejecutar(self, disparador=None, fragmento=""):
+        """Pide un rerun (con el clic de un botón) y espera a que termine"""
+        mensaje = BackMsg()
+        estado = mensaje.rerun_script
+        estado.query_string = self.query_string
+        estado.page_script_hash = self.pagina
+        estado.widget_states.widgets.extend(self.valores.values())
+        if disparador:
+            clic = estado.widget_states.widgets.add()
+            clic.id = disparador
+            clic.trigger_value = True
+        if fragmento:
+            estado.fragment_id = fragmento
+        await self.ws.send(mensaje.SerializeToString())
+        await asyncio.wait_for(self._esperar_fin(), self.timeout)
+
+    async def _esperar_fin(self):
+        while True:
+            mensaje = ForwardMsg()
+            mensaje.ParseFromString(await self.ws.recv())
+            tipo = mensaje.WhichOneof('type')
+            if tipo == 'new_session':
+                fragmentos = set(mensaje.new_session.fragment_ids_this_run)
+                if not fragmentos:
+                    self.pagina = mensaje.new_session.page_script_hash
+                    self.elementos = {}
+                # Como el navegador: los reruns automáticos siguen mientras
+                # se vuelva a ejecutar el fragmento que los pidió
+                if not fragmentos & set(self.automaticos):
+                    self.automaticos = {}
+            elif tipo == 'auto_rerun':
+                self.automaticos[mensaje.auto_rerun.fragment_id] = mensaje.auto_rerun.interval
+            elif tipo == 'page_info_changed':
+                self.query_string = mensaje.page_info_changed.query_string
+            elif tipo == 'delta' and mensaje.delta.WhichOneof('type') == 'new_element':
+                elemento = mensaje.delta.new_element
+                if elemento.WhichOneof('type') == 'exception':
+                    raise ErrorCarga(elemento.exception.message)
+                self.elementos[tuple(mensaje.metadata.delta_path)] = (elemento, mensaje.delta.fragment_id)
+            elif tipo == 'script_finished' and mensaje.script_finished in FINALES:
+                if mensaje.script_finished == ForwardMsg.FINISHED_WITH_COMPILE_ERROR:
+                    raise ErrorCarga("error de compilación en la página")
+                return
+
+    def _de_tipo(self, tipo):
+        for elemento, fragmento in list(self.elementos.values()):
+            if elemento.WhichOneof('type') == tipo:
+                yield getattr(elemento, tipo), fragmento
+
+    def botones(self, prefijo):
+        """(id, fragment_id) de los botones cuya key empieza con prefijo"""
+        # Los ids de los widgets con key terminan en "-<key>"
+        return [
+            (boton.id, fragmento) for boton, fragmento in self._de_tipo('button')
+            if boton.id.split("-", 2)[-1].startswith(prefijo)
+        ]
+
+    def textos(self):
+        return [m.body for m, _ in self._de_tipo('markdown')] + [a.body for a, _ in self._de_tipo('alert')]
+
+    async def clic(self, boton):
+        widget_id, fragmento = boton
+        await self.ejecutar(disparador=widget_id, fragmento=fragmento)
+
+    async def escribir(self, texto):
+        """Escribe en el primer campo de texto (el buscador) y confirma con Enter"""
+        campos = list(self._de_tipo('text_input'))
+        if not campos:
+            raise ErrorCarga("no hay campo de búsqueda")
+        valor = BackMsg().rerun_script.widget_states.widgets.add()
+        valor.id = campos[0][0].id
+        valor.string_value = texto
+        self.valores[valor.id] = valor
+        await self.ejecutar(fragmento=campos[0][1])
+
+    async def pausar(self, segundos):
+        """Tiempo de lectura del usuario; mientras tanto corren los reruns automáticos"""
+        fin = time.perf_counter() + segundos
+        while True:
+            restante = fin - time.perf_counter()
+            if not self.automaticos or restante <= 0:
+                break
+            fragmento, intervalo = next(iter(self.automaticos.items()))
+            if intervalo > restante:
+                break
+            await asyncio.sleep(intervalo)
+            await self.ejecutar(fragmento=fragmento)
+        await asyncio.sleep(max(0.0, fin - time.perf_counter()))
+
+
+class Resultados:
+    """Latencias por acción, errores y sesiones abiertas durante la prueba"""
+
+    def __init__(self):
+        self.latencias = defaultdict(list)
+        self.errores = Counter()
+        self.recorridos = 0
+        self.abiertas = 0
+        self.pico_abiertas = 0
+
+    def abrir(self):
+        self.abiertas += 1
+        self.pico_abiertas = max(self.pico_abiertas, self.abiertas)
+
+    def cerrar(self):
+        self.abiertas -= 1
+
+
+async def recorrido(usuario, url, resultados, args, azar):
+    """Un comprador de punta a punta; cada acción se mide como la ve el usuario"""
+    paso = "conexión"
+
+    async def medir(nombre, corrutina):
+        nonlocal paso
+        paso = nombre
+        inicio = time.perf_counter()
+        await corrutina
+        resultados.latencias[nombre].append(time.perf_counter() - inicio)
+
+    async def pensar(sesion):
+        if args.pausa:
+            await sesion.pausar(azar.expovariate(1 / args.pausa))
+
+    tienda = Sesion(url, args.timeout)
+    confirmacion = Sesion(url, args.timeout)
+    resultados.abrir()
+    try:
+        # Vuelve de Google con ?code= y termina en el catálogo (st.switch_page)
+        await medir("login con Google", tienda.abrir(f"code=carga-{usuario}"))
+        if not tienda.botones("add_"):
+            raise ErrorCarga("el login no terminó en el catálogo")
+        await pensar(tienda)
+
+        if tienda.botones("cargar_mas"):
+            await medir("cargar más productos", tienda.clic(tienda.botones("cargar_mas")[0]))
+            await pensar(tienda)
+        await medir("buscar", tienda.escribir(azar.choice(BUSQUEDAS)))
+        await pensar(tienda)
+        await medir("limpiar búsqueda", tienda.escribir(""))
+        await pensar(tienda)
+
+        for boton in azar.sample(tienda.botones("add_"), 2):
+            await medir("agregar al carrito", tienda.clic(boton))
+            await pensar(tienda)
+
+        pagar = tienda.botones("process_order_paypal")
+        if not pagar:
+            raise ErrorCarga("el carrito no muestra el botón de pago")
+        await medir("pagar con PayPal", tienda.clic(pagar[0]))
+        pagos = [m.group(1) for texto in tienda.textos() for m in PATRON_PAGO.finditer(texto)]
+        if not pagos:
+            raise ErrorCarga("no se redirigió a PayPal")
+        await tienda.cerrar()
+        payment_id = pagos[-1]
+
+        # PayPal redirige a app.py en otra pestaña, que pasa a compraok.py
+        await medir("volver de PayPal y confirmar", confirmacion.abrir(
+            f"paymentId={payment_id}&token=EC-{payment_id}&PayerID=CARGA{usuario}"
+        ))
+        if not any("Número de orden" in texto for texto in confirmacion.textos()):
+            raise ErrorCarga("compraok no mostró el número de orden")
+        resultados.recorridos += 1
+    except (ErrorCarga, asyncio.TimeoutError, websockets.ConnectionClosed, OSError) as e:
+        resultados.errores[f"{paso}: {type(e).__name__}: {str(e)[:80]}"] += 1
+    finally:
+        await tienda.cerrar()
+        await confirmacion.cerrar()
+        resultados.cerrar()
+
+
+async def generar_carga(url, args, resultados):
+    """Lanza los usuarios repartidos a lo largo de la rampa y espera a que terminen"""
+    async def usuario(i):
+        if args.rampa:
+            await asyncio.sleep(args.rampa * i / args.sesiones)
+        await recorrido(i, url, resultados, args, random.Random(args.semilla * 100003 + i))
+
+    await asyncio.gather(*(usuario(i) for i in range(args.sesiones)))
+
+
+class ServidorStreamlit:
+    """El servidor real de Streamlit (HTTP, WebSocket y runtime) en un hilo de este proceso"""
+
+    def __init__(self, secretos, puerto=0):
+        self.secretos = secretos
+        self.puerto = puerto or _puerto_libre()
+        self._servidor = None
+        self._loop = None
+        self._listo = threading.Event()
+        self._error = None
+
+    @property
+    def url(self):
+        return f"ws://127.0.0.1:{self.puerto}/_stcore/stream"
+
+    def iniciar(self):
+        carpeta = tempfile.mkdtemp(prefix="megamoda-carga-")
+        ruta_secretos = os.path.join(carpeta, "secrets.toml")
+        with open(ruta_secretos, "w", encoding="utf-8") as archivo:
+            for clave, valor in self.secretos.items():
+                archivo.write(f"{clave} = {json.dumps(valor)}\n")
+
+        os.chdir(RAIZ)  # las páginas leen estilos/ con rutas relativas
+        bootstrap.load_config_options({
+            'server_port': self.puerto,
+            'server_address': "127.0.0.1",
+            'server_headless': True,
+            'server_fileWatcherType': "none",
+            'global_developmentMode': False,
+            'browser_gatherUsageStats': False,
+            'secrets_files': [ruta_secretos],
+            'logger_level': "error",
+        })
+        threading.Thread(target=self._correr, name="servidor-streamlit", daemon=True).start()
+        self._listo.wait()
+        if self._error is not None:
+            raise self._error
+        return self
+
+    def _correr(self):
+        async def principal():
+            self._loop = asyncio.get_running_loop()
+            self._servidor = Server(str(RAIZ / "app.py"), False)
+            try:
+                await self._servidor.start()
+            except Exception as e:
+                self._error = e
+                return
+            finally:
+                self._listo.set()
+            await self._servidor.stopped
+
+        asyncio.run(principal())
+
+    def sesiones(self):
+        """Sesiones que guarda el runtime, incluidas las desconectadas que esperan su TTL"""
+        gestor = getattr(Runtime.instance(), '_session_mgr', None)
+        return gestor.num_sessions() if gestor is not None else 0
+
+    def detener(self):
+        if self._loop is not None and self._servidor is not None:
+            self._loop.call_soon_threadsafe(self._servidor.stop)
+
+
+def _puerto_libre():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _rss():
+    """Memoria residente del proceso en bytes (Linux; 0 si no se puede leer)"""
+    try:
+        with open("/proc/self/statm") as archivo:
+            return int(archivo.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+class Monitor:
+    """Muestrea memoria, sesiones y las pilas de todos los hilos en segundo plano"""
+
+    def __init__(self, servidor, resultados, intervalo, top_memoria=0):
+        self.servidor = servidor
+        self.resultados = resultados
+        self.intervalo = intervalo
+        self.top_memoria = top_memoria
+        self.muestras = 0
+        # (clase, archivo:línea) -> muestras; clase es 'cpu', 'lock' o 'servicio'
+        self.pilas = Counter()
+        self.memoria = {}
+        self._base = None
+        self._pico = None
+        self._detener = threading.Event()
+        self._hilo = None
+
+    def iniciar(self):
+        gc.collect()
+        self._base = self._medir_memoria()
+        if tracemalloc.is_tracing():
+            self._base['foto'] = _foto()
+        self._pico = dict(self._base, foto=None)
+        self._hilo = threading.Thread(target=self._correr, name="monitor-carga", daemon=True)
+        self._hilo.start()
+        return self
+
+    def detener(self):
+        self._detener.set()
+        self._hilo.join()
+        base, pico = self._base, self._pico
+        sesiones = max(pico['sesiones'] - base['sesiones'], 1)
+        self.memoria = {
+            'rss_base_mb': base['rss'] / 2**20,
+            'rss_pico_mb': pico['rss'] / 2**20,
+            'sesiones_en_el_pico': pico['sesiones'],
+            'kb_por_sesion_rss': (pico['rss'] - base['rss']) / sesiones / 1024,
+        }
+        if tracemalloc.is_tracing():
+            self.memoria['kb_por_sesion_python'] = (pico['python'] - base['python']) / sesiones / 1024
+            self.memoria['asignaciones'] = [
+                {'linea': str(diferencia.traceback[0]), 'kb': diferencia.size_diff / 1024,
+                 'bloques': diferencia.count_diff}
+                for diferencia in pico['foto'].compare_to(base['foto'], 'lineno')[:self.top_memoria]
+            ]
+
+    def _medir_memoria(self):
+        medida = {'rss': _rss(), 'sesiones': self.servidor.sesiones(), 'python': 0, 'foto': None}
+        if tracemalloc.is_tracing():
+            medida['python'] = tracemalloc.get_traced_memory()[0]
+        return medida
+
+    def _correr(self):
+        proximo_memoria = 0.0
+        while not self._detener.wait(self.intervalo):
+            self._muestrear_pilas()
+            ahora = time.perf_counter()
+            if ahora >= proximo_memoria:
+                proximo_memoria = ahora + 0.25
+                medida = self._medir_memoria()
+                if medida['sesiones'] >= self._pico['sesiones'] and medida['rss'] >= self._pico['rss']:
+                    if tracemalloc.is_tracing():
+                        medida['foto'] = _foto()
+                        # La foto es costosa: no repetirla en cada muestra del pico
+                        proximo_memoria = time.perf_counter() + 2.0
+                    self._pico = medida
+        if tracemalloc.is_tracing() and self._pico['foto'] is None:
+            self._pico['foto'] = _foto()
+
+    def _muestrear_pilas(self):
+        propio = threading.get_ident()
+        for ident, frame in sys._current_frames().items():
+            if ident == propio:
+                continue
+            clase, sitio = _clasificar(frame)
+            if sitio is not None:
+                self.pilas[(clase, sitio)] += 1
+                self.muestras += 1
+
+    def puntos_calientes(self, cantidad):
+        """Las líneas de la aplicación con más muestras de cada clase"""
+        por_clase = defaultdict(list)
+        for (clase, sitio), muestras in self.pilas.most_common():
+            if len(por_clase[clase]) < cantidad:
+                por_clase[clase].append({'linea': sitio, 'muestras': muestras,
+                                         'porcentaje': 100 * muestras / max(self.muestras, 1)})
+        return dict(por_clase)
+
+
+def _foto():
+    """Asignaciones vivas, sin las del propio medidor (cliente, muestreador, linecache)"""
+    return tracemalloc.take_snapshot().filter_traces([
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, linecache.__file__),
+        tracemalloc.Filter(False, __file__),
+    ])
+
+
+def _es_app(archivo):
+    return archivo.startswith(APP) and not archivo.startswith(BENCHMARKS)
+
+
+def _clasificar(frame):
+    """('cpu'|'lock'|'servicio', archivo:línea de la app) de la pila de un hilo
+
+    La clase sale del frame más interno: un lock o una espera de threading,
+    queue o concurrent.futures es 'lock' (también el del Firestore en
+    memoria, que serializa las transacciones con un lock global); los
+    sockets, HTTP y la latencia de los servicios simulados son 'servicio'.
+    El sitio es la línea más interna del código de la tienda (app.py,
+    pages/, modules/); los hilos que no están ejecutando código de la
+    tienda no cuentan.
+    """
+    interno = frame.f_code.co_filename
+    linea = linecache.getline(interno, frame.f_lineno or 0)
+    if any(m in interno for m in MODULOS_ESPERA) or PATRON_LOCK.search(linea):
+        clase = 'lock'
+    elif interno.startswith(BENCHMARKS) or any(m in interno for m in MODULOS_RED) or "sleep(" in linea:
+        clase = 'servicio'
+    else:
+        clase = 'cpu'
+    while frame is not None:
+        archivo = frame.f_code.co_filename
+        if _es_app(archivo):
+            return clase, f"{os.path.relpath(archivo, APP)}:{frame.f_lineno}"
+        frame = frame.f_back
+    return clase, None
+
+
+def _cuantil(valores, q):
+    return valores[min(len(valores) - 1, int(q * len(valores)))] if valores else 0.0
+
+
+def resumen(resultados, segundos, monitor, args):
+    acciones = []
+    for nombre, valores in resultados.latencias.items():
+        valores = sorted(valores)
+        acciones.append({
+            'accion': nombre,
+            'cantidad': len(valores),
+            'p50_ms': _cuantil(valores, 0.5) * 1000,
+            'p95_ms': _cuantil(valores, 0.95) * 1000,
+            'p99_ms': _cuantil(valores, 0.99) * 1000,
+            'max_ms': valores[-1] * 1000,
+        })
+    total_acciones = sum(a['cantidad'] for a in acciones)
+    return {
+        'config': vars(args),
+        'segundos': segundos,
+        'recorridos': resultados.recorridos,
+        'recorridos_por_s': resultados.recorridos / segundos,
+        'acciones_por_s': total_acciones / segundos,
+        'pico_sesiones_abiertas': resultados.pico_abiertas,
+        'errores': dict(resultados.errores),
+        'acciones': acciones,
+        'servidor': metricas.percentiles('accion'),
+        'memoria': monitor.memoria,
+        'puntos_calientes': monitor.puntos_calientes(args.top),
+        'muestras_pilas': monitor.muestras,
+    }
+
+
+def imprimir(informe):
+    print(f"\n{informe['config']['sesiones']} usuarios, {informe['recorridos']} recorridos completos "
+          f"en {informe['segundos']:.1f}s (pico de {informe['pico_sesiones_abiertas']} sesiones abiertas)")
+    print(f"Throughput: {informe['recorridos_por_s']:.2f} recorridos/s, {informe['acciones_por_s']:.2f} acciones/s")
+
+    print(f"\n{'acción (vista por el usuario)':<32}{'n':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'máx ms':>10}")
+    for a in informe['acciones']:
+        print(f"{a['accion']:<32}{a['cantidad']:>6}{a['p50_ms']:>10.1f}{a['p95_ms']:>10.1f}"
+              f"{a['p99_ms']:>10.1f}{a['max_ms']:>10.1f}")
+
+    if informe['servidor']:
+        print(f"\n{'rerun en el servidor':<32}{'n':>6}{'p50 ms':>10}{'p95 ms':>10}{'máx ms':>10}")
+        for a in informe['servidor']:
+            print(f"{a['nombre']:<32}{a['cantidad']:>6}{a['p50_ms']:>10.1f}{a['p95_ms']:>10.1f}{a['max_ms']:>10.1f}")
+
+    memoria = informe['memoria']
+    print(f"\nMemoria: RSS {memoria['rss_base_mb']:.1f} MB -> {memoria['rss_pico_mb']:.1f} MB con "
+          f"{memoria['sesiones_en_el_pico']} sesiones en el runtime, "
+          f"~{memoria['kb_por_sesion_rss']:.0f} KB por sesión")
+    if 'kb_por_sesion_python' in memoria:
+        print(f"Asignado por Python: ~{memoria['kb_por_sesion_python']:.0f} KB por sesión; mayores aumentos:")
+        for a in memoria['asignaciones']:
+            print(f"  {a['kb']:>10.1f} KB {a['bloques']:>8} bloques  {a['linea']}")
+
+    titulos = {'cpu': "ejecutando", 'lock': "esperando un lock", 'servicio': "esperando a un servicio"}
+    for clase, titulo in titulos.items():
+        filas = informe['puntos_calientes'].get(clase)
+        if filas:
+            print(f"\nPuntos calientes ({titulo}), % de {informe['muestras_pilas']} muestras:")
+            for f in filas:
+                print(f"  {f['porcentaje']:>6.1f}%  {f['linea']}")
+
+    if informe['errores']:
+        print("\n❌ Errores:")
+        for error, cantidad in sorted(informe['errores'].items(), key=lambda e: -e[1]):
+            print(f"  {cantidad:>5}  {error}")
+
+
+def preparar_datos(args):
+    productos = productos_de_prueba(args.productos, args.semilla)
+    if args.backend == 'firestore':
+        db = FirestoreFalso(latencia=args.latencia_firestore)
+        db.cargar('products', productos)
+        recursos.usar_db(db)
+    else:
+        ruta = os.path.join(tempfile.mkdtemp(prefix="megamoda-carga-"), "megamoda.db")
+        repo = crear_repositorio(args.backend, ruta=ruta)
+        repo.cargar('products', dict(productos))
+        recursos.usar_repositorio(repo)
+    catalogo.invalidar()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sesiones", type=int, default=100, help="usuarios concurrentes a simular")
+    parser.add_argument("--rampa", type=float, default=10.0, help="segundos en los que se reparten las llegadas")
+    parser.add_argument("--pausa", type=float, default=1.0,
+                        help="segundos medios que el usuario mira la página entre acciones (0 = sin pausa)")
+    parser.add_argument("--productos", type=int, default=1000, help="productos del catálogo")
+    parser.add_argument("--backend", choices=("firestore", "memoria", "sqlite"), default="firestore",
+                        help="'firestore' es el cliente en memoria con --latencia-firestore")
+    parser.add_argument("--latencia-firestore", type=float, default=0.01, help="segundos por operación")
+    parser.add_argument("--latencia-google", type=float, default=0.05, help="segundos por llamada")
+    parser.add_argument("--latencia-paypal", type=float, default=0.2, help="segundos por llamada")
+    parser.add_argument("--latencia-openai", type=float, default=0.5, help="segundos por llamada")
+    parser.add_argument("--recomendador", choices=("local", "llm"), default="local",
+                        help="RECOMENDADOR_MODO de la aplicación")
+    parser.add_argument("--timeout", type=float, default=120.0, help="segundos máximos por acción")
+    parser.add_argument("--muestreo-ms", type=float, default=5.0, help="intervalo del muestreador de pilas")
+    parser.add_argument("--tracemalloc", action="store_true",
+                        help="medir la memoria asignada por Python y sus líneas (más lento)")
+    parser.add_argument("--top", type=int, default=10, help="filas de puntos calientes y de memoria")
+    parser.add_argument("--semilla", type=int, default=0)
+    parser.add_argument("--json", help="guardar el informe en este archivo")
+    args = parser.parse_args(argv)
+
+    servicios = ServiciosFalsos({
+        'google': args.latencia_google,
+        'paypal': args.latencia_paypal,
+        'openai': args.latencia_openai,
+    }).iniciar()
+    preparar_datos(args)
+    servidor = ServidorStreamlit({**servicios.secretos(), 'RECOMENDADOR_MODO': args.recomendador}).iniciar()
+    try:
+        # Un recorrido previo carga los recursos del proceso (catálogo, índice,
+        # clientes) para que la memoria base no cuente el arranque en frío
+        calentamiento = Resultados()
+        asyncio.run(recorrido("calentamiento", servidor.url, calentamiento, argparse.Namespace(**{
+            **vars(args), 'pausa': 0,
+        }), random.Random(args.semilla)))
+        if calentamiento.errores:
+            print("❌ Falló el recorrido de calentamiento:", *calentamiento.errores, sep="\n  ")
+            return 1
+
+        if args.tracemalloc:
+            tracemalloc.start()
+        metricas.reiniciar()
+        resultados = Resultados()
+        monitor = Monitor(servidor, resultados, args.muestreo_ms / 1000, args.top).iniciar()
+        inicio = time.perf_counter()
+        asyncio.run(generar_carga(servidor.url, args, resultados))
+        segundos = time.perf_counter() - inicio
+        monitor.detener()
+        tracemalloc.stop()
+    finally:
+        servidor.detener()
+        servicios.detener()
+        recursos.usar_db(None)
+
+    informe = resumen(resultados, segundos, monitor, args)
+    imprimir(informe)
+    if args.json:
+        Path(args.json).write_text(json.dumps(informe, indent=2, ensure_ascii=False))
+    return 1 if informe['errores'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,408 @@
+"""Firestore en memoria para benchmarks y pruebas locales.
+
+Implementa el subconjunto de la API de google-cloud-firestore que usa la
+tienda (colecciones, documentos, consultas con cursores, lotes,
+transacciones, get_all y transformaciones como Increment) y cuenta las
+lecturas y escrituras de documentos igual que las factura Firestore.
+"""
+import copy
+import itertools
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+
+from google.api_core import exceptions
+from google.cloud.firestore_v1 import transforms
+from google.cloud.firestore_v1.field_path import FieldPath
+
+
+class Contadores:
+    """Lecturas/escrituras de documentos acumuladas (thread-safe)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.lecturas = 0
+        self.escrituras = 0
+        self.borrados = 0
+
+    def sumar(self, lecturas=0, escrituras=0, borrados=0):
+        with self._lock:
+            self.lecturas += lecturas
+            self.escrituras += escrituras
+            self.borrados += borrados
+
+    def reiniciar(self):
+        with self._lock:
+            self.lecturas = self.escrituras = self.borrados = 0
+
+    def como_dict(self):
+        return {'lecturas': self.lecturas, 'escrituras': self.escrituras, 'borrados': self.borrados}
+
+
+class FirestoreFalso:
+    """Cliente de Firestore en memoria con latencia configurable por operación"""
+
+    def __init__(self, latencia=0.0):
+        self.latencia = latencia
+        self.contadores = Contadores()
+        self._lock = threading.RLock()
+        # ruta completa del documento -> (datos, create_time)
+        self._docs = {}
+
+    # --- API pública del cliente ---
+    def collection(self, nombre):
+        return ColeccionFalsa(self, nombre)
+
+    def document(self, ruta):
+        partes = ruta.split('/')
+        return DocumentoFalso(self, '/'.join(partes[:-1]), partes[-1])
+
+    def batch(self):
+        return LoteFalso(self)
+
+    def transaction(self, **kwargs):
+        return TransaccionFalsa(self, **kwargs)
+
+    def get_all(self, referencias, transaction=None):
+        self._esperar()
+        referencias = list(referencias)
+        with self._lock:
+            snaps = [ref._snapshot() for ref in referencias]
+        self.contadores.sumar(lecturas=max(1, len(snaps)))
+        return iter(snaps)
+
+    # --- utilidades para benchmarks ---
+    def cargar(self, coleccion, documentos):
+        """Inserta documentos sin contar escrituras ni esperar latencia"""
+        with self._lock:
+            for doc_id, datos in documentos:
+                self._docs[f"{coleccion}/{doc_id}"] = (copy.deepcopy(datos), _ahora())
+
+    def datos(self, coleccion):
+        prefijo = coleccion + '/'
+        with self._lock:
+            return {
+                ruta[len(prefijo):]: copy.deepcopy(datos)
+                for ruta, (datos, _) in self._docs.items()
+                if ruta.startswith(prefijo) and '/' not in ruta[len(prefijo):]
+            }
+
+    def _esperar(self):
+        if self.latencia:
+            time.sleep(self.latencia)
+
+    def _aplicar(self, escrituras):
+        """Aplica atómicamente una lista de escrituras pendientes"""
+        with self._lock:
+            for op, ref, datos, opciones in escrituras:
+                if op == 'create' and ref._ruta in self._docs:
+                    raise Conflicto(f"El documento {ref._ruta} ya existe")
+                if op == 'update' and ref._ruta not in self._docs:
+                    raise NoEncontrado(f"No existe el documento {ref._ruta}")
+            for op, ref, datos, opciones in escrituras:
+                ref._escribir(op, datos, **opciones)
+        borrados = sum(1 for e in escrituras if e[0] == 'delete')
+        self.contadores.sumar(escrituras=len(escrituras) - borrados, borrados=borrados)
+
+
+class Conflicto(exceptions.AlreadyExists):
+    pass
+
+
+class NoEncontrado(exceptions.NotFound):
+    pass
+
+
+def _ahora():
+    return datetime.now(timezone.utc)
+
+
+def _partes_campo(campo):
+    if isinstance(campo, FieldPath):
+        return list(campo.parts)
+    return FieldPath.from_string(campo).parts if '`' in campo else campo.split('.')
+
+
+def _leer_campo(datos, campo):
+    actual = datos
+    for parte in _partes_campo(campo):
+        if not isinstance(actual, dict) or parte not in actual:
+            return None
+        actual = actual[parte]
+    return actual
+
+
+def _resolver(valor, anterior):
+    """Convierte centinelas/transformaciones en valores concretos"""
+    from google.cloud.firestore_v1 import SERVER_TIMESTAMP
+    if valor is SERVER_TIMESTAMP:
+        return _ahora()
+    if isinstance(valor, transforms.Increment):
+        return (anterior or 0) + valor.value
+    if isinstance(valor, transforms.ArrayUnion):
+        base = list(anterior or [])
+        return base + [v for v in valor.values if v not in base]
+    if isinstance(valor, transforms.ArrayRemove):
+        return [v for v in (anterior or []) if v not in valor.values]
+    if isinstance(valor, dict):
+        previo = anterior if isinstance(anterior, dict) else {}
+        return {k: _resolver(v, previo.get(k)) for k, v in valor.items()}
+    return copy.deepcopy(valor)
+
+
+def _fusionar(destino, origen):
+    from google.cloud.firestore_v1 import DELETE_FIELD
+    for clave, valor in origen.items():
+        if valor is DELETE_FIELD:
+            destino.pop(clave, None)
+        elif isinstance(valor, dict) and isinstance(destino.get(clave), dict):
+            _fusionar(destino[clave], valor)
+        else:
+            destino[clave] = _resolver(valor, destino.get(clave))
+
+
+class SnapshotFalso:
+    def __init__(self, referencia, datos, create_time=None):
+        self.reference = referencia
+        self.id = referencia.id
+        self._datos = datos
+        self.exists = datos is not None
+        self.create_time = create_time
+        self.update_time = create_time
+
+    def to_dict(self):
+        return copy.deepcopy(self._datos) if self._datos is not None else None
+
+    def get(self, campo):
+        return _leer_campo(self._datos or {}, campo)
+
+
+class DocumentoFalso:
+    def __init__(self, cliente, coleccion, doc_id):
+        self._cliente = cliente
+        self.id = doc_id
+        self._coleccion = coleccion
+        self._ruta = f"{coleccion}/{doc_id}"
+        self.path = self._ruta
+
+    def collection(self, nombre):
+        return ColeccionFalsa(self._cliente, f"{self._ruta}/{nombre}")
+
+    def _snapshot(self):
+        datos = self._cliente._docs.get(self._ruta)
+        if datos is None:
+            return SnapshotFalso(self, None)
+        return SnapshotFalso(self, copy.deepcopy(datos[0]), datos[1])
+
+    def get(self, field_paths=None, transaction=None):
+        self._cliente._esperar()
+        with self._cliente._lock:
+            snap = self._snapshot()
+        self._cliente.contadores.sumar(lecturas=1)
+        return snap
+
+    def set(self, datos, merge=False):
+        self._cliente._esperar()
+        self._cliente._aplicar([('set', self, datos, {'merge': merge})])
+
+    def create(self, datos):
+        self._cliente._esperar()
+        self._cliente._aplicar([('create', self, datos, {})])
+
+    def update(self, datos):
+        self._cliente._esperar()
+        self._cliente._aplicar([('update', self, datos, {})])
+
+    def delete(self):
+        self._cliente._esperar()
+        self._cliente._aplicar([('delete', self, None, {})])
+
+    def _escribir(self, op, datos, merge=False):
+        docs = self._cliente._docs
+        if op == 'delete':
+            docs.pop(self._ruta, None)
+            return
+        previo, creado = docs.get(self._ruta, (None, None))
+        if op in ('set', 'create') and not merge:
+            nuevo = {}
+            _fusionar(nuevo, datos)
+        elif op == 'set':
+            nuevo = copy.deepcopy(previo) if previo else {}
+            _fusionar(nuevo, datos)
+        else:
+            nuevo = copy.deepcopy(previo)
+            for campo, valor in datos.items():
+                partes = _partes_campo(campo)
+                destino = nuevo
+                for parte in partes[:-1]:
+                    destino = destino.setdefault(parte, {})
+                _fusionar(destino, {partes[-1]: valor})
+        docs[self._ruta] = (nuevo, creado or _ahora())
+
+
+_OPERADORES = {
+    '==': lambda a, b: a == b,
+    '!=': lambda a, b: a != b,
+    '<': lambda a, b: a is not None and a < b,
+    '<=': lambda a, b: a is not None and a <= b,
+    '>': lambda a, b: a is not None and a > b,
+    '>=': lambda a, b: a is not None and a >= b,
+    'in': lambda a, b: a in b,
+    'array_contains': lambda a, b: isinstance(a, list) and b in a,
+}
+
+
+class ConsultaFalsa:
+    def __init__(self, cliente, coleccion, filtros=(), orden=(), limite=None, despues_de=None):
+        self._cliente = cliente
+        self._coleccion = coleccion
+        self._filtros = tuple(filtros)
+        self._orden = tuple(orden)
+        self._limite = limite
+        self._despues_de = despues_de
+
+    def _copiar(self, **cambios):
+        valores = dict(filtros=self._filtros, orden=self._orden, limite=self._limite,
+                       despues_de=self._despues_de)
+        valores.update(cambios)
+        return ConsultaFalsa(self._cliente, self._coleccion, **valores)
+
+    def where(self, campo=None, op=None, valor=None, filter=None):
+        if filter is not None:
+            campo, op, valor = filter.field_path, filter.op_string, filter.value
+        return self._copiar(filtros=self._filtros + ((campo, op, valor),))
+
+    def order_by(self, campo, direction='ASCENDING'):
+        return self._copiar(orden=self._orden + ((campo, direction),))
+
+    def limit(self, n):
+        return self._copiar(limite=n)
+
+    def start_after(self, cursor):
+        return self._copiar(despues_de=cursor)
+
+    def _resultados(self):
+        prefijo = self._coleccion + '/'
+        with self._cliente._lock:
+            # Se filtra y ordena sobre los datos guardados; solo se copian los documentos devueltos
+            filas = [
+                (ruta[len(prefijo):], datos, creado)
+                for ruta, (datos, creado) in self._cliente._docs.items()
+                if ruta.startswith(prefijo) and '/' not in ruta[len(prefijo):]
+            ]
+            for campo, op, valor in self._filtros:
+                filas = [f for f in filas if _OPERADORES[op](_leer_campo(f[1], campo), valor)]
+            for campo, direccion in reversed(self._orden):
+                filas.sort(
+                    key=lambda f: (f[0] if campo == '__name__' else _leer_campo(f[1], campo)) or 0,
+                    reverse=direccion in ('DESCENDING', 'desc'),
+                )
+            if self._despues_de is not None:
+                cursor_id = getattr(self._despues_de, 'id', None)
+                ids = [f[0] for f in filas]
+                if cursor_id in ids:
+                    filas = filas[ids.index(cursor_id) + 1:]
+            if self._limite is not None:
+                filas = filas[:self._limite]
+            return [
+                SnapshotFalso(DocumentoFalso(self._cliente, self._coleccion, doc_id), copy.deepcopy(datos), creado)
+                for doc_id, datos, creado in filas
+            ]
+
+    def stream(self, transaction=None):
+        self._cliente._esperar()
+        snaps = self._resultados()
+        # Firestore factura al menos una lectura por consulta
+        self._cliente.contadores.sumar(lecturas=max(1, len(snaps)))
+        return iter(snaps)
+
+    def get(self, transaction=None):
+        return list(self.stream(transaction=transaction))
+
+    def on_snapshot(self, callback):
+        raise NotImplementedError("El Firestore falso no soporta listeners")
+
+
+class ColeccionFalsa(ConsultaFalsa):
+    def __init__(self, cliente, nombre):
+        super().__init__(cliente, nombre)
+        self.id = nombre.split('/')[-1]
+
+    def document(self, doc_id=None):
+        return DocumentoFalso(self._cliente, self._coleccion, doc_id or uuid.uuid4().hex[:20])
+
+    def add(self, datos, document_id=None):
+        ref = self.document(document_id)
+        ref.set(datos)
+        return _ahora(), ref
+
+
+class LoteFalso:
+    def __init__(self, cliente):
+        self._cliente = cliente
+        self._escrituras = []
+
+    def set(self, ref, datos, merge=False):
+        self._escrituras.append(('set', ref, datos, {'merge': merge}))
+
+    def create(self, ref, datos):
+        self._escrituras.append(('create', ref, datos, {}))
+
+    def update(self, ref, datos):
+        self._escrituras.append(('update', ref, datos, {}))
+
+    def delete(self, ref):
+        self._escrituras.append(('delete', ref, None, {}))
+
+    def commit(self):
+        self._cliente._esperar()
+        self._cliente._aplicar(self._escrituras)
+        self._escrituras = []
+
+
+_ids_transaccion = itertools.count(1)
+
+
+class TransaccionFalsa(LoteFalso):
+    """Transacción compatible con el decorador firestore.transactional"""
+
+    def __init__(self, cliente, max_attempts=5, read_only=False):
+        super().__init__(cliente)
+        self._max_attempts = max_attempts
+        self._read_only = read_only
+        self._id = None
+
+    @property
+    def in_progress(self):
+        return self._id is not None
+
+    def _clean_up(self):
+        self._escrituras = []
+        self._id = None
+
+    def _begin(self, retry_id=None):
+        self._id = next(_ids_transaccion)
+        # Serializa las transacciones como lo haría el bloqueo pesimista
+        self._cliente._lock.acquire()
+
+    def _rollback(self):
+        if self._id is not None:
+            self._clean_up()
+            self._cliente._lock.release()
+
+    def _commit(self):
+        try:
+            self.commit()
+        finally:
+            self._id = None
+            self._cliente._lock.release()
+        return []
+
+    def get(self, ref_o_consulta):
+        if isinstance(ref_o_consulta, DocumentoFalso):
+            return iter([ref_o_consulta.get()])
+        return ref_o_consulta.stream()
+
+    def get_all(self, referencias):
+        return self._cliente.get_all(referencias)
@@ -0,0 +1,373 @@
+"""Benchmark de punta a punta de las páginas de la tienda, sin red.
+
+Uso:
+    python -m benchmarks.paginas
+    python -m benchmarks.paginas --tamanos 10 1000 50000 --repeticiones 3
+    python -m benchmarks.paginas --latencia-firestore 0.02 --latencia-paypal 0.3
+    python -m benchmarks.paginas --json base.json
+    python -m benchmarks.paginas --comparar base.json
+
+Recorre app.py, pages/catalogo.py y pages/compraok.py con el AppTest de
+Streamlit, como lo haría un usuario: login con Google, navegar y buscar en
+el catálogo, agregar y quitar del carrito, pagar con PayPal y volver a la
+confirmación. Firestore es un cliente en memoria y Google, PayPal y OpenAI
+son un servidor local (benchmarks/servicios_falsos.py), ambos con latencia
+configurable. Por cada acción informa el tiempo del rerun, las lecturas y
+escrituras de documentos y las llamadas externas, y repite el recorrido
+para cada tamaño de catálogo.
+
+Cada recorrido se verifica contra OPERACIONES_ESPERADAS, el máximo de
+lecturas, escrituras y borrados de cada acción para un catálogo de n
+productos: el benchmark termina con código 1 si alguna acción lo supera
+(por ejemplo, si el login vuelve a leer el catálogo dos veces).
+
+Con --comparar termina con código 1 si alguna acción hace más operaciones
+que en el archivo de referencia o es más lenta que la tolerancia; para
+comparar tiempos conviene usar --repeticiones 3 o más. Las consultas del
+Firestore en memoria recorren toda la colección, así que en catálogos
+grandes su tiempo no representa al de Firestore: ahí lo que cuenta son las
+lecturas.
+
+La primera acción que muestra la recomendación en el carrito ("agregar al
+carrito" en el primer tamaño) tarda ~0.5 s más: st.write_stream importa
+pandas y pyarrow la primera vez que se usa en el proceso. Es un costo
+único por proceso, no por sesión ni por tamaño de catálogo.
+"""
+import argparse
+import json
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+from streamlit.testing.v1 import AppTest
+
+from benchmarks.firestore_falso import FirestoreFalso
+from benchmarks.servicios_falsos import ServiciosFalsos
+from modules import recursos
+from modules.catalogo_cache import catalogo
+from modules.consultas_catalogo import TAMANO_PAGINA
+
+RAIZ = Path(__file__).resolve().parent.parent
+
+TAMANOS = (10, 100, 1000, 10000, 50000)
+
+# Categoría -> (tipo de prenda, materiales); mismas categorías que el filtro del catálogo
+PRENDAS = {
+    'vestidos': ("Vestido", ("seda", "lino", "algodón")),
+    'blusas': ("Blusa", ("seda", "algodón", "gasa")),
+    'pantalones': ("Pantalón", ("denim", "lino", "lana")),
+    'chaquetas': ("Chaqueta", ("cuero", "denim", "lana")),
+    'calzado': ("Zapatillas", ("cuero", "lona", "gamuza")),
+    'accesorios': ("Bolso", ("cuero", "paja", "lona")),
+    'camisetas': ("Camiseta", ("algodón", "lino", "modal")),
+}
+ESTILOS = ("elegante", "casual", "urbano", "clásico", "deportivo", "veraniego")
+COLORES = ("negro", "blanco", "rojo", "azul", "beige", "verde")
+
+# Diferencias de tiempo por debajo de este umbral se consideran ruido
+RUIDO_SEGUNDOS = 0.010
+
+# Lecturas de una página del catálogo: un producto extra indica si hay otra
+_PAGINA = TAMANO_PAGINA + 1
+
+
+def _ops(lecturas=0, escrituras=0, borrados=0):
+    return {'lecturas': lecturas, 'escrituras': escrituras, 'borrados': borrados}
+
+
+# Acción -> máximo de operaciones de Firestore para un catálogo de n productos.
+# El Firestore en memoria no tiene listeners: el catálogo se lee una vez con
+# una consulta (n lecturas) y después solo se leen páginas y documentos sueltos.
+OPERACIONES_ESPERADAS = {
+    # Catálogo completo una vez, primera página y carrito; alta del usuario
+    "login con Google": lambda n: _ops(n + _PAGINA + 1, 1),
+    "rerun del catálogo": lambda n: _ops(),
+    # Recomendación precalculada del producto; una escritura en el carrito
+    "agregar al carrito": lambda n: _ops(1, 1),
+    "recomendación lista": lambda n: _ops(),
+    "cargar más productos": lambda n: _ops(_PAGINA),
+    # La búsqueda usa el índice en memoria (modules/busqueda.py)
+    "buscar": lambda n: _ops(),
+    "buscar (prefijo)": lambda n: _ops(),
+    "limpiar búsqueda": lambda n: _ops(_PAGINA),
+    "filtrar categoría": lambda n: _ops(_PAGINA),
+    "agregar otro producto": lambda n: _ops(1, 1),
+    "quitar del carrito": lambda n: _ops(0, 1),
+    # Copia del checkout para la vuelta de PayPal
+    "pagar con PayPal": lambda n: _ops(0, 1),
+    # Pago, orden y un get_all del stock; orden, stock y pago; se borra el carrito
+    "volver de PayPal y confirmar": lambda n: _ops(4, 3, 1),
+    "rerun de la confirmación": lambda n: _ops(),
+}
+
+
+class ErrorBenchmark(Exception):
+    """Una acción del recorrido falló o la página mostró una excepción"""
+
+
+def productos_de_prueba(cantidad, semilla=0):
+    """Catálogo sintético (id, datos) con nombres y descripciones en español"""
+    azar = random.Random(semilla)
+    categorias = list(PRENDAS)
+    productos = []
+    for i in range(cantidad):
+        categoria = categorias[i % len(categorias)]
+        tipo, materiales = PRENDAS[categoria]
+        estilo, color, material = azar.choice(ESTILOS), azar.choice(COLORES), azar.choice(materiales)
+        productos.append((f"bench{semilla}-{i:06d}", {
+            'name': f"{tipo} {estilo} {color}",
+            'description': f"{tipo} {estilo} de {material} color {color}",
+            'category': categoria,
+            'price': round(azar.uniform(9.99, 299.99), 2),
+            'stock': azar.randint(0, 40),
+            # Sin imagen: el benchmark no genera miniaturas
+            'image': "",
+        }))
+    return productos
+
+
+class Banco:
+    """Mide cada acción: tiempo, operaciones de Firestore y llamadas externas"""
+
+    def __init__(self, db, servicios, tamano):
+        self.db = db
+        self.servicios = servicios
+        self.tamano = tamano
+        self.filas = []
+
+    def medir(self, accion, at, funcion):
+        operaciones = self.db.contadores.como_dict()
+        llamadas = self.servicios.conteo()
+        inicio = time.perf_counter()
+        funcion()
+        segundos = time.perf_counter() - inicio
+        if at.exception:
+            raise ErrorBenchmark(f"{accion}: {at.exception[0].value}")
+
+        fila = {'tamano': self.tamano, 'accion': accion, 'segundos': segundos}
+        for clave, valor in self.db.contadores.como_dict().items():
+            fila[clave] = valor - operaciones[clave]
+        fila['externas'] = {
+            servicio: cantidad - llamadas.get(servicio, 0)
+            for servicio, cantidad in self.servicios.conteo().items()
+            if cantidad != llamadas.get(servicio, 0)
+        }
+        self.filas.append(fila)
+        return fila
+
+
+def nueva_app(servicios, secretos, pagina="app.py"):
+    at = AppTest.from_file(str(RAIZ / pagina), default_timeout=120)
+    for clave, valor in {**servicios.secretos(), **secretos}.items():
+        at.secrets[clave] = valor
+    return at
+
+
+def boton(at, key=None, prefijo=None, excluir=()):
+    """Botón del árbol actual; tras el rerun de un fragmento se vuelve a ejecutar la página"""
+    for intento in range(2):
+        for b in at.button:
+            if b.key in excluir:
+                continue
+            if b.key == key or (prefijo and b.key and b.key.startswith(prefijo)):
+                return b
+        if intento == 0:
+            at.run()
+    raise ErrorBenchmark(f"No se encontró el botón {key or prefijo + '*'}")
+
+
+def esperar_recomendacion(at, limite=60):
+    """Espera la recomendación en segundo plano y ejecuta el rerun que la muestra"""
+    if 'recomendacion_pendiente' in at.session_state:
+        at.session_state['recomendacion_pendiente']['futuro'].result(timeout=limite)
+    at.run()
+
+
+def recorrido(tamano, servicios, secretos, latencia_firestore=0.0, semilla=0):
+    """Un usuario de punta a punta sobre un catálogo del tamaño dado"""
+    db = FirestoreFalso(latencia=latencia_firestore)
+    db.cargar('products', productos_de_prueba(tamano, semilla))
+    recursos.usar_db(db)
+    catalogo.invalidar()
+    banco = Banco(db, servicios, tamano)
+
+    # Vuelve de Google con ?code= y termina en el catálogo (st.switch_page)
+    at = nueva_app(servicios, secretos)
+    at.query_params['code'] = "benchmark"
+    banco.medir("login con Google", at, at.run)
+    if not at.session_state['usuario']:
+        raise ErrorBenchmark("login con Google: no se registró el usuario")
+    # El navegador queda en la URL del catálogo: los reruns ya no pasan por app.py
+    at.switch_page("pages/catalogo.py")
+    banco.medir("rerun del catálogo", at, at.run)
+
+    agregar = boton(at, prefijo="add_")
+    banco.medir("agregar al carrito", at, lambda: agregar.click().run())
+    banco.medir("recomendación lista", at, lambda: esperar_recomendacion(at))
+    if any(b.key == "cargar_mas" for b in at.button):
+        cargar_mas = boton(at, key="cargar_mas")
+        banco.medir("cargar más productos", at, lambda: cargar_mas.click().run())
+
+    banco.medir("buscar", at, lambda: at.text_input[0].input("vestido negro").run())
+    banco.medir("buscar (prefijo)", at, lambda: at.text_input[0].input("vestido neg").run())
+    banco.medir("limpiar búsqueda", at, lambda: at.text_input[0].input("").run())
+    banco.medir("filtrar categoría", at, lambda: at.selectbox[0].select("calzado").run())
+
+    segundo = boton(at, prefijo="add_", excluir=(agregar.key,))
+    banco.medir("agregar otro producto", at, lambda: segundo.click().run())
+    quitar = boton(at, key=f"remove_{segundo.key[len('add_'):]}")
+    banco.medir("quitar del carrito", at, lambda: quitar.click().run())
+
+    pagar = boton(at, key="process_order_paypal")
+    banco.medir("pagar con PayPal", at, lambda: pagar.click().run())
+    pagos = db.datos('paypal_payments')
+    if not pagos:
+        raise ErrorBenchmark("pagar con PayPal: no se guardó el checkout")
+    payment_id = next(iter(pagos))
+
+    # PayPal redirige a app.py en una sesión nueva, que pasa a compraok.py
+    at = nueva_app(servicios, secretos)
+    at.query_params['paymentId'] = payment_id
+    at.query_params['token'] = f"EC-{payment_id}"
+    at.query_params['PayerID'] = "BENCHPAYER"
+    banco.medir("volver de PayPal y confirmar", at, at.run)
+    if 'pedidos_finalizados' not in at.session_state:
+        raise ErrorBenchmark("volver de PayPal y confirmar: no se registró el pedido")
+    at.switch_page("pages/compraok.py")
+    banco.medir("rerun de la confirmación", at, at.run)
+    return banco.filas
+
+
+def combinar(repeticiones):
+    """Mediana del tiempo de cada acción; las operaciones son las de la última repetición"""
+    filas = []
+    for grupo in zip(*repeticiones):
+        fila = dict(grupo[-1])
+        fila['segundos'] = statistics.median(f['segundos'] for f in grupo)
+        filas.append(fila)
+    return filas
+
+
+def _externas(fila):
+    return " ".join(f"{s}={n}" for s, n in sorted(fila['externas'].items())) or "-"
+
+
+def imprimir(filas):
+    for tamano in sorted({f['tamano'] for f in filas}):
+        print(f"\nCatálogo de {tamano} productos")
+        print(f"{'acción':<30}{'ms':>10}{'lecturas':>10}{'escrit.':>9}{'borrados':>10}  externas")
+        for f in (f for f in filas if f['tamano'] == tamano):
+            print(f"{f['accion']:<30}{f['segundos'] * 1000:>10.1f}{f['lecturas']:>10}"
+                  f"{f['escrituras']:>9}{f['borrados']:>10}  {_externas(f)}")
+
+    tamanos = sorted({f['tamano'] for f in filas})
+    if len(tamanos) < 2:
+        return
+    print("\nEscalado: ms por acción / lecturas")
+    print(f"{'acción':<30}" + "".join(f"{t:>16}" for t in tamanos))
+    acciones = list(dict.fromkeys(f['accion'] for f in filas))
+    por_clave = {(f['tamano'], f['accion']): f for f in filas}
+    for accion in acciones:
+        celdas = []
+        for t in tamanos:
+            f = por_clave.get((t, accion))
+            celdas.append(f"{f['segundos'] * 1000:.1f} / {f['lecturas']}" if f else "-")
+        print(f"{accion:<30}" + "".join(f"{c:>16}" for c in celdas))
+
+
+def excesos(filas):
+    """Acciones que hacen más operaciones que OPERACIONES_ESPERADAS"""
+    encontrados = []
+    for f in filas:
+        esperadas = OPERACIONES_ESPERADAS.get(f['accion'])
+        if esperadas is None:
+            continue
+        for clave, maximo in esperadas(f['tamano']).items():
+            if f[clave] > maximo:
+                encontrados.append(f"{f['accion']} ({f['tamano']} productos): {clave} {f[clave]}, máximo {maximo}")
+    return encontrados
+
+
+def regresiones(filas, base, tolerancia):
+    """Acciones que hacen más operaciones o tardan más que en la referencia"""
+    referencia = {(f['tamano'], f['accion']): f for f in base}
+    encontradas = []
+    for f in filas:
+        previa = referencia.get((f['tamano'], f['accion']))
+        if previa is None:
+            continue
+        nombre = f"{f['accion']} ({f['tamano']} productos)"
+        for clave in ('lecturas', 'escrituras', 'borrados'):
+            if f[clave] > previa[clave]:
+                encontradas.append(f"{nombre}: {clave} {previa[clave]} -> {f[clave]}")
+        for servicio, cantidad in f['externas'].items():
+            if cantidad > previa['externas'].get(servicio, 0):
+                encontradas.append(f"{nombre}: llamadas a {servicio} "
+                                   f"{previa['externas'].get(servicio, 0)} -> {cantidad}")
+        if (f['segundos'] > previa['segundos'] * (1 + tolerancia)
+                and f['segundos'] - previa['segundos'] > RUIDO_SEGUNDOS):
+            encontradas.append(f"{nombre}: {previa['segundos'] * 1000:.1f} ms -> {f['segundos'] * 1000:.1f} ms")
+    return encontradas
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tamanos", type=int, nargs="+", default=list(TAMANOS),
+                        help="cantidad de productos del catálogo en cada recorrido")
+    parser.add_argument("--repeticiones", type=int, default=1, help="recorridos por tamaño (se usa la mediana)")
+    parser.add_argument("--latencia-firestore", type=float, default=0.0, help="segundos por operación")
+    parser.add_argument("--latencia-google", type=float, default=0.0, help="segundos por llamada")
+    parser.add_argument("--latencia-paypal", type=float, default=0.0, help="segundos por llamada")
+    parser.add_argument("--latencia-openai", type=float, default=0.0, help="segundos por llamada")
+    parser.add_argument("--recomendador", choices=("local", "llm"), default="local",
+                        help="RECOMENDADOR_MODO de la aplicación")
+    parser.add_argument("--json", help="guardar los resultados en este archivo")
+    parser.add_argument("--comparar", help="resultados de referencia (--json de una ejecución anterior)")
+    parser.add_argument("--tolerancia", type=float, default=0.5,
+                        help="aumento de tiempo admitido frente a la referencia (0.5 = 50%%)")
+    args = parser.parse_args(argv)
+
+    servicios = ServiciosFalsos({
+        'google': args.latencia_google,
+        'paypal': args.latencia_paypal,
+        'openai': args.latencia_openai,
+    }).iniciar()
+    secretos = {'RECOMENDADOR_MODO': args.recomendador}
+    filas = []
+    try:
+        for tamano in args.tamanos:
+            repeticiones = [
+                # Cada repetición usa otro catálogo para no reutilizar la caché de recomendaciones
+                recorrido(tamano, servicios, secretos, args.latencia_firestore, semilla=i)
+                for i in range(args.repeticiones)
+            ]
+            filas.extend(combinar(repeticiones))
+    finally:
+        servicios.detener()
+        recursos.usar_db(None)
+
+    imprimir(filas)
+    if args.json:
+        Path(args.json).write_text(json.dumps({'config': vars(args), 'filas': filas}, indent=2, ensure_ascii=False))
+    encontrados = excesos(filas)
+    if encontrados:
+        print("\n❌ Operaciones por encima de lo esperado")
+        for linea in encontrados:
+            print("  -", linea)
+        return 1
+    if args.comparar:
+        base = json.loads(Path(args.comparar).read_text())['filas']
+        encontradas = regresiones(filas, base, args.tolerancia)
+        if encontradas:
+            print("\n❌ Regresiones frente a", args.comparar)
+            for linea in encontradas:
+                print("  -", linea)
+            return 1
+        print("\n✅ Sin regresiones frente a", args.comparar)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,262 @@
+"""Servidor HTTP local que imita Google OAuth, PayPal y OpenAI.
+
+Responde lo mínimo que usan modules/auth_google.py, modules/pagos_paypal.py
+y el cliente de OpenAI, con una latencia configurable por servicio, y
+cuenta las llamadas que recibe cada uno. secretos() devuelve los secretos
+que apuntan la aplicación a este servidor; el endpoint de tokens de Google
+no es configurable por secretos y se redirige mientras el servidor corre.
+"""
+import base64
+import itertools
+import json
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl
+
+from modules import auth_google
+
+CLIENT_ID_GOOGLE = "benchmark.apps.googleusercontent.com"
+_TOKEN_URL_GOOGLE = auth_google.TOKEN_URL
+
+PERFIL_GOOGLE = {
+    'sub': "g-benchmark",
+    'email': "benchmark@megamoda.test",
+    'name': "Usuario Benchmark",
+    'picture': "https://megamoda.test/avatar.png",
+    'email_verified': True,
+}
+
+RECOMENDACION = "Te recomendamos completar tu look con un accesorio de la colección."
+
+
+def _b64(datos):
+    return base64.urlsafe_b64encode(json.dumps(datos).encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def perfil_google(code=None):
+    """Perfil del usuario que vuelve de Google con ese code (uno distinto por code)"""
+    if code in (None, "benchmark"):
+        return PERFIL_GOOGLE
+    return {**PERFIL_GOOGLE, 'sub': f"g-{code}", 'email': f"{code}@megamoda.test", 'name': f"Usuario {code}"}
+
+
+def id_token_falso(perfil=PERFIL_GOOGLE, client_id=CLIENT_ID_GOOGLE):
+    """JWT sin firma con las claims que valida perfil_desde_id_token"""
+    claims = {**perfil, 'aud': client_id, 'iss': "https://accounts.google.com"}
+    return f"{_b64({'alg': 'none'})}.{_b64(claims)}.firma"
+
+
+class ServiciosFalsos:
+    """Google OAuth, PayPal y OpenAI en un único servidor local (hilo propio)"""
+
+    def __init__(self, latencia=None):
+        # servicio -> segundos de espera antes de cada respuesta; 'openai_token'
+        # es la espera entre fragmentos de una respuesta con stream=True
+        self.latencia = {'google': 0.0, 'paypal': 0.0, 'openai': 0.0, 'openai_token': 0.0, **(latencia or {})}
+        self.llamadas = Counter()
+        self.pagos = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._servidor = None
+
+    @property
+    def url(self):
+        host, puerto = self._servidor.server_address[:2]
+        return f"http://{host}:{puerto}"
+
+    def iniciar(self):
+        servicios = self
+
+        class Manejador(_Manejador):
+            pass
+        Manejador.servicios = servicios
+
+        self._servidor = ThreadingHTTPServer(("127.0.0.1", 0), Manejador)
+        self._servidor.daemon_threads = True
+        threading.Thread(target=self._servidor.serve_forever, daemon=True).start()
+        # Los clientes de Google que se creen a partir de ahora lo usan
+        auth_google.TOKEN_URL = f"{self.url}/google/token"
+        return self
+
+    def detener(self):
+        auth_google.TOKEN_URL = _TOKEN_URL_GOOGLE
+        if self._servidor is not None:
+            self._servidor.shutdown()
+            self._servidor.server_close()
+            self._servidor = None
+
+    def secretos(self):
+        """Secretos de la aplicación que apuntan a este servidor"""
+        return {
+            'GOOGLE_CLIENT_ID': CLIENT_ID_GOOGLE,
+            'GOOGLE_SECRET_ID': "benchmark",
+            'GOOGLE_USERINFO_URL': f"{self.url}/google/userinfo",
+            'PAYPAL_CLIENT_ID': "benchmark",
+            'PAYPAL_SECRET_KEY': "benchmark",
+            'PAYPAL_API_BASE': f"{self.url}/paypal",
+            'OPENAI_API_KEY': "benchmark",
+            'OPENAI_BASE_URL': f"{self.url}/openai",
+        }
+
+    def conteo(self):
+        with self._lock:
+            return dict(self.llamadas)
+
+    # --- Respuestas de cada servicio: (estado, cuerpo) ---
+
+    def responder(self, metodo, ruta, cuerpo):
+        servicio = ruta.strip("/").split("/")[0]
+        with self._lock:
+            self.llamadas[servicio] += 1
+        espera = self.latencia.get(servicio, 0.0)
+        if espera:
+            time.sleep(espera)
+
+        if servicio == "google":
+            return self._google(metodo, ruta, cuerpo)
+        if servicio == "paypal":
+            return self._paypal(metodo, ruta[len("/paypal"):], cuerpo)
+        if servicio == "openai":
+            return self._openai(ruta, cuerpo)
+        return 404, {'error': f"ruta desconocida: {ruta}"}
+
+    def _google(self, metodo, ruta, cuerpo):
+        if metodo == "POST" and ruta == "/google/token":
+            return 200, {
+                'access_token': "ya29.benchmark",
+                'expires_in': 3599,
+                'token_type': "Bearer",
+                'id_token': id_token_falso(perfil_google(cuerpo.get('code'))),
+            }
+        if metodo == "GET" and ruta == "/google/userinfo":
+            perfil = PERFIL_GOOGLE
+            return 200, {'id': perfil['sub'], 'email': perfil['email'], 'name': perfil['name'],
+                         'picture': perfil['picture'], 'verified_email': perfil['email_verified']}
+        return 404, {'error': "not_found"}
+
+    def _paypal(self, metodo, ruta, cuerpo):
+        if metodo == "POST" and ruta == "/v1/oauth2/token":
+            return 200, {'access_token': "A21.benchmark", 'token_type': "Bearer", 'expires_in': 32400}
+
+        partes = ruta.strip("/").split("/")
+        if partes[:3] != ["v1", "payments", "payment"]:
+            return 404, {'name': "NOT_FOUND", 'message': f"ruta desconocida: {ruta}"}
+
+        with self._lock:
+            if metodo == "POST" and len(partes) == 3:
+                payment_id = f"PAYID-BENCH{next(self._ids):06d}"
+                pago = {
+                    **cuerpo,
+                    'id': payment_id,
+                    'state': "created",
+                    'links': [{
+                        'href': f"{self.url}/paypal/aprobar?token=EC-{payment_id}",
+                        'rel': "approval_url",
+                        'method': "REDIRECT",
+                    }],
+                }
+                self.pagos[payment_id] = pago
+                return 201, pago
+
+            pago = self.pagos.get(partes[3]) if len(partes) > 3 else None
+            if pago is None:
+                return 404, {'name': "INVALID_RESOURCE_ID", 'message': "Requested resource ID was not found."}
+            if metodo == "GET" and len(partes) == 4:
+                return 200, pago
+            if metodo == "POST" and partes[4:] == ["execute"]:
+                pago['state'] = "approved"
+                pago['payer'] = {'payer_info': {'payer_id': cuerpo.get('payer_id')}}
+                return 200, pago
+        return 404, {'name': "NOT_FOUND", 'message': f"ruta desconocida: {ruta}"}
+
+    def _openai(self, ruta, cuerpo):
+        if ruta != "/openai/chat/completions":
+            return 404, {'error': {'message': f"ruta desconocida: {ruta}"}}
+        # Aproximación de tokens: ~4 caracteres por token
+        prompt = sum(len(m.get('content', '')) for m in cuerpo.get('messages', [])) // 4
+        completion = len(RECOMENDACION) // 4
+        base = {
+            'id': f"chatcmpl-bench{next(self._ids)}",
+            'created': int(time.time()),
+            'model': cuerpo.get('model', "gpt-4"),
+        }
+        uso = {'prompt_tokens': prompt, 'completion_tokens': completion, 'total_tokens': prompt + completion}
+        if cuerpo.get('stream'):
+            return 200, self._openai_eventos(base, uso, cuerpo)
+        return 200, {
+            **base,
+            'object': "chat.completion",
+            'choices': [{
+                'index': 0,
+                'message': {'role': "assistant", 'content': RECOMENDACION},
+                'finish_reason': "stop",
+            }],
+            'usage': uso,
+        }
+
+    def _openai_eventos(self, base, uso, cuerpo):
+        """Fragmentos de chat.completion.chunk (una palabra cada uno) para stream=True"""
+        palabras = RECOMENDACION.split(" ")
+        eventos = [
+            {**base, 'object': "chat.completion.chunk", 'choices': [{
+                'index': 0,
+                'delta': {'role': "assistant", 'content': palabra if i == 0 else " " + palabra},
+                'finish_reason': None,
+            }]}
+            for i, palabra in enumerate(palabras)
+        ]
+        eventos.append({**base, 'object': "chat.completion.chunk",
+                        'choices': [{'index': 0, 'delta': {}, 'finish_reason': "stop"}]})
+        if (cuerpo.get('stream_options') or {}).get('include_usage'):
+            eventos.append({**base, 'object': "chat.completion.chunk", 'choices': [], 'usage': uso})
+        return eventos
+
+
+class _Manejador(BaseHTTPRequestHandler):
+    servicios = None
+    protocol_version = "HTTP/1.1"  # keep-alive, como los servicios reales
+
+    def _atender(self, metodo):
+        largo = int(self.headers.get("Content-Length") or 0)
+        datos = self.rfile.read(largo) if largo else b""
+        try:
+            # JSON (PayPal, OpenAI) o formulario (token de Google)
+            cuerpo = json.loads(datos) if datos.startswith(b"{") else dict(parse_qsl(datos.decode("utf-8")))
+        except ValueError:
+            cuerpo = {}
+        estado, respuesta = self.servicios.responder(metodo, self.path.split("?")[0], cuerpo)
+        if isinstance(respuesta, list):
+            self._transmitir(estado, respuesta)
+            return
+        contenido = json.dumps(respuesta).encode("utf-8")
+        self.send_response(estado)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(contenido)))
+        self.end_headers()
+        self.wfile.write(contenido)
+
+    def _transmitir(self, estado, eventos):
+        """Server-sent events, como la API de OpenAI con stream=True"""
+        pausa = self.servicios.latencia.get('openai_token', 0.0)
+        self.send_response(estado)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+        for evento in eventos:
+            if pausa:
+                time.sleep(pausa)
+            self.wfile.write(f"data: {json.dumps(evento)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+        self.wfile.write(b"data: [DONE]\n\n")
+
+    def do_GET(self):
+        self._atender("GET")
+
+    def do_POST(self):
+        self._atender("POST")
+
+    def log_message(self, formato, *args):
+        pass
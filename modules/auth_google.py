@@ -0,0 +1,143 @@
+import base64
+import json
+import re
+from datetime import datetime
+from urllib.parse import urlencode
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from modules.instrumentacion import medir, medido
+
+AUTH_URL = "https://accounts.google.com/o/oauth2/v2/auth"
+# Fijo, no configurable por secretos: el id_token que devuelve se usa sin
+# verificar su firma (ver perfil_desde_id_token)
+TOKEN_URL = "https://oauth2.googleapis.com/token"
+USERINFO_URL = "https://www.googleapis.com/oauth2/v2/userinfo"
+EMISORES_GOOGLE = {"accounts.google.com", "https://accounts.google.com"}
+
+# (conexión, lectura) en segundos: el login nunca queda colgado de Google
+TIMEOUT = (3.05, 10)
+
+
+class ErrorAutenticacion(Exception):
+    """Google rechazó el código o devolvió datos incompletos"""
+
+
+class ClienteGoogle:
+    """Cliente OAuth de Google con una sesión HTTP keep-alive compartida por proceso"""
+
+    def __init__(self, client_id, client_secret, redirect_uri,
+                 userinfo_url=USERINFO_URL, timeout=TIMEOUT):
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.redirect_uri = redirect_uri
+        self.token_url = TOKEN_URL
+        self.userinfo_url = userinfo_url
+        self.timeout = timeout
+
+        # requests.Session reutiliza las conexiones TLS; el pool admite
+        # tantas conexiones simultáneas como sesiones haciendo login
+        self.sesion = requests.Session()
+        adaptador = HTTPAdapter(pool_connections=4, pool_maxsize=32)
+        self.sesion.mount("https://", adaptador)
+        self.sesion.mount("http://", adaptador)
+
+    def url_autorizacion(self):
+        """URL del consentimiento de Google"""
+        params = {
+            "client_id": self.client_id,
+            "redirect_uri": self.redirect_uri,
+            "response_type": "code",
+            "scope": "openid email profile",
+            "access_type": "offline"
+        }
+        return f"{AUTH_URL}?{urlencode(params)}"
+
+    @medido("google.token")
+    def intercambiar_codigo(self, code):
+        """Intercambia el código de autorización por tokens"""
+        response = self.sesion.post(self.token_url, data={
+            "client_id": self.client_id,
+            "client_secret": self.client_secret,
+            "code": code,
+            "grant_type": "authorization_code",
+            "redirect_uri": self.redirect_uri
+        }, timeout=self.timeout)
+        if response.status_code != 200:
+            raise ErrorAutenticacion(f"Error al obtener tokens: {response.text}")
+        return response.json()
+
+    def obtener_perfil(self, tokens):
+        """Datos del usuario: del id_token si están completos, si no de /userinfo"""
+        perfil = perfil_desde_id_token(tokens.get("id_token"), self.client_id)
+        if perfil and all(perfil.get(c) for c in ("id", "email", "name", "picture")):
+            return perfil
+
+        access_token = tokens.get("access_token")
+        if not access_token:
+            raise ErrorAutenticacion("No se pudo obtener el token de acceso")
+        with medir("google.userinfo"):
+            response = self.sesion.get(
+                self.userinfo_url,
+                headers={"Authorization": f"Bearer {access_token}"},
+                timeout=self.timeout
+            )
+        if response.status_code != 200:
+            raise ErrorAutenticacion(f"Error al obtener información del usuario: {response.text}")
+        return response.json()
+
+
+def perfil_desde_id_token(id_token, client_id):
+    """Lee los datos del perfil contenidos en el id_token.
+
+    La firma NO se verifica. Solo es seguro porque el token llega en la
+    respuesta del endpoint de tokens de Google (TOKEN_URL, por TLS) al
+    intercambiar el código con nuestro client_secret: OpenID Connect
+    (sección 3.1.3.7) permite entonces validar solo la audiencia y el
+    emisor. No usar con id_tokens recibidos por cualquier otro camino.
+    """
+    if not id_token:
+        return None
+    # Sin firma verificada: las claims solo valen por venir de TOKEN_URL
+    try:
+        payload = id_token.split(".")[1]
+        payload += "=" * (-len(payload) % 4)
+        claims = json.loads(base64.urlsafe_b64decode(payload))
+    except (IndexError, ValueError):
+        return None
+    if claims.get("aud") != client_id or claims.get("iss") not in EMISORES_GOOGLE:
+        return None
+    return {
+        'id': claims.get('sub'),
+        'email': claims.get('email'),
+        'name': claims.get('name'),
+        'picture': claims.get('picture'),
+        'verified_email': claims.get('email_verified', False),
+        'locale': claims.get('locale', 'en'),
+    }
+
+
+def registrar_usuario(repo, user_info):
+    """Crea o actualiza el usuario sin leerlo antes (ver modules/repositorio.py).
+
+    El repositorio marca last_login en cada login y created_at solo al crearlo.
+    """
+    google_id = user_info.get('id')
+    email = user_info.get('email')
+    nombre = user_info.get('name')
+    foto = user_info.get('picture')
+    if not all([google_id, email, nombre, foto]):
+        raise ErrorAutenticacion("Faltan datos obligatorios del usuario de Google")
+
+    usuario = {
+        'uid': google_id,
+        'email': email,
+        'nombre': re.sub(r"\s*\(.*?\)", "", nombre).strip(),
+        'foto': foto,
+        'verified_email': user_info.get('verified_email', False),
+        'locale': user_info.get('locale', 'en'),
+    }
+    repo.guardar_usuario(usuario)
+    usuario['last_login'] = datetime.now()
+    return usuario
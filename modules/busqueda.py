@@ -0,0 +1,276 @@
+import threading
+from bisect import bisect_left
+
+import numpy as np
+
+from modules.motor_recomendacion import normalizar
+
+# Campos indexados; un término que aparece en el nombre pesa más al ordenar por relevancia
+CAMPOS = ('name', 'description', 'category')
+
+# Un prefijo más corto abarcaría demasiado vocabulario como para ser útil
+MIN_PREFIJO = 2
+
+ORDENES = ('relevancia', 'precio_asc', 'precio_desc')
+
+
+def raiz(token):
+    """Forma singular aproximada en español: blusas -> blusa, pantalones -> pantalon"""
+    if len(token) < 4 or not token.endswith('s'):
+        return token
+    if token.endswith('ces'):
+        return token[:-3] + 'z'
+    if token.endswith('es') and token[-3] in 'lnrdj':
+        return token[:-2]
+    return token[:-1]
+
+
+def terminos(texto):
+    """Términos de búsqueda: sin tildes, sin palabras vacías y en singular"""
+    return [raiz(t) for t in normalizar(texto)]
+
+
+class Resultado:
+    """Página de resultados más los totales para las facetas"""
+
+    def __init__(self, productos, total, por_categoria):
+        self.productos = productos
+        self.total = total
+        self.por_categoria = por_categoria
+
+
+class IndiceBusqueda:
+    """Índice invertido en memoria sobre el catálogo, compartido por todas las sesiones.
+
+    Cada producto ocupa una posición fija; los términos apuntan a conjuntos de
+    posiciones y el vocabulario ordenado permite resolver prefijos con bisect.
+    Precio, stock y vigencia se guardan en arreglos NumPy para filtrar y
+    ordenar sin recorrer los productos en Python.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._vaciar()
+
+    def _vaciar(self):
+        self.version = None
+        self._productos = []
+        self._posicion = {}
+        self._terminos_producto = []
+        self._postings = {}
+        self._en_nombre = {}
+        # término -> posiciones como arreglo, para armar máscaras sin recorrer sets
+        self._arreglos = {}
+        self._arreglos_nombre = {}
+        self._vocabulario = []
+        # Categoría de cada posición como código entero (una máscara por código)
+        self._categorias = []
+        self._codigo_categoria = {}
+        self._precios = np.zeros(0)
+        self._stock = np.zeros(0)
+        self._categoria = np.zeros(0, dtype=np.int32)
+        self._vigente = np.zeros(0, dtype=bool)
+        # Derivados que se recalculan al sincronizar (ver _preparar_filtros)
+        self._rango_precio = np.zeros(0, dtype=np.int64)
+        self._disponible = np.zeros(0, dtype=bool)
+        self._en_categoria = []
+
+    # --- Sincronización con el catálogo ---
+
+    def sincronizar(self, catalogo):
+        """Aplica al índice solo los productos que cambiaron desde la última versión.
+
+        catalogo es la caché compartida (modules.catalogo_cache), ya cargada
+        con su obtener(). La versión, la lista y los cambios se leen juntos:
+        el índice queda marcado con la versión que realmente aplicó.
+        """
+        with self._lock:
+            if self.version == catalogo.version:
+                return
+            version, productos, cambiados = catalogo.cambios_para(self.version)
+            if productos is None:
+                return
+            if cambiados is None or len(cambiados) > len(productos) // 2:
+                self._reconstruir(productos)
+            else:
+                for product_id, product in cambiados.items():
+                    self._quitar(product_id)
+                    if product is not None:
+                        self._agregar(product)
+                self._vocabulario = sorted(self._postings)
+                self._preparar_filtros()
+            self.version = version
+
+    def _preparar_filtros(self):
+        # Puesto de cada posición al ordenar por precio (sin empates: orden estable)
+        rango = np.empty(len(self._precios), dtype=np.int64)
+        rango[np.argsort(self._precios, kind='stable')] = np.arange(len(self._precios))
+        self._rango_precio = rango
+        self._disponible = self._vigente & (self._stock > 0)
+        # Una máscara por categoría: contar y filtrar es un AND, sin indexar
+        self._en_categoria = [self._categoria == codigo for codigo in range(len(self._categorias))]
+
+    def _reconstruir(self, productos):
+        self._vaciar()
+        capacidad = max(len(productos), 1)
+        self._precios = np.zeros(capacidad)
+        self._stock = np.zeros(capacidad)
+        self._categoria = np.zeros(capacidad, dtype=np.int32)
+        self._vigente = np.zeros(capacidad, dtype=bool)
+        for product in productos:
+            self._agregar(product)
+        self._vocabulario = sorted(self._postings)
+        self._preparar_filtros()
+
+    def _agregar(self, product):
+        pos = len(self._productos)
+        if pos >= len(self._precios):
+            self._crecer()
+        self._productos.append(product)
+        self._posicion[product['id']] = pos
+
+        nombre = set(terminos(product.get('name')))
+        todos = set(nombre)
+        for campo in CAMPOS[1:]:
+            todos.update(terminos(product.get(campo)))
+        self._terminos_producto.append(todos)
+        for termino in todos:
+            self._postings.setdefault(termino, set()).add(pos)
+            self._arreglos.pop(termino, None)
+        for termino in nombre:
+            self._en_nombre.setdefault(termino, set()).add(pos)
+            self._arreglos_nombre.pop(termino, None)
+
+        categoria = product.get('category', '')
+        if categoria not in self._codigo_categoria:
+            self._codigo_categoria[categoria] = len(self._categorias)
+            self._categorias.append(categoria)
+        self._categoria[pos] = self._codigo_categoria[categoria]
+        self._precios[pos] = float(product.get('price', 0) or 0)
+        self._stock[pos] = float(product.get('stock', 0) or 0)
+        self._vigente[pos] = True
+
+    def _quitar(self, product_id):
+        # La posición queda vacía; se recupera en la próxima reconstrucción
+        pos = self._posicion.pop(product_id, None)
+        if pos is None:
+            return
+        for termino in self._terminos_producto[pos]:
+            for indice, arreglos in ((self._postings, self._arreglos),
+                                     (self._en_nombre, self._arreglos_nombre)):
+                arreglos.pop(termino, None)
+                posiciones = indice.get(termino)
+                if posiciones is not None:
+                    posiciones.discard(pos)
+                    if not posiciones:
+                        del indice[termino]
+        self._terminos_producto[pos] = set()
+        self._vigente[pos] = False
+
+    def _crecer(self):
+        capacidad = max(2 * len(self._precios), 16)
+        for nombre in ('_precios', '_stock', '_categoria', '_vigente'):
+            actual = getattr(self, nombre)
+            nuevo = np.zeros(capacidad, dtype=actual.dtype)
+            nuevo[:len(actual)] = actual
+            setattr(self, nombre, nuevo)
+
+    # --- Consultas ---
+
+    @staticmethod
+    def _arreglo(indice, arreglos, termino):
+        """Posiciones del término como arreglo NumPy (se arma una vez por cambio)"""
+        arreglo = arreglos.get(termino)
+        if arreglo is None:
+            arreglo = np.fromiter(indice.get(termino, ()), dtype=np.int64)
+            arreglos[termino] = arreglo
+        return arreglo
+
+    def _mascara_termino(self, termino, prefijo=False, solo_nombre=False):
+        """Máscara de los productos que contienen el término (o un término con ese prefijo)"""
+        indice, arreglos = (self._en_nombre, self._arreglos_nombre) if solo_nombre \
+            else (self._postings, self._arreglos)
+        mascara = np.zeros(len(self._vigente), dtype=bool)
+        if not prefijo:
+            mascara[self._arreglo(indice, arreglos, termino)] = True
+            return mascara
+        # Los términos son [a-z0-9]: todo lo que empieza con el prefijo es menor que prefijo + '~'
+        inicio = bisect_left(self._vocabulario, termino)
+        fin = bisect_left(self._vocabulario, termino + '~', inicio)
+        partes = [self._arreglo(indice, arreglos, t) for t in self._vocabulario[inicio:fin]]
+        if partes:
+            mascara[np.concatenate(partes)] = True
+        return mascara
+
+    def _primeros(self, posiciones, clave, cantidad):
+        """Las `cantidad` posiciones con menor clave, ordenadas (clave sin empates)"""
+        valores = clave[posiciones]
+        if cantidad < len(posiciones):
+            elegidas = np.argpartition(valores, cantidad)[:cantidad]
+            return posiciones[elegidas[np.argsort(valores[elegidas])]]
+        return posiciones[np.argsort(valores)]
+
+    def buscar(self, texto='', categoria=None, precio_min=None, precio_max=None,
+               solo_stock=True, orden='relevancia', desde=0, limite=12):
+        """Busca productos por texto y facetas; devuelve un Resultado paginado.
+
+        Todos los términos deben aparecer; el último se sigue escribiendo, por
+        eso vale como prefijo.
+        """
+        with self._lock:
+            consulta = terminos(texto)
+            prefijos = [i == len(consulta) - 1 and len(t) >= MIN_PREFIJO for i, t in enumerate(consulta)]
+
+            mascara = (self._disponible if solo_stock else self._vigente).copy()
+            for termino, prefijo in zip(consulta, prefijos):
+                mascara &= self._mascara_termino(termino, prefijo)
+            if precio_min is not None:
+                mascara &= self._precios >= precio_min
+            if precio_max is not None:
+                mascara &= self._precios <= precio_max
+
+            # Totales por categoría antes de aplicar la faceta de categoría
+            por_categoria = {}
+            for codigo, en_categoria in enumerate(self._en_categoria):
+                cantidad = int(np.count_nonzero(mascara & en_categoria))
+                if cantidad:
+                    por_categoria[self._categorias[codigo]] = cantidad
+
+            if categoria:
+                codigo = self._codigo_categoria.get(categoria)
+                if codigo is None:
+                    mascara[:] = False
+                else:
+                    mascara &= self._en_categoria[codigo]
+
+            posiciones = np.flatnonzero(mascara)
+            total = len(posiciones)
+            hasta = desde + limite
+            if orden == 'precio_asc':
+                posiciones = self._primeros(posiciones, self._rango_precio, hasta)
+            elif orden == 'precio_desc':
+                posiciones = self._primeros(posiciones, -self._rango_precio, hasta)
+            elif consulta:
+                # Relevancia: cuántos términos de la consulta aparecen en el nombre;
+                # a igual puntaje se mantiene el orden del catálogo
+                puntajes = np.zeros(len(posiciones), dtype=np.int64)
+                for termino, prefijo in zip(consulta, prefijos):
+                    puntajes += self._mascara_termino(termino, prefijo, solo_nombre=True)[posiciones]
+                posiciones = np.concatenate([
+                    posiciones[puntajes == valor] for valor in range(len(consulta), -1, -1)
+                ])
+
+            pagina = posiciones[desde:hasta]
+            return Resultado([self._productos[i] for i in pagina], total, por_categoria)
+
+    def rango_precios(self):
+        """Precio mínimo y máximo de los productos indexados"""
+        with self._lock:
+            precios = self._precios[self._vigente]
+            if not len(precios):
+                return 0.0, 0.0
+            return float(precios.min()), float(precios.max())
+
+
+# Índice único compartido por todas las sesiones del proceso
+indice = IndiceBusqueda()
@@ -0,0 +1,100 @@
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+class CacheRecomendaciones:
+    """Caché LRU con expiración (TTL) para los textos de recomendación.
+
+    Es compartida por todas las sesiones del proceso y, si se indica una
+    ruta, se persiste en un archivo SQLite para sobrevivir a reinicios.
+    """
+
+    def __init__(self, max_entradas=1000, ttl=6 * 3600, ruta=None):
+        self.max_entradas = max_entradas
+        self.ttl = ttl
+        self.aciertos = 0
+        self.fallos = 0
+        self._lock = threading.Lock()
+        self._entradas = OrderedDict()  # clave -> (texto, creado_en)
+        self._db = None
+        if ruta:
+            self._abrir(ruta)
+
+    @staticmethod
+    def clave(product_id, version_catalogo, carrito_ids=()):
+        """Arma la clave a partir del producto, la versión del catálogo y el carrito"""
+        excluidos = ",".join(sorted({str(i) for i in carrito_ids if i and i != product_id}))
+        return f"{product_id}|{version_catalogo}|{excluidos}"
+
+    def obtener(self, clave):
+        """Devuelve el texto guardado o None si no existe o ya expiró"""
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is not None and self._expirada(entrada):
+                self._eliminar(clave)
+                entrada = None
+
+            if entrada is None:
+                self.fallos += 1
+                return None
+
+            self._entradas.move_to_end(clave)
+            self.aciertos += 1
+            return entrada[0]
+
+    def guardar(self, clave, texto):
+        """Guarda un texto y descarta las entradas menos usadas si se supera el límite"""
+        with self._lock:
+            creado_en = time.time()
+            self._entradas[clave] = (texto, creado_en)
+            self._entradas.move_to_end(clave)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO recomendaciones VALUES (?, ?, ?)",
+                    (clave, texto, creado_en)
+                )
+            while len(self._entradas) > self.max_entradas:
+                antigua = next(iter(self._entradas))
+                self._eliminar(antigua)
+            if self._db is not None:
+                self._db.commit()
+
+    def estadisticas(self):
+        """Contadores de aciertos/fallos para monitoreo"""
+        with self._lock:
+            consultas = self.aciertos + self.fallos
+            return {
+                'aciertos': self.aciertos,
+                'fallos': self.fallos,
+                'entradas': len(self._entradas),
+                'tasa_aciertos': self.aciertos / consultas if consultas else 0.0,
+            }
+
+    def _expirada(self, entrada):
+        return time.time() - entrada[1] > self.ttl
+
+    def _eliminar(self, clave):
+        self._entradas.pop(clave, None)
+        if self._db is not None:
+            self._db.execute("DELETE FROM recomendaciones WHERE clave = ?", (clave,))
+
+    def _abrir(self, ruta):
+        """Abre el almacén en disco y carga las entradas vigentes más recientes"""
+        self._db = sqlite3.connect(ruta, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS recomendaciones "
+            "(clave TEXT PRIMARY KEY, texto TEXT NOT NULL, creado_en REAL NOT NULL)"
+        )
+        self._db.execute(
+            "DELETE FROM recomendaciones WHERE creado_en < ?", (time.time() - self.ttl,)
+        )
+        self._db.commit()
+        filas = self._db.execute(
+            "SELECT clave, texto, creado_en FROM recomendaciones "
+            "ORDER BY creado_en DESC LIMIT ?", (self.max_entradas,)
+        ).fetchall()
+        # Las más recientes quedan al final, como las más usadas del LRU
+        for clave, texto, creado_en in reversed(filas):
+            self._entradas[clave] = (texto, creado_en)
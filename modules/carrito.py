@@ -0,0 +1,76 @@
+from firebase_admin import firestore
+from google.cloud.firestore_v1.field_path import FieldPath
+
+# Cada carrito es carts/{user_id} con 'items' como mapa product_id -> ítem,
+# así cada cambio es una sola escritura sobre un campo sin leer el documento.
+
+
+def _campo_item(product_id):
+    return FieldPath('items', product_id).to_api_repr()
+
+
+def agregar_item(db, user_id, product_id, name, price, cantidad=1):
+    """Suma unidades de un producto al carrito en una sola escritura atómica"""
+    db.collection('carts').document(user_id).set({
+        'user_id': user_id,
+        'items': {
+            product_id: {
+                'product_id': product_id,
+                'name': name,
+                'price': price,
+                'quantity': firestore.Increment(cantidad),
+                'added_at': firestore.SERVER_TIMESTAMP,
+            }
+        },
+        'updated_at': firestore.SERVER_TIMESTAMP,
+    }, merge=True)
+
+
+def quitar_item(db, user_id, product_id):
+    """Elimina un producto del carrito borrando solo su campo"""
+    db.collection('carts').document(user_id).update({
+        _campo_item(product_id): firestore.DELETE_FIELD,
+        'updated_at': firestore.SERVER_TIMESTAMP,
+    })
+
+
+def leer_carrito(db, user_id):
+    """Devuelve los ítems del carrito como lista, en orden de agregado"""
+    cart_ref = db.collection('carts').document(user_id)
+    cart_doc = cart_ref.get()
+    if not cart_doc.exists:
+        return []
+
+    items = cart_doc.to_dict().get('items', {})
+    if isinstance(items, list):
+        # Carrito con el formato anterior (lista): se migra al mapa por producto
+        items = _migrar(cart_ref, user_id, items)
+
+    return items_como_lista(items)
+
+
+def items_como_lista(items):
+    """Convierte el mapa de ítems (o la lista del formato anterior) en lista ordenada"""
+    if isinstance(items, list):
+        return [item for item in items if item.get('quantity', 0) > 0]
+    return sorted(
+        (item for item in items.values() if item.get('quantity', 0) > 0),
+        key=lambda item: str(item.get('added_at', ''))
+    )
+
+
+def _migrar(cart_ref, user_id, lista):
+    items = {}
+    for item in lista:
+        previo = items.get(item['product_id'])
+        if previo:
+            previo['quantity'] += item['quantity']
+        else:
+            items[item['product_id']] = dict(item)
+    cart_ref.set({'user_id': user_id, 'items': items, 'updated_at': firestore.SERVER_TIMESTAMP})
+    return items
+
+
+def vaciar_carrito(db, user_id):
+    """Elimina el carrito del usuario"""
+    db.collection('carts').document(user_id).delete()
@@ -0,0 +1,209 @@
+import hashlib
+import json
+import operator
+import threading
+import time
+from collections import deque
+from functools import partial, reduce
+
+# Versiones del catálogo cuyos cambios se recuerdan para actualizar índices derivados
+MAX_CAMBIOS = 64
+# Segundos que se espera la primera llamada del listener antes de leer la colección
+ESPERA_LISTENER = 10
+# Campos que afectan a la recomendación de un producto (además de si tiene stock)
+CAMPOS_HUELLA = ('name', 'description', 'category')
+
+
+class CatalogoCache:
+    """Catálogo de productos compartido por todas las sesiones del proceso.
+
+    Se carga desde el repositorio (modules/repositorio.py) con la primera
+    llamada de su listener de cambios, que trae el catálogo completo, y
+    después se mantiene al día aplicando solo los productos que cambiaron.
+    Si el backend no avisa de los cambios se lee la colección completa y
+    se vuelve a leer cuando vence el TTL.
+    """
+
+    def __init__(self, ttl=300, espera_listener=ESPERA_LISTENER):
+        self.ttl = ttl
+        self.espera_listener = espera_listener
+        self._lock = threading.RLock()
+        # Avisa a quien espera la primera llamada del listener
+        self._sincronizacion = threading.Condition(self._lock)
+        self._productos = None
+        self._por_id = {}
+        self._huellas = {}  # id -> huella del producto (entero)
+        self._xor = 0  # XOR de las huellas de todos los productos
+        self._cargado_en = 0.0
+        self._listener = None
+        # Cada suscripción nueva ignora las llamadas de las anteriores
+        self._generacion = 0
+        self._sincronizado = False
+        # Número que aumenta cada vez que cambian los datos del catálogo
+        self.version = 0
+        # Huella de lo que influye en las recomendaciones (textos y qué productos
+        # tienen stock): estable entre reinicios y entre compras que no agotan stock
+        self.huella = None
+        # (versión, ids de productos agregados/modificados/borrados en esa versión)
+        self._cambios = deque(maxlen=MAX_CAMBIOS)
+
+    def obtener(self, repo):
+        """Devuelve la lista de productos, recargándola solo si es necesario.
+
+        La lista es compartida entre sesiones: no debe modificarse.
+        """
+        with self._lock:
+            if self._productos is None or self._vencido():
+                self._cargar(repo)
+            return self._productos
+
+    def producto(self, product_id):
+        """Devuelve un producto por su id (o None) sin consultar Firestore"""
+        return self._por_id.get(product_id)
+
+    def cambios_desde(self, version):
+        """Ids de productos que cambiaron después de la versión dada.
+
+        Devuelve None si esa versión es demasiado vieja (hay que reconstruir
+        todo lo que se derive del catálogo).
+        """
+        with self._lock:
+            if version == self.version:
+                return set()
+            if not self._cambios or self._cambios[0][0] > version + 1:
+                return None
+            cambiados = set()
+            for v, ids in self._cambios:
+                if v > version:
+                    cambiados |= ids
+            return cambiados
+
+    def cambios_para(self, version):
+        """(versión actual, productos, cambios) leídos juntos bajo el lock.
+
+        cambios es {id: producto, o None si se borró} con lo que cambió
+        después de la versión dada, o None si hay que reconstruir todo. Así
+        un índice derivado nunca se marca con una versión que no aplicó.
+        """
+        with self._lock:
+            cambiados = self.cambios_desde(version) if version is not None else None
+            if cambiados is not None:
+                cambiados = {product_id: self._por_id.get(product_id) for product_id in cambiados}
+            return self.version, self._productos, cambiados
+
+    def invalidar(self):
+        """Fuerza la recarga del catálogo (y la suscripción) en la próxima lectura"""
+        with self._lock:
+            self._productos = None
+            if self._listener_activo():
+                self._listener.unsubscribe()
+            self._listener = None
+            self._generacion += 1
+            self._sincronizado = False
+
+    def _vencido(self):
+        if self._listener_activo() and self._sincronizado:
+            return False
+        return time.monotonic() - self._cargado_en > self.ttl
+
+    def _listener_activo(self):
+        return self._listener is not None and getattr(self._listener, 'is_active', False)
+
+    def _cargar(self, repo):
+        """Espera la primera llamada del listener; sin listener lee la colección"""
+        if self._escuchar(repo) and self._sincronizacion.wait_for(
+            lambda: self._sincronizado, self.espera_listener
+        ):
+            return
+        self._reemplazar(repo.listar_productos())
+
+    def _escuchar(self, repo):
+        """Se suscribe a los cambios de productos (una vez por proceso)"""
+        if self._listener_activo():
+            return True
+        self._generacion += 1
+        self._sincronizado = False
+        try:
+            self._listener = repo.escuchar_productos(partial(self._on_cambio, self._generacion))
+        except Exception:
+            # Sin listener seguimos funcionando con recarga por TTL
+            self._listener = None
+        return self._listener is not None
+
+    def _on_cambio(self, generacion, cambiados, borrados):
+        with self._lock:
+            if generacion != self._generacion:
+                return
+            if self._sincronizado:
+                self._aplicar(cambiados, borrados)
+            else:
+                # La primera llamada trae el catálogo completo
+                self._reemplazar(cambiados)
+                self._sincronizado = True
+                self._sincronizacion.notify_all()
+
+    def _reemplazar(self, productos):
+        """Carga el catálogo completo; solo se comparan y hashean los productos distintos"""
+        por_id = {p['id']: p for p in productos}
+        anteriores = self._por_id
+        cambiados = {i for i, p in por_id.items() if anteriores.get(i) != p}
+        borrados = anteriores.keys() - por_id.keys()
+        self._por_id = por_id
+        self._registrar(cambiados, borrados)
+
+    def _aplicar(self, cambiados, borrados):
+        """Aplica los productos agregados/modificados y los ids borrados"""
+        ids = set()
+        for p in cambiados:
+            if self._por_id.get(p['id']) != p:
+                self._por_id[p['id']] = p
+                ids.add(p['id'])
+        borrados = {i for i in borrados if i in self._por_id}
+        for product_id in borrados:
+            del self._por_id[product_id]
+        self._registrar(ids, borrados)
+
+    def _registrar(self, cambiados, borrados):
+        """Actualiza la lista compartida, la huella y la versión con los ids cambiados"""
+        if cambiados or borrados or self._productos is None:
+            # Lista nueva: las sesiones que recorren la anterior no la ven cambiar
+            self._productos = list(self._por_id.values())
+        if cambiados or borrados:
+            # XOR: se quita la huella anterior del producto y se suma la nueva
+            for product_id in borrados:
+                self._xor ^= self._huellas.pop(product_id, 0)
+            for product_id in cambiados:
+                nueva = _huella_entera(self._por_id[product_id])
+                self._xor ^= self._huellas.get(product_id, 0) ^ nueva
+                self._huellas[product_id] = nueva
+            self.version += 1
+            self._cambios.append((self.version, set(cambiados) | set(borrados)))
+        self.huella = format(self._xor, '016x')
+        self._cargado_en = time.monotonic()
+
+
+def huella_producto(producto):
+    """Hash de los datos del producto que influyen en su recomendación"""
+    datos = {campo: producto.get(campo) for campo in CAMPOS_HUELLA}
+    datos['en_stock'] = producto.get('stock', 0) > 0
+    contenido = json.dumps(datos, sort_keys=True, default=str)
+    return hashlib.sha1(contenido.encode('utf-8')).hexdigest()[:16]
+
+
+def _huella_entera(producto):
+    # Con el id: dos productos iguales no se anulan en el XOR
+    contenido = f"{producto.get('id')}|{huella_producto(producto)}"
+    return int(hashlib.sha1(contenido.encode('utf-8')).hexdigest()[:16], 16)
+
+
+def calcular_huella(productos):
+    """Hash estable de lo que influye en las recomendaciones (el mismo que CatalogoCache.huella).
+
+    El precio y las unidades de stock no cuentan: una compra solo cambia la
+    huella si deja un producto sin stock.
+    """
+    return format(reduce(operator.xor, (_huella_entera(p) for p in productos), 0), '016x')
+
+
+# Instancia única compartida por todas las sesiones del proceso
+catalogo = CatalogoCache()
@@ -0,0 +1,39 @@
+from firebase_admin import firestore
+
+# Productos por página en la grilla del catálogo
+TAMANO_PAGINA = 12
+
+
+def consulta_catalogo(db, categoria=None):
+    """Construye la consulta de productos con stock, filtrada por categoría en Firestore.
+
+    Requiere el índice compuesto products(category ASC, stock DESC).
+    """
+    query = db.collection('products').where('stock', '>', 0)
+    if categoria and categoria != "todos":
+        query = query.where('category', '==', categoria)
+    # La desigualdad sobre 'stock' obliga a ordenar por ese campo; Firestore
+    # desempata por id del documento, así el cursor es estable
+    return query.order_by('stock', direction=firestore.Query.DESCENDING)
+
+
+def obtener_pagina(db, categoria=None, cursor=None, tamano=TAMANO_PAGINA):
+    """Obtiene una página de productos.
+
+    Devuelve (productos, cursor_siguiente). cursor_siguiente es el último
+    documento leído (para usar con start_after) o None si no hay más páginas.
+    """
+    query = consulta_catalogo(db, categoria)
+    if cursor is not None:
+        query = query.start_after(cursor)
+    # Se pide un documento extra solo para saber si existe otra página
+    docs = list(query.limit(tamano + 1).stream())
+
+    productos = []
+    for doc in docs[:tamano]:
+        product = doc.to_dict()
+        product['id'] = doc.id
+        productos.append(product)
+
+    siguiente = docs[tamano - 1] if len(docs) > tamano else None
+    return productos, siguiente
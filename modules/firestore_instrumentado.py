@@ -0,0 +1,217 @@
+"""Cliente de Firestore que mide cada operación (ver modules/instrumentacion.py).
+
+Envuelve el cliente, las colecciones, las consultas, los documentos, los
+lotes y las transacciones: cada lectura o escritura es un span con su
+colección y la cantidad de documentos que Firestore factura. Todo lo que
+no se mide se delega sin cambios, y los objetos envueltos se desenvuelven
+al pasarlos al SDK (por ejemplo, una referencia dentro de una transacción).
+"""
+from modules.instrumentacion import medir
+
+# Métodos de consulta que devuelven otra consulta
+_METODOS_CONSULTA = (
+    'where', 'order_by', 'limit', 'limit_to_last', 'offset', 'select',
+    'start_at', 'start_after', 'end_at', 'end_before',
+)
+
+
+def _desenvolver(valor):
+    if isinstance(valor, _Envoltorio):
+        return valor._objetivo
+    if isinstance(valor, (list, tuple)):
+        return type(valor)(_desenvolver(v) for v in valor)
+    return valor
+
+
+def _argumentos(args, kwargs):
+    return [_desenvolver(a) for a in args], {k: _desenvolver(v) for k, v in kwargs.items()}
+
+
+def _coleccion(ruta):
+    """Nombre de la colección de una ruta 'a/b/c/d' (la del último documento)"""
+    partes = ruta.split('/')
+    return partes[-2] if len(partes) % 2 == 0 else partes[-1]
+
+
+class _Envoltorio:
+    __slots__ = ('_objetivo',)
+
+    def __init__(self, objetivo):
+        self._objetivo = objetivo
+
+    def __getattr__(self, nombre):
+        return getattr(self._objetivo, nombre)
+
+    def __eq__(self, otro):
+        return self._objetivo == _desenvolver(otro)
+
+    def __hash__(self):
+        return hash(self._objetivo)
+
+
+class FirestoreInstrumentado(_Envoltorio):
+    """Cliente de Firestore con cada operación medida"""
+
+    __slots__ = ()
+
+    def collection(self, *ruta):
+        return ConsultaInstrumentada(self._objetivo.collection(*ruta), '/'.join(ruta))
+
+    def document(self, *ruta):
+        return DocumentoInstrumentado(self._objetivo.document(*ruta))
+
+    def get_all(self, referencias, *args, **kwargs):
+        referencias = list(referencias)
+        coleccion = _coleccion(_desenvolver(referencias[0]).path) if referencias else ''
+        args, kwargs = _argumentos(args, kwargs)
+        with medir('firestore.get_all', coleccion, lecturas=max(1, len(referencias))):
+            return iter(list(self._objetivo.get_all(_desenvolver(referencias), *args, **kwargs)))
+
+    def batch(self):
+        return LoteInstrumentado(self._objetivo.batch())
+
+    def transaction(self, **kwargs):
+        return LoteInstrumentado(self._objetivo.transaction(**kwargs))
+
+
+class ConsultaInstrumentada(_Envoltorio):
+    """Colección o consulta: stream()/get() se miden y cuentan los documentos"""
+
+    __slots__ = ('_nombre',)
+
+    def __init__(self, objetivo, nombre):
+        super().__init__(objetivo)
+        self._nombre = nombre
+
+    def __getattr__(self, nombre):
+        atributo = getattr(self._objetivo, nombre)
+        if nombre not in _METODOS_CONSULTA:
+            return atributo
+
+        def consulta(*args, **kwargs):
+            args, kwargs = _argumentos(args, kwargs)
+            return ConsultaInstrumentada(atributo(*args, **kwargs), self._nombre)
+        return consulta
+
+    def document(self, *args):
+        return DocumentoInstrumentado(self._objetivo.document(*args))
+
+    def add(self, *args, **kwargs):
+        with medir('firestore.add', _coleccion(self._nombre), escrituras=1):
+            fecha, referencia = self._objetivo.add(*args, **kwargs)
+        return fecha, DocumentoInstrumentado(referencia)
+
+    def stream(self, *args, **kwargs):
+        args, kwargs = _argumentos(args, kwargs)
+        with medir('firestore.query', _coleccion(self._nombre)) as span:
+            documentos = list(self._objetivo.stream(*args, **kwargs))
+            # Firestore factura al menos una lectura por consulta
+            span.lecturas = max(1, len(documentos))
+        return iter(documentos)
+
+    def get(self, *args, **kwargs):
+        return list(self.stream(*args, **kwargs))
+
+
+class DocumentoInstrumentado(_Envoltorio):
+    """Referencia a un documento con sus lecturas y escrituras medidas"""
+
+    __slots__ = ()
+
+    def _medir(self, operacion, **cantidades):
+        return medir(f'firestore.{operacion}', _coleccion(self._objetivo.path), **cantidades)
+
+    def collection(self, *ruta):
+        return ConsultaInstrumentada(self._objetivo.collection(*ruta), f"{self._objetivo.path}/{'/'.join(ruta)}")
+
+    def get(self, *args, **kwargs):
+        args, kwargs = _argumentos(args, kwargs)
+        with self._medir('get', lecturas=1):
+            return self._objetivo.get(*args, **kwargs)
+
+    def set(self, *args, **kwargs):
+        with self._medir('set', escrituras=1):
+            return self._objetivo.set(*args, **kwargs)
+
+    def create(self, *args, **kwargs):
+        with self._medir('create', escrituras=1):
+            return self._objetivo.create(*args, **kwargs)
+
+    def update(self, *args, **kwargs):
+        with self._medir('update', escrituras=1):
+            return self._objetivo.update(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        with self._medir('delete', borrados=1):
+            return self._objetivo.delete(*args, **kwargs)
+
+
+class LoteInstrumentado(_Envoltorio):
+    """Lote o transacción: cada escritura se cuenta al agregarse al lote.
+
+    Solo se envuelven los métodos públicos: firestore.transactional confirma
+    la transacción con sus métodos privados, que se delegan sin cambios. Si
+    una transacción se reintenta, sus escrituras se cuentan otra vez.
+    """
+
+    __slots__ = ('_coleccion',)
+
+    def __init__(self, objetivo):
+        super().__init__(objetivo)
+        self._coleccion = ''
+
+    def _anotar(self, operacion, referencia, borrado=False):
+        coleccion = _coleccion(_desenvolver(referencia).path)
+        self._coleccion = coleccion if self._coleccion in ('', coleccion) else 'varias'
+        if borrado:
+            return medir(f'firestore.lote.{operacion}', coleccion, borrados=1)
+        return medir(f'firestore.lote.{operacion}', coleccion, escrituras=1)
+
+    def set(self, referencia, *args, **kwargs):
+        with self._anotar('set', referencia):
+            return self._objetivo.set(_desenvolver(referencia), *args, **kwargs)
+
+    def create(self, referencia, *args, **kwargs):
+        with self._anotar('create', referencia):
+            return self._objetivo.create(_desenvolver(referencia), *args, **kwargs)
+
+    def update(self, referencia, *args, **kwargs):
+        with self._anotar('update', referencia):
+            return self._objetivo.update(_desenvolver(referencia), *args, **kwargs)
+
+    def delete(self, referencia, *args, **kwargs):
+        with self._anotar('delete', referencia, borrado=True):
+            return self._objetivo.delete(_desenvolver(referencia), *args, **kwargs)
+
+    def get(self, referencia_o_consulta, *args, **kwargs):
+        """Lectura dentro de una transacción"""
+        objetivo = _desenvolver(referencia_o_consulta)
+        if isinstance(referencia_o_consulta, DocumentoInstrumentado):
+            with medir('firestore.get', _coleccion(objetivo.path), lecturas=1):
+                return iter(list(self._objetivo.get(objetivo, *args, **kwargs)))
+        nombre = getattr(referencia_o_consulta, '_nombre', '')
+        with medir('firestore.query', _coleccion(nombre)) as span:
+            documentos = list(self._objetivo.get(objetivo, *args, **kwargs))
+            span.lecturas = max(1, len(documentos))
+        return iter(documentos)
+
+    def get_all(self, referencias, *args, **kwargs):
+        referencias = list(referencias)
+        coleccion = _coleccion(_desenvolver(referencias[0]).path) if referencias else ''
+        with medir('firestore.get_all', coleccion, lecturas=max(1, len(referencias))):
+            return iter(list(self._objetivo.get_all(_desenvolver(referencias), *args, **kwargs)))
+
+    def commit(self, *args, **kwargs):
+        """Confirma el lote; sus escrituras ya se contaron en set/update/delete"""
+        with medir('firestore.commit', self._coleccion):
+            try:
+                return self._objetivo.commit(*args, **kwargs)
+            finally:
+                self._coleccion = ''
+
+
+def instrumentar(db):
+    """Envuelve un cliente de Firestore (una sola vez)"""
+    if db is None or isinstance(db, FirestoreInstrumentado):
+        return db
+    return FirestoreInstrumentado(db)
@@ -0,0 +1,230 @@
+import base64
+import hashlib
+import io
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from pathlib import Path
+from urllib.parse import urlparse
+from urllib.request import url2pathname
+
+import requests
+from requests.adapters import HTTPAdapter
+from PIL import Image, features
+
+from modules import tareas
+
+# Las miniaturas se sirven con el static serving de Streamlit
+# (server.enableStaticServing): static/miniaturas/x.webp -> app/static/miniaturas/x.webp
+DIRECTORIO = Path(__file__).resolve().parent.parent / "static" / "miniaturas"
+URL_ESTATICA = "app/static/miniaturas"
+
+# Las tarjetas muestran la imagen a 200px de alto: 2x para pantallas de alta densidad
+TAMANO = (480, 400)
+CALIDAD = 80
+FORMATO, EXTENSION, MIME = ("WEBP", "webp", "image/webp") if features.check("webp") else ("JPEG", "jpg", "image/jpeg")
+
+# Tope del caché en disco; al superarlo se borran las menos usadas
+MAX_BYTES = 64 * 1024 * 1024
+# Miniaturas de hasta este tamaño van embebidas como data-URI (sin otra petición)
+MAX_DATA_URI = 4 * 1024
+TIMEOUT = (3.05, 10)
+# Imágenes originales más grandes no se descargan (ni se leen del disco)
+MAX_DESCARGA = 10 * 1024 * 1024
+# Segundos que se conserva en disco una miniatura desalojada: las páginas
+# ya enviadas al navegador pueden seguir pidiéndola
+GRACIA = 600
+# Segundos antes de reintentar una imagen que no se pudo descargar
+REINTENTO = 600
+# Hilos y miniaturas pendientes de la cola propia de las miniaturas: una
+# grilla grande no puede ocupar la de modules/tareas (recomendaciones)
+HILOS = 4
+MAX_PENDIENTES = 64
+
+
+class ImagenDemasiadoGrande(Exception):
+    """La imagen original supera MAX_DESCARGA"""
+
+
+class ImagenNoPermitida(Exception):
+    """Ruta local fuera del directorio de imágenes locales (o sin directorio configurado)"""
+
+
+def clave(url):
+    """Nombre de la miniatura: hash de la URL original"""
+    return hashlib.sha1(url.encode("utf-8")).hexdigest()[:20]
+
+
+class CacheMiniaturas:
+    """Miniaturas en disco con desalojo LRU, compartidas por todas las sesiones.
+
+    src() nunca bloquea el render: si la miniatura no existe todavía, la pide
+    en segundo plano y mientras tanto devuelve la URL original.
+    """
+
+    def __init__(self, directorio=DIRECTORIO, tamano=TAMANO, max_bytes=MAX_BYTES, directorio_local=None):
+        self.directorio = Path(directorio)
+        # Único directorio del que se leen imágenes locales (file:// o rutas);
+        # sin él, el campo image de un producto solo puede ser http(s)
+        self.directorio_local = Path(directorio_local).resolve() if directorio_local else None
+        self.tamano = tamano
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # clave -> (src, bytes), en orden de uso (el último es el más reciente)
+        self._indice = OrderedDict()
+        self._bytes = 0
+        self._en_curso = set()
+        self._fallidas = {}
+        # (momento en que se puede borrar, clave) de las miniaturas desalojadas
+        self._por_borrar = deque()
+        self._cargado = False
+        self._lock_carga = threading.Lock()
+        self._cola = tareas.ColaTareas(HILOS, MAX_PENDIENTES, "megamoda-miniaturas")
+
+        self.sesion = requests.Session()
+        self.sesion.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=8))
+        self.sesion.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=8))
+
+    def src(self, url):
+        """URL (o data-URI) de la miniatura, o la URL original mientras se genera"""
+        if not url:
+            return url
+        self._cargar()
+        k = clave(url)
+        with self._lock:
+            entrada = self._indice.get(k)
+            if entrada is not None:
+                self._indice.move_to_end(k)
+                return entrada[0]
+            if k in self._en_curso or time.monotonic() < self._fallidas.get(k, 0):
+                return url
+            self._en_curso.add(k)
+
+        if self._cola.enviar(self._generar_en_segundo_plano, url, k) is None:
+            # Cola llena: se volverá a intentar en el próximo render
+            with self._lock:
+                self._en_curso.discard(k)
+        return url
+
+    def generar(self, url):
+        """Genera (si hace falta) y devuelve el src de la miniatura"""
+        self._cargar()
+        k = clave(url)
+        with self._lock:
+            entrada = self._indice.get(k)
+        if entrada is not None:
+            return entrada[0]
+
+        contenido = self._miniatura(self._descargar(url))
+        self.directorio.mkdir(parents=True, exist_ok=True)
+        ruta = self.directorio / f"{k}.{EXTENSION}"
+        temporal = ruta.with_suffix(".tmp")
+        temporal.write_bytes(contenido)
+        os.replace(temporal, ruta)
+        return self._registrar(k, ruta, len(contenido), contenido)
+
+    def _generar_en_segundo_plano(self, url, k):
+        try:
+            return self.generar(url)
+        except Exception:
+            # La tarjeta sigue usando la URL original hasta el próximo intento
+            with self._lock:
+                self._fallidas[k] = time.monotonic() + REINTENTO
+            raise
+        finally:
+            with self._lock:
+                self._en_curso.discard(k)
+
+    def _descargar(self, url):
+        """Bytes de la imagen original; lanza ImagenDemasiadoGrande si supera MAX_DESCARGA"""
+        partes = urlparse(url)
+        if partes.scheme in ("http", "https"):
+            with self.sesion.get(url, timeout=TIMEOUT, stream=True) as response:
+                response.raise_for_status()
+                if int(response.headers.get("Content-Length") or 0) > MAX_DESCARGA:
+                    raise ImagenDemasiadoGrande(url)
+                # Content-Length puede faltar o mentir: se corta al pasar el tope
+                datos = bytearray()
+                for parte in response.iter_content(64 * 1024):
+                    datos += parte
+                    if len(datos) > MAX_DESCARGA:
+                        raise ImagenDemasiadoGrande(url)
+                return bytes(datos)
+        # file:// o ruta local (imágenes de ejemplo y pruebas sin red), solo
+        # dentro de directorio_local: nunca cualquier archivo del servidor
+        if self.directorio_local is None:
+            raise ImagenNoPermitida(url)
+        ruta = (self.directorio_local / (url2pathname(partes.path) if partes.scheme == "file" else url)).resolve()
+        if not ruta.is_relative_to(self.directorio_local):
+            raise ImagenNoPermitida(url)
+        if ruta.stat().st_size > MAX_DESCARGA:
+            raise ImagenDemasiadoGrande(url)
+        return ruta.read_bytes()
+
+    def _miniatura(self, datos):
+        with Image.open(io.BytesIO(datos)) as imagen:
+            imagen.draft("RGB", self.tamano)  # los JPEG se decodifican ya reducidos
+            imagen = imagen.convert("RGB")
+            imagen.thumbnail(self.tamano, Image.LANCZOS)
+            salida = io.BytesIO()
+            if FORMATO == "WEBP":
+                imagen.save(salida, FORMATO, quality=CALIDAD, method=4)
+            else:
+                imagen.save(salida, FORMATO, quality=CALIDAD, optimize=True, progressive=True)
+            return salida.getvalue()
+
+    def _registrar(self, k, ruta, tamano, contenido=None):
+        if tamano <= MAX_DATA_URI:
+            if contenido is None:
+                contenido = ruta.read_bytes()
+            src = f"data:{MIME};base64,{base64.b64encode(contenido).decode('ascii')}"
+        else:
+            src = f"{URL_ESTATICA}/{ruta.name}"
+
+        with self._lock:
+            previa = self._indice.pop(k, None)
+            if previa is not None:
+                self._bytes -= previa[1]
+            self._indice[k] = (src, tamano)
+            self._bytes += tamano
+            ahora = time.monotonic()
+            while self._bytes > self.max_bytes and len(self._indice) > 1:
+                vieja, (_, liberados) = self._indice.popitem(last=False)
+                self._bytes -= liberados
+                self._por_borrar.append((ahora + GRACIA, vieja))
+            while self._por_borrar and self._por_borrar[0][0] <= ahora:
+                vieja = self._por_borrar.popleft()[1]
+                # Si se volvió a generar (o se está generando), el archivo es el nuevo
+                if vieja not in self._indice and vieja not in self._en_curso:
+                    (self.directorio / f"{vieja}.{EXTENSION}").unlink(missing_ok=True)
+        return src
+
+    def _cargar(self):
+        """Reconstruye el índice desde el disco una vez por proceso (más viejas primero).
+
+        Las demás llamadas esperan a que termine: si no, no encontrarían en el
+        índice miniaturas que ya están en disco y las volverían a generar.
+        """
+        if self._cargado:
+            return
+        with self._lock_carga:
+            if self._cargado:
+                return
+            if self.directorio.is_dir():
+                archivos = sorted(
+                    ((ruta.stat(), ruta) for ruta in self.directorio.glob(f"*.{EXTENSION}")),
+                    key=lambda par: par[0].st_mtime
+                )
+                for estado, ruta in archivos:
+                    self._registrar(ruta.stem, ruta, estado.st_size)
+            self._cargado = True
+
+    def estadisticas(self):
+        with self._lock:
+            return {'miniaturas': len(self._indice), 'bytes': self._bytes, 'en_curso': len(self._en_curso)}
+
+
+# Caché único por proceso; IMAGENES_LOCALES habilita las imágenes locales
+# de ese directorio (desarrollo y pruebas sin red)
+miniaturas = CacheMiniaturas(directorio_local=os.environ.get("IMAGENES_LOCALES"))
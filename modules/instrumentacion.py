@@ -0,0 +1,439 @@
+"""Instrumentación del camino caliente: spans por acción y métricas del proceso.
+
+Una acción es un rerun de página, el rerun de un fragmento o una tarea en
+segundo plano. Cada operación medida (Firestore, OpenAI, PayPal...) es un
+span que se suma a la acción en curso de su hilo, junto con las lecturas y
+escrituras de documentos y los tokens consumidos. Al terminar, la acción se
+escribe como una línea JSON en el logger "megamoda.instrumentacion" y se
+agrega a las métricas del proceso, que se pueden exportar en el formato de
+texto de Prometheus.
+"""
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict, defaultdict, deque
+from contextlib import contextmanager
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+logger = logging.getLogger("megamoda.instrumentacion")
+
+# Duraciones recientes que se guardan por acción/span para calcular percentiles
+MUESTRAS = 2048
+# Acciones completas que se guardan para la página de administración
+RECIENTES = 50
+CUANTILES = (0.5, 0.95, 0.99)
+# Segundos tras los que se cierra una acción abierta que nadie cerró (sesión
+# desconectada o que terminó con st.stop()/st.switch_page sin volver a correr)
+ABIERTA_MAX = 300
+# Acciones abiertas como máximo; al superarlo se cierran las más viejas
+MAX_ABIERTAS = 1000
+
+
+class Span:
+    """Una operación medida dentro de una acción"""
+
+    __slots__ = ('nombre', 'coleccion', 'inicio', 'duracion', 'lecturas', 'escrituras', 'borrados')
+
+    def __init__(self, nombre, coleccion='', lecturas=0, escrituras=0, borrados=0):
+        self.nombre = nombre
+        self.coleccion = coleccion
+        self.inicio = time.perf_counter()
+        self.duracion = 0.0
+        self.lecturas = lecturas
+        self.escrituras = escrituras
+        self.borrados = borrados
+
+
+class Traza:
+    """Spans, operaciones de Firestore, tokens y caminos de una acción"""
+
+    def __init__(self, accion=None):
+        self.accion = accion
+        self.clave = None
+        # Hilo que la abrió y momento de su última operación
+        self.hilo = threading.get_ident()
+        self.inicio = self.ultimo = time.perf_counter()
+        self.fecha = time.time()
+        self.duracion = 0.0
+        self.spans = []
+        self.lecturas = 0
+        self.escrituras = 0
+        self.borrados = 0
+        self.tokens = defaultdict(int)
+        self.caminos = {}
+
+    def agregar(self, span):
+        self.spans.append(span)
+        self.ultimo = span.inicio + span.duracion
+        self.lecturas += span.lecturas
+        self.escrituras += span.escrituras
+        self.borrados += span.borrados
+
+    def resumen(self):
+        """Datos de la acción con los spans agrupados por operación"""
+        grupos = {}
+        for span in self.spans:
+            clave = f"{span.nombre}:{span.coleccion}" if span.coleccion else span.nombre
+            grupo = grupos.setdefault(clave, {'n': 0, 'ms': 0.0})
+            grupo['n'] += 1
+            grupo['ms'] += span.duracion * 1000
+        for grupo in grupos.values():
+            grupo['ms'] = round(grupo['ms'], 2)
+        return {
+            'accion': self.accion,
+            'fecha': self.fecha,
+            'ms': round(self.duracion * 1000, 2),
+            'lecturas': self.lecturas,
+            'escrituras': self.escrituras,
+            'borrados': self.borrados,
+            'tokens': dict(self.tokens),
+            'caminos': dict(self.caminos),
+            'spans': grupos,
+        }
+
+
+class Metricas:
+    """Agregados del proceso: duraciones recientes, totales y acciones completas"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reiniciar()
+
+    def reiniciar(self):
+        with self._lock:
+            # (tipo, nombre, coleccion) -> duraciones recientes; tipo es 'accion' o 'span'
+            self._duraciones = defaultdict(lambda: deque(maxlen=MUESTRAS))
+            # (tipo, nombre, coleccion) -> [cantidad, segundos]
+            self._totales = defaultdict(lambda: [0, 0.0])
+            # (coleccion, 'lecturas'|'escrituras'|'borrados') -> documentos
+            self._documentos = defaultdict(int)
+            # (modelo, 'prompt'|'completion') -> tokens
+            self._tokens = defaultdict(int)
+            # (operacion, camino) -> veces que ese camino resolvió la operación
+            self._caminos = defaultdict(int)
+            self._recientes = deque(maxlen=RECIENTES)
+
+    def _sumar_duracion(self, clave, segundos):
+        self._duraciones[clave].append(segundos)
+        total = self._totales[clave]
+        total[0] += 1
+        total[1] += segundos
+
+    def registrar_span(self, span):
+        with self._lock:
+            self._sumar_duracion(('span', span.nombre, span.coleccion), span.duracion)
+            for tipo in ('lecturas', 'escrituras', 'borrados'):
+                cantidad = getattr(span, tipo)
+                if cantidad:
+                    self._documentos[(span.coleccion, tipo)] += cantidad
+
+    def registrar_tokens(self, modelo, prompt, completion):
+        with self._lock:
+            self._tokens[(modelo, 'prompt')] += prompt
+            self._tokens[(modelo, 'completion')] += completion
+
+    def registrar_camino(self, operacion, camino):
+        with self._lock:
+            self._caminos[(operacion, camino)] += 1
+
+    def registrar_traza(self, traza):
+        resumen = traza.resumen()
+        with self._lock:
+            self._sumar_duracion(('accion', traza.accion, ''), traza.duracion)
+            self._recientes.append(resumen)
+        return resumen
+
+    def _muestras(self, tipo):
+        """(nombre, coleccion, duraciones ordenadas, cantidad, segundos) de cada acción o span"""
+        with self._lock:
+            copia = [
+                (clave, list(valores), tuple(self._totales[clave]))
+                for clave, valores in self._duraciones.items() if clave[0] == tipo
+            ]
+        return [
+            (nombre, coleccion, sorted(valores), cantidad, segundos)
+            for (_, nombre, coleccion), valores, (cantidad, segundos) in sorted(copia, key=lambda c: c[0])
+        ]
+
+    def percentiles(self, tipo):
+        """Filas con cantidad, p50, p95, máximo y total por acción o por span"""
+        return [{
+            'nombre': nombre,
+            'coleccion': coleccion,
+            'cantidad': cantidad,
+            'p50_ms': _cuantil(valores, 0.5) * 1000,
+            'p95_ms': _cuantil(valores, 0.95) * 1000,
+            'max_ms': valores[-1] * 1000,
+            'total_s': segundos,
+        } for nombre, coleccion, valores, cantidad, segundos in self._muestras(tipo)]
+
+    def documentos(self):
+        with self._lock:
+            return dict(self._documentos)
+
+    def tokens(self):
+        with self._lock:
+            return dict(self._tokens)
+
+    def caminos(self):
+        with self._lock:
+            return dict(self._caminos)
+
+    def recientes(self):
+        with self._lock:
+            return list(self._recientes)
+
+    def prometheus(self):
+        """Métricas en el formato de texto de Prometheus"""
+        lineas = []
+        for tipo, metrica, etiqueta, ayuda in (
+            ('accion', 'megamoda_accion_segundos', 'accion', "Duración de cada acción (rerun, fragmento o tarea)"),
+            ('span', 'megamoda_operacion_segundos', 'operacion', "Duración de cada operación medida"),
+        ):
+            lineas += [f"# HELP {metrica} {ayuda}", f"# TYPE {metrica} summary"]
+            for nombre, coleccion, valores, cantidad, segundos in self._muestras(tipo):
+                etiquetas = f'{etiqueta}="{_escapar(nombre)}"'
+                if coleccion:
+                    etiquetas += f',coleccion="{_escapar(coleccion)}"'
+                for q in CUANTILES:
+                    lineas.append(f'{metrica}{{{etiquetas},quantile="{q}"}} {_cuantil(valores, q):.6f}')
+                lineas.append(f"{metrica}_sum{{{etiquetas}}} {segundos:.6f}")
+                lineas.append(f"{metrica}_count{{{etiquetas}}} {cantidad}")
+
+        lineas += ["# HELP megamoda_firestore_documentos_total Documentos leídos, escritos y borrados",
+                   "# TYPE megamoda_firestore_documentos_total counter"]
+        for (coleccion, tipo), cantidad in sorted(self.documentos().items()):
+            lineas.append(f'megamoda_firestore_documentos_total{{coleccion="{_escapar(coleccion)}",'
+                          f'tipo="{tipo}"}} {cantidad}')
+
+        lineas += ["# HELP megamoda_llm_tokens_total Tokens consumidos por modelo",
+                   "# TYPE megamoda_llm_tokens_total counter"]
+        for (modelo, tipo), cantidad in sorted(self.tokens().items()):
+            lineas.append(f'megamoda_llm_tokens_total{{modelo="{_escapar(modelo)}",tipo="{tipo}"}} {cantidad}')
+
+        lineas += ["# HELP megamoda_camino_total Camino que resolvió cada operación (caché, remoto, respaldo local)",
+                   "# TYPE megamoda_camino_total counter"]
+        for (operacion, camino), cantidad in sorted(self.caminos().items()):
+            lineas.append(f'megamoda_camino_total{{operacion="{_escapar(operacion)}",'
+                          f'camino="{_escapar(camino)}"}} {cantidad}')
+        return "\n".join(lineas) + "\n"
+
+
+def _cuantil(valores_ordenados, q):
+    if not valores_ordenados:
+        return 0.0
+    return valores_ordenados[min(len(valores_ordenados) - 1, int(q * len(valores_ordenados)))]
+
+
+def _escapar(valor):
+    return str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+# Métricas únicas del proceso, compartidas por todas las sesiones
+metricas = Metricas()
+
+# Acción abierta de cada sesión de Streamlit (o de cada hilo en segundo plano),
+# en el orden en que se abrieron
+_abiertas = OrderedDict()
+_lock_abiertas = threading.Lock()
+
+
+def _clave():
+    """Sesión de Streamlit del hilo actual, o el hilo si no pertenece a una sesión"""
+    ctx = get_script_run_ctx(suppress_warning=True)
+    if ctx is None:
+        return ('hilo', threading.get_ident()), False
+    return ('sesion', ctx.session_id), True
+
+
+def _abrir(clave, accion=None):
+    """Abre la acción de la clave; de paso cierra las abandonadas (ver ABIERTA_MAX)"""
+    traza = Traza(accion)
+    traza.clave = clave
+    limite = traza.inicio - ABIERTA_MAX
+    abandonadas = []
+    with _lock_abiertas:
+        _abiertas.pop(clave, None)
+        while _abiertas:
+            vieja = next(iter(_abiertas.values()))
+            if vieja.inicio > limite and len(_abiertas) < MAX_ABIERTAS:
+                break
+            abandonadas.append(vieja)
+            _abiertas.popitem(last=False)
+        _abiertas[clave] = traza
+    for vieja in abandonadas:
+        _registrar_cierre(vieja, vieja.ultimo)
+    return traza
+
+
+def _abierta(clave):
+    """Acción abierta por este hilo.
+
+    Si la abrió un hilo anterior de la misma sesión, ese rerun terminó con
+    st.stop() sin llegar a cerrarla: se cierra en su última operación.
+    """
+    traza = _abiertas.get(clave)
+    if traza is not None and traza.hilo != threading.get_ident():
+        _cerrar(traza, traza.ultimo)
+        traza = None
+    return traza
+
+
+def _traza_actual():
+    """Acción en curso; en el hilo de una sesión la abre si no existe.
+
+    Los callbacks de los widgets corren en el hilo de la sesión antes que el
+    script, así que sus spans quedan en la acción que después toma el rerun.
+    """
+    clave, en_sesion = _clave()
+    traza = _abierta(clave)
+    if traza is None and en_sesion:
+        traza = _abrir(clave)
+    return traza
+
+
+def _cerrar(traza, fin=None):
+    """Cierra la acción una sola vez (pudo cerrarla ya otro hilo o _abrir())"""
+    with _lock_abiertas:
+        if _abiertas.get(traza.clave) is not traza:
+            return
+        del _abiertas[traza.clave]
+    _registrar_cierre(traza, fin)
+
+
+def _registrar_cierre(traza, fin=None):
+    traza.duracion = (fin or time.perf_counter()) - traza.inicio
+    resumen = metricas.registrar_traza(traza)
+    logger.info(json.dumps({'evento': 'accion', **resumen}, ensure_ascii=False))
+
+
+# --- API para el código instrumentado ---
+
+@contextmanager
+def medir(nombre, coleccion='', lecturas=0, escrituras=0, borrados=0):
+    """Mide una operación; el span puede ajustar sus cantidades antes de cerrarse"""
+    span = Span(nombre, coleccion, lecturas, escrituras, borrados)
+    try:
+        yield span
+    finally:
+        span.duracion = time.perf_counter() - span.inicio
+        metricas.registrar_span(span)
+        traza = _traza_actual()
+        if traza is not None:
+            traza.agregar(span)
+
+
+def medido(nombre):
+    """Decorador de medir() para funciones"""
+    def decorador(funcion):
+        @wraps(funcion)
+        def envoltura(*args, **kwargs):
+            with medir(nombre):
+                return funcion(*args, **kwargs)
+        return envoltura
+    return decorador
+
+
+def registrar_tokens(modelo, prompt, completion):
+    """Suma los tokens de una llamada al LLM a la acción en curso y al proceso"""
+    metricas.registrar_tokens(modelo, prompt or 0, completion or 0)
+    traza = _traza_actual()
+    if traza is not None:
+        traza.tokens[f"{modelo}:prompt"] += prompt or 0
+        traza.tokens[f"{modelo}:completion"] += completion or 0
+
+
+def registrar_camino(operacion, camino):
+    """Cuenta qué camino resolvió la operación, en el proceso y en la acción en curso"""
+    metricas.registrar_camino(operacion, camino)
+    traza = _traza_actual()
+    if traza is not None:
+        traza.caminos[operacion] = camino
+
+
+def iniciar_rerun(pagina):
+    """Marca el comienzo del rerun de una página (primera línea del script).
+
+    Si el rerun anterior terminó con st.rerun o st.switch_page, no llegó a
+    finalizar_rerun(): se cierra ahora. Si hay una acción sin página, la
+    abrieron los callbacks de este mismo rerun y pasa a ser la de la página.
+    """
+    clave, _ = _clave()
+    traza = _abierta(clave)
+    if traza is not None and traza.accion is not None:
+        _cerrar(traza)
+        traza = None
+    if traza is None:
+        traza = _abrir(clave)
+    traza.accion = pagina
+
+
+def finalizar_rerun():
+    """Cierra el rerun de la página (última línea del script)"""
+    traza = _abierta(_clave()[0])
+    if traza is not None:
+        _cerrar(traza)
+
+
+@contextmanager
+def accion(nombre):
+    """Acción independiente (fragmento o tarea en segundo plano).
+
+    Dentro de otra acción, por ejemplo un fragmento que se dibuja con toda la
+    página, se mide como un span más de esa acción.
+    """
+    clave, _ = _clave()
+    traza = _abierta(clave)
+    if traza is not None and traza.accion is not None:
+        with medir(nombre):
+            yield
+        return
+    if traza is None:
+        traza = _abrir(clave)
+    traza.accion = nombre
+    try:
+        yield
+    finally:
+        _cerrar(traza)
+
+
+def instrumentado(nombre):
+    """Decorador de accion() para fragmentos y funciones que corren en segundo plano"""
+    def decorador(funcion):
+        @wraps(funcion)
+        def envoltura(*args, **kwargs):
+            with accion(nombre):
+                return funcion(*args, **kwargs)
+        return envoltura
+    return decorador
+
+
+# --- Exportación para Prometheus ---
+
+class _ManejadorMetricas(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        contenido = metricas.prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(contenido)))
+        self.end_headers()
+        self.wfile.write(contenido)
+
+    def log_message(self, formato, *args):
+        pass
+
+
+def servir_metricas(puerto, host="127.0.0.1"):
+    """Expone /metrics en un hilo propio; devuelve el servidor HTTP"""
+    servidor = ThreadingHTTPServer((host, puerto), _ManejadorMetricas)
+    servidor.daemon_threads = True
+    threading.Thread(target=servidor.serve_forever, name="megamoda-metricas", daemon=True).start()
+    logger.info("métricas en http://%s:%s/metrics", host, servidor.server_address[1])
+    return servidor
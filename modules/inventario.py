@@ -0,0 +1,56 @@
+from firebase_admin import firestore
+
+
+def calcular_descuentos(items, stock):
+    """Calcula cuánto descontar de cada producto sin dejar el stock por debajo de cero.
+
+    stock es product_id -> unidades disponibles (los productos que no
+    figuran se toman como agotados). Devuelve (descuentos, faltantes), con
+    descuentos como product_id -> unidades a descontar.
+    """
+    cantidades = {}
+    nombres = {}
+    for item in items:
+        cantidades[item['product_id']] = cantidades.get(item['product_id'], 0) + item['quantity']
+        nombres[item['product_id']] = item.get('name')
+
+    descuentos = {}
+    faltantes = []
+    for product_id, pedido in cantidades.items():
+        disponible = max(stock.get(product_id, 0), 0)
+        descuento = min(pedido, disponible)
+        if descuento < pedido:
+            faltantes.append({
+                'product_id': product_id,
+                'name': nombres[product_id],
+                'pedido': pedido,
+                'disponible': disponible,
+            })
+        if descuento:
+            descuentos[product_id] = descuento
+
+    return descuentos, faltantes
+
+
+def preparar_descuento(transaction, db, items):
+    """Lee el stock dentro de la transacción y agrega los descuentos.
+
+    Lee todos los productos con un único get_all y descuenta con
+    Increment(-cantidad); el commit queda a cargo de quien llama. Devuelve
+    la lista de faltantes.
+    """
+    refs = {}
+    for item in items:
+        if item['product_id'] not in refs:
+            refs[item['product_id']] = db.collection('products').document(item['product_id'])
+
+    stock = {
+        snap.id: snap.to_dict().get('stock', 0)
+        for snap in db.get_all(list(refs.values()), transaction=transaction)
+        if snap.exists
+    }
+    descuentos, faltantes = calcular_descuentos(items, stock)
+    for product_id, descuento in descuentos.items():
+        transaction.update(refs[product_id], {'stock': firestore.Increment(-descuento)})
+
+    return faltantes
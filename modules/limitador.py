@@ -0,0 +1,169 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from contextlib import contextmanager
+
+
+class LimiteExcedido(Exception):
+    """La llamada no consiguió turno dentro de la espera máxima"""
+
+
+class SingleFlight:
+    """Une las llamadas concurrentes con la misma clave en una sola ejecución.
+
+    La primera llamada (la líder) ejecuta la función; las que llegan con la
+    misma clave mientras tanto esperan y reciben su resultado o su excepción.
+    Al terminar la clave se libera: no es una caché.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._en_curso = {}  # clave -> Future con el resultado de la líder
+        self.ejecutadas = 0
+        self.compartidas = 0
+
+    def ejecutar(self, clave, funcion, *args, **kwargs):
+        with self._lock:
+            futuro = self._en_curso.get(clave)
+            lider = futuro is None
+            if lider:
+                futuro = self._en_curso[clave] = Future()
+                self.ejecutadas += 1
+            else:
+                self.compartidas += 1
+        if not lider:
+            return futuro.result()
+
+        try:
+            resultado = funcion(*args, **kwargs)
+        except BaseException as e:
+            futuro.set_exception(e)
+            raise
+        else:
+            futuro.set_result(resultado)
+            return resultado
+        finally:
+            with self._lock:
+                del self._en_curso[clave]
+
+    def estadisticas(self):
+        with self._lock:
+            return {
+                'ejecutadas': self.ejecutadas,
+                'compartidas': self.compartidas,
+                'en_curso': len(self._en_curso),
+            }
+
+
+class CuboTokens:
+    """Limitador de tasa (token bucket) con una cola de espera por orden de llegada.
+
+    Se recargan `tasa` tokens por segundo hasta `capacidad` (la ráfaga
+    admitida); cada llamada consume uno. Las que no encuentran token esperan
+    en la cola, y la primera duerme justo hasta la próxima recarga.
+    """
+
+    def __init__(self, tasa, capacidad=1, max_cola=None):
+        # Con tasa 0 la espera sería infinita (o una división por cero) y con
+        # capacidad menor que 1 nunca se junta un token entero
+        if not tasa > 0:
+            raise ValueError(f"la tasa del limitador debe ser mayor que 0 (recibida: {tasa!r})")
+        if not capacidad >= 1:
+            raise ValueError(f"la capacidad del limitador debe ser al menos 1 (recibida: {capacidad!r})")
+        self.tasa = tasa
+        self.capacidad = capacidad
+        self.max_cola = max_cola
+        self._tokens = float(capacidad)
+        self._actualizado = time.monotonic()
+        self._cola = deque()
+        self._cambio = threading.Condition()
+
+    def _recargar(self):
+        ahora = time.monotonic()
+        self._tokens = min(self.capacidad, self._tokens + (ahora - self._actualizado) * self.tasa)
+        self._actualizado = ahora
+
+    def adquirir(self, timeout=None):
+        """Espera su turno y un token; False si la cola está llena o pasa el timeout"""
+        limite = None if timeout is None else time.monotonic() + timeout
+        turno = object()
+        with self._cambio:
+            if self.max_cola is not None and len(self._cola) >= self.max_cola:
+                return False
+            self._cola.append(turno)
+            try:
+                while True:
+                    self._recargar()
+                    primero = self._cola[0] is turno
+                    if primero and self._tokens >= 1:
+                        self._tokens -= 1
+                        return True
+                    espera = (1 - self._tokens) / self.tasa if primero else None
+                    if limite is not None:
+                        restante = limite - time.monotonic()
+                        if restante <= 0:
+                            return False
+                        espera = restante if espera is None else min(espera, restante)
+                    self._cambio.wait(espera)
+            finally:
+                self._cola.remove(turno)
+                # El siguiente de la cola pasa a esperar la recarga
+                self._cambio.notify_all()
+
+    @property
+    def en_cola(self):
+        with self._cambio:
+            return len(self._cola)
+
+
+class Limitador:
+    """Tasa y concurrencia máximas para las llamadas a un servicio externo.
+
+    Cada llamada espera primero un token del cubo (por minuto, con ráfaga)
+    y después un lugar entre las `concurrencia` llamadas en curso. Si no lo
+    consigue en `espera_max` segundos se lanza LimiteExcedido, en lugar de
+    acumular esperas o provocar una tormenta de 429.
+    """
+
+    def __init__(self, por_minuto=60, rafaga=10, concurrencia=4, espera_max=10.0, max_cola=None):
+        if not por_minuto > 0:
+            raise ValueError(f"por_minuto debe ser mayor que 0 (recibido: {por_minuto!r})")
+        if not concurrencia >= 1:
+            raise ValueError(f"concurrencia debe ser al menos 1 (recibida: {concurrencia!r})")
+        self.cubo = CuboTokens(por_minuto / 60, capacidad=rafaga, max_cola=max_cola)
+        self.concurrencia = concurrencia
+        self.espera_max = espera_max
+        self.rechazadas = 0
+        self._cupos = threading.BoundedSemaphore(concurrencia)
+        self._lock = threading.Lock()
+
+    def _rechazar(self, motivo):
+        with self._lock:
+            self.rechazadas += 1
+        raise LimiteExcedido(motivo)
+
+    def entrar(self):
+        """Espera el turno de una llamada; lanza LimiteExcedido si no llega a tiempo"""
+        inicio = time.monotonic()
+        if not self.cubo.adquirir(self.espera_max):
+            self._rechazar(f"sin turno para llamar al servicio en {self.espera_max:g}s (límite de tasa)")
+        restante = max(0.0, self.espera_max - (time.monotonic() - inicio))
+        if not self._cupos.acquire(timeout=restante):
+            self._rechazar(f"{self.concurrencia} llamadas en curso durante {self.espera_max:g}s")
+
+    def salir(self):
+        self._cupos.release()
+
+    @contextmanager
+    def turno(self):
+        self.entrar()
+        try:
+            yield
+        finally:
+            self.salir()
+
+    def estadisticas(self):
+        with self._lock:
+            rechazadas = self.rechazadas
+        return {'en_cola': self.cubo.en_cola, 'rechazadas': rechazadas}
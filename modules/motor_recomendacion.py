@@ -0,0 +1,186 @@
+import hashlib
+import math
+import re
+import threading
+import unicodedata
+import zlib
+
+import numpy as np
+
+# Categorías que completan el look de cada categoría del catálogo
+COMPLEMENTOS = {
+    "vestidos": ["calzado", "accesorios", "chaquetas"],
+    "blusas": ["pantalones", "chaquetas", "accesorios", "calzado"],
+    "pantalones": ["blusas", "camisetas", "chaquetas", "calzado"],
+    "chaquetas": ["pantalones", "camisetas", "blusas", "calzado"],
+    "calzado": ["pantalones", "vestidos", "accesorios"],
+    "accesorios": ["vestidos", "blusas", "calzado"],
+    "camisetas": ["pantalones", "chaquetas", "calzado"],
+}
+
+# Palabras sin valor para comparar productos
+STOPWORDS = {
+    "a", "al", "con", "de", "del", "el", "en", "la", "las", "lo", "los", "para",
+    "por", "tu", "un", "una", "y", "o", "que", "se", "su", "sus", "dia",
+}
+
+# Peso de cada campo al construir el vector del producto
+PESOS_CAMPOS = {'name': 2.0, 'description': 1.0, 'category': 1.5}
+
+# Dimensión de los vectores (hashing trick: memoria fija sin vocabulario)
+DIMENSION = 512
+
+# Cuánto suma/resta la regla de categorías frente a la similitud de texto
+PESO_COMPLEMENTO = 0.6
+PENALIZACION_MISMA_CATEGORIA = 0.8
+
+
+def normalizar(texto):
+    """Pasa a minúsculas, quita tildes y separa en palabras"""
+    texto = unicodedata.normalize('NFKD', str(texto or '').lower())
+    texto = ''.join(c for c in texto if not unicodedata.combining(c))
+    return [t for t in re.findall(r"[a-z0-9]+", texto) if t not in STOPWORDS and len(t) > 1]
+
+
+def _indice_hash(token):
+    # crc32 es estable entre procesos (hash() de Python no lo es)
+    return zlib.crc32(token.encode('utf-8')) % DIMENSION
+
+
+class MotorRecomendacion:
+    """Recomendador local por contenido: TF-IDF con hashing y reglas de categoría.
+
+    Todo el catálogo se guarda en una matriz NumPy de vectores normalizados,
+    de modo que recomendar es un producto matricial sin llamadas remotas.
+    """
+
+    def __init__(self, productos):
+        self.productos = list(productos)
+        self.indice = {p.get('id'): i for i, p in enumerate(self.productos)}
+
+        categorias = sorted({p.get('category', '') for p in self.productos} | set(COMPLEMENTOS))
+        self._cat_idx = {c: i for i, c in enumerate(categorias)}
+        self.categorias = np.array(
+            [self._cat_idx[p.get('category', '')] for p in self.productos], dtype=np.int32
+        )
+        self._mascara_stock = self._calcular_mascara(self.productos)
+        self.reglas = self._matriz_reglas(categorias)
+        self.matriz = self._vectorizar()
+
+    @staticmethod
+    def _calcular_mascara(productos):
+        con_stock = np.array([p.get('stock', 0) > 0 for p in productos], dtype=bool)
+        # Se suma a los puntajes: descarta los productos sin stock
+        return np.where(con_stock, 0.0, -np.inf).astype(np.float32)
+
+    def actualizar_stock(self, productos):
+        """Toma el stock (y los datos no textuales) de una versión del catálogo con los mismos textos"""
+        productos = list(productos)
+        self._mascara_stock = self._calcular_mascara(productos)
+        self.productos = productos
+
+    def _vectorizar(self):
+        n = len(self.productos)
+        tf = np.zeros((n, DIMENSION), dtype=np.float32)
+        for fila, p in enumerate(self.productos):
+            for campo, peso in PESOS_CAMPOS.items():
+                for token in normalizar(p.get(campo)):
+                    tf[fila, _indice_hash(token)] += peso
+
+        # IDF por columna: los términos que aparecen en todo el catálogo pesan menos
+        df = np.count_nonzero(tf, axis=0)
+        idf = np.log((1 + n) / (1 + df)).astype(np.float32) + 1.0
+        matriz = np.log1p(tf) * idf
+        normas = np.linalg.norm(matriz, axis=1, keepdims=True)
+        normas[normas == 0] = 1.0
+        # Por columnas: una consulta solo lee las columnas de sus propios términos
+        return np.asfortranarray(matriz / normas)
+
+    def _matriz_reglas(self, categorias):
+        """Bono por categoría complementaria y penalización por la misma categoría"""
+        reglas = np.zeros((len(categorias), len(categorias)), dtype=np.float32)
+        for origen, i in self._cat_idx.items():
+            reglas[i, i] = -PENALIZACION_MISMA_CATEGORIA
+            for destino in COMPLEMENTOS.get(origen, []):
+                reglas[i, self._cat_idx[destino]] = PESO_COMPLEMENTO
+        return reglas
+
+    def puntajes(self, product_ids, excluir=()):
+        """Matriz (len(product_ids), n_productos) de puntajes; -inf donde no aplica"""
+        filas = np.array([self.indice[pid] for pid in product_ids], dtype=np.int64)
+        consultas = self.matriz[filas]
+        # Los vectores son muy dispersos: basta multiplicar las columnas no nulas
+        columnas = np.flatnonzero(consultas.any(axis=0))
+        puntajes = consultas[:, columnas] @ self.matriz[:, columnas].T
+        puntajes += self.reglas[self.categorias[filas]][:, self.categorias]
+
+        puntajes += self._mascara_stock
+        puntajes[np.arange(len(filas)), filas] = -np.inf
+        excluidas = [self.indice[e] for e in excluir if e in self.indice]
+        if excluidas:
+            puntajes[:, excluidas] = -np.inf
+        return puntajes
+
+    def recomendar_lote(self, product_ids, excluir=(), k=1):
+        """Recomienda k productos para cada id en una sola multiplicación de matrices"""
+        product_ids = [pid for pid in product_ids if pid in self.indice]
+        if not product_ids or not self.productos:
+            return {}
+
+        puntajes = self.puntajes(product_ids, excluir)
+        k = min(k, puntajes.shape[1])
+        mejores = np.argpartition(-puntajes, k - 1, axis=1)[:, :k]
+
+        resultado = {}
+        for fila, pid in enumerate(product_ids):
+            orden = mejores[fila][np.argsort(-puntajes[fila, mejores[fila]])]
+            resultado[pid] = [
+                self.productos[j] for j in orden if math.isfinite(puntajes[fila, j])
+            ]
+        return resultado
+
+    def recomendar(self, product_id, excluir=(), k=1):
+        """Lista de hasta k productos que completan el look del producto dado"""
+        return self.recomendar_lote([product_id], excluir, k).get(product_id, [])
+
+
+def mensaje_recomendacion(recomendado):
+    """Mensaje para el cliente con el mismo formato que pide el prompt de GPT-4"""
+    return (
+        "¡Excelente elección! 👌  \n"
+        f"Para completar tu look, te sugerimos agregar {recomendado['name']}, "
+        "que combina a la perfección con lo que ya elegiste."
+    )
+
+
+def huella_textos(productos):
+    """Hash de los ids y textos que usa el motor, en orden; no incluye stock ni precio"""
+    h = hashlib.sha1()
+    for p in productos:
+        h.update(repr((p.get('id'), *(p.get(campo) for campo in PESOS_CAMPOS))).encode('utf-8'))
+    return h.hexdigest()
+
+
+_lock = threading.Lock()
+_motor = None
+_version_motor = None
+_textos_motor = None
+
+
+def motor_para(productos, version_catalogo):
+    """Devuelve el motor del catálogo, reconstruyéndolo solo si cambiaron sus textos.
+
+    Si la versión cambió pero los textos no (solo stock o precio), se
+    actualiza la máscara de stock sin volver a tokenizar ni vectorizar.
+    """
+    global _motor, _version_motor, _textos_motor
+    with _lock:
+        if _motor is None or _version_motor != version_catalogo:
+            textos = huella_textos(productos)
+            if _motor is not None and textos == _textos_motor:
+                _motor.actualizar_stock(productos)
+            else:
+                _motor = MotorRecomendacion(productos)
+                _textos_motor = textos
+            _version_motor = version_catalogo
+        return _motor
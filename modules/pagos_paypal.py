@@ -0,0 +1,128 @@
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from modules.instrumentacion import medir, medido
+
+SANDBOX_URL = "https://api-m.sandbox.paypal.com"
+
+# (conexión, lectura) en segundos
+TIMEOUT = (3.05, 15)
+# El token se renueva este margen antes de que PayPal lo dé por vencido
+MARGEN_TOKEN = 60
+
+
+class ErrorPayPal(Exception):
+    """PayPal rechazó la operación o no respondió"""
+
+
+class ClientePayPal:
+    """Cliente de la API REST de pagos de PayPal (v1), uno por proceso.
+
+    Reutiliza el token OAuth hasta que vence y una sesión HTTP keep-alive
+    compartida por todas las sesiones de Streamlit.
+    """
+
+    def __init__(self, client_id, client_secret, base_url=SANDBOX_URL, timeout=TIMEOUT):
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+
+        self.sesion = requests.Session()
+        adaptador = HTTPAdapter(pool_connections=2, pool_maxsize=32)
+        self.sesion.mount("https://", adaptador)
+        self.sesion.mount("http://", adaptador)
+
+        self._lock = threading.Lock()
+        self._token = None
+        self._vence = 0.0
+        self.tokens_emitidos = 0
+
+    def _token_acceso(self, renovar=False):
+        with self._lock:
+            if renovar or self._token is None or time.monotonic() >= self._vence:
+                with medir("paypal.token"):
+                    response = self.sesion.post(
+                        f"{self.base_url}/v1/oauth2/token",
+                        auth=(self.client_id, self.client_secret),
+                        data={"grant_type": "client_credentials"},
+                        headers={"Accept": "application/json"},
+                        timeout=self.timeout
+                    )
+                if response.status_code != 200:
+                    raise ErrorPayPal(f"No se pudo autenticar con PayPal: {response.text}")
+                datos = response.json()
+                self._token = datos["access_token"]
+                self._vence = time.monotonic() + datos.get("expires_in", 0) - MARGEN_TOKEN
+                self.tokens_emitidos += 1
+            return self._token
+
+    def _solicitud(self, metodo, ruta, json=None):
+        for intento in range(2):
+            # Un 401 con un token en caché significa que PayPal lo revocó antes de tiempo
+            token = self._token_acceso(renovar=intento > 0)
+            response = self.sesion.request(
+                metodo,
+                f"{self.base_url}{ruta}",
+                json=json,
+                headers={"Authorization": f"Bearer {token}"},
+                timeout=self.timeout
+            )
+            if response.status_code != 401:
+                break
+
+        if response.status_code >= 400:
+            try:
+                mensaje = response.json().get("message", response.text)
+            except ValueError:
+                mensaje = response.text
+            raise ErrorPayPal(mensaje)
+        return response.json()
+
+    @medido("paypal.crear_pago")
+    def crear_pago(self, items, return_url, cancel_url, descripcion):
+        """Crea el pago y devuelve la respuesta de PayPal (id, state, links)"""
+        total = sum(item['price'] * item['quantity'] for item in items)
+        return self._solicitud("POST", "/v1/payments/payment", json={
+            "intent": "sale",
+            "payer": {
+                "payment_method": "paypal"
+            },
+            "redirect_urls": {
+                "return_url": return_url,
+                "cancel_url": cancel_url
+            },
+            "transactions": [{
+                "item_list": {
+                    "items": [{
+                        "name": item['name'],
+                        "sku": item['product_id'],
+                        "price": str(item['price']),
+                        "currency": "USD",
+                        "quantity": item['quantity']
+                    } for item in items]
+                },
+                "amount": {
+                    "total": f"{total:.2f}",
+                    "currency": "USD"
+                },
+                "description": descripcion
+            }]
+        })
+
+    @medido("paypal.obtener_pago")
+    def obtener_pago(self, payment_id):
+        return self._solicitud("GET", f"/v1/payments/payment/{payment_id}")
+
+    @medido("paypal.ejecutar_pago")
+    def ejecutar_pago(self, payment_id, payer_id):
+        return self._solicitud("POST", f"/v1/payments/payment/{payment_id}/execute",
+                               json={"payer_id": payer_id})
+
+
+def url_aprobacion(pago):
+    """URL de PayPal a la que se redirige al comprador para aprobar el pago"""
+    return next((link['href'] for link in pago.get('links', []) if link.get('rel') == "approval_url"), None)
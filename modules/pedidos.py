@@ -0,0 +1,140 @@
+import time
+from datetime import datetime
+
+from firebase_admin import firestore
+
+from modules.carrito import items_como_lista
+from modules.inventario import preparar_descuento
+
+# La orden se guarda como orders/{payment_id}: el id del pago de PayPal hace
+# que finalizar la misma compra dos veces nunca cree una segunda orden.
+#
+# Al crear el pago se guarda en paypal_payments/{payment_id} una copia
+# completa del checkout (usuario, ítems y total): el regreso de PayPal y la
+# página de la orden se resuelven con esa única lectura.
+
+CAMPOS_USUARIO = ('uid', 'nombre', 'email', 'foto')
+
+
+class CarritoVacio(Exception):
+    """No hay productos que registrar para el pago"""
+
+
+def armar_checkout(payment_id, usuario, items):
+    """Copia del checkout: usuario, ítems y total del pago pendiente"""
+    items = [{
+        'product_id': item['product_id'],
+        'name': item['name'],
+        'price': item['price'],
+        'quantity': item['quantity'],
+    } for item in items]
+    return {
+        'payment_id': payment_id,
+        'user_id': usuario['uid'],
+        'usuario': {campo: usuario.get(campo) for campo in CAMPOS_USUARIO},
+        'items': items,
+        'total': sum(item['price'] * item['quantity'] for item in items),
+        'status': 'pending',
+        'created_at': datetime.now(),
+    }
+
+
+def armar_pedido(usuario, items, payment_id, faltantes):
+    """Datos de la orden de un pago completado"""
+    return {
+        'user_id': usuario['uid'],
+        'user_name': usuario.get('nombre'),
+        'user_email': usuario.get('email'),
+        'items': items,
+        'total': sum(item['price'] * item['quantity'] for item in items),
+        'payment_id': payment_id,
+        'status': 'completed',
+        'created_at': datetime.now(),
+        'order_number': f"ORD-{int(time.time())}",
+        'faltantes': faltantes,
+    }
+
+
+def guardar_checkout(db, payment_id, usuario, items):
+    """Guarda la copia del checkout que se usará al volver de PayPal"""
+    checkout = armar_checkout(payment_id, usuario, items)
+    db.collection('paypal_payments').document(payment_id).set(checkout)
+    return checkout
+
+
+def obtener_checkout(db, payment_id):
+    """Devuelve la copia del checkout guardada para el pago o None"""
+    doc = db.collection('paypal_payments').document(payment_id).get()
+    return doc.to_dict() if doc.exists else None
+
+
+def obtener_pedido(db, payment_id):
+    """Devuelve la orden ya registrada para el pago o None"""
+    doc = db.collection('orders').document(payment_id).get()
+    return doc.to_dict() if doc.exists else None
+
+
+def finalizar_pedido(db, payment_id, usuario):
+    """Registra la orden, descuenta stock, vacía el carrito y marca el pago como completado.
+
+    Los ítems salen de la copia del checkout, así la orden coincide con lo
+    que se cobró aunque el carrito haya cambiado mientras tanto. Todo ocurre
+    en una única transacción (un solo commit). Si la orden ya existía, se
+    devuelve la guardada sin escribir nada.
+    """
+    return _finalizar(db.transaction(), db, payment_id, usuario)
+
+
+@firestore.transactional
+def _finalizar(transaction, db, payment_id, usuario):
+    order_ref = db.collection('orders').document(payment_id)
+    cart_ref = db.collection('carts').document(usuario['uid'])
+    payment_ref = db.collection('paypal_payments').document(payment_id)
+
+    # En una transacción todas las lecturas van antes de las escrituras
+    snapshots = {
+        snap.reference.path: snap
+        for snap in db.get_all([order_ref, payment_ref], transaction=transaction)
+    }
+    order_doc = snapshots.get(order_ref.path)
+    if order_doc is not None and order_doc.exists:
+        return order_doc.to_dict()
+
+    payment_doc = snapshots.get(payment_ref.path)
+    checkout = payment_doc.to_dict() if payment_doc is not None and payment_doc.exists else {}
+    items = checkout.get('items')
+    if not items:
+        # Pagos creados antes de guardar el checkout completo: se usa el carrito
+        cart_doc = cart_ref.get(transaction=transaction)
+        items = items_como_lista(cart_doc.to_dict().get('items', {})) if cart_doc.exists else []
+    if not items:
+        raise CarritoVacio(f"El carrito del pago {payment_id} está vacío")
+
+    faltantes = preparar_descuento(transaction, db, items)
+
+    order_data = armar_pedido(checkout.get('usuario') or usuario, items, payment_id, faltantes)
+    transaction.create(order_ref, order_data)
+    transaction.delete(cart_ref)
+    # El pago se conserva marcado: recargar la URL de regreso muestra la orden
+    transaction.set(payment_ref, {
+        'status': 'completed',
+        'order_number': order_data['order_number'],
+    }, merge=True)
+    return order_data
+
+
+def registrar_pedido(db, user_id, pedido):
+    """Guarda una orden sin pago de PayPal, descuenta stock y vacía el carrito.
+
+    Todo en una única transacción; la orden recibe un id automático.
+    Devuelve la lista de faltantes.
+    """
+    return _registrar(db.transaction(), db, user_id, pedido)
+
+
+@firestore.transactional
+def _registrar(transaction, db, user_id, pedido):
+    faltantes = preparar_descuento(transaction, db, pedido['items'])
+    transaction.create(db.collection('orders').document(), {**pedido, 'faltantes': faltantes})
+    transaction.delete(db.collection('carts').document(user_id))
+    return faltantes
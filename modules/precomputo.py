@@ -0,0 +1,196 @@
+"""Precalcula las recomendaciones "completa tu look" de todo el catálogo.
+
+Uso:
+    python -m modules.precomputo --credenciales serviceAccountKey.json
+    python -m modules.precomputo --llm --hilos 8
+    python -m modules.precomputo --backend sqlite --sqlite megamoda.db
+
+Guarda una recomendación por producto en la colección 'recommendations'.
+En cada ejecución solo recalcula los productos cuyos datos cambiaron (o
+cuyo producto recomendado cambió) desde la ejecución anterior, y borra las
+de productos eliminados y las que ya no tienen ningún complemento. Lee y
+escribe a través del repositorio (modules/repositorio.py), así que
+funciona con cualquier backend.
+"""
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from modules.catalogo_cache import calcular_huella, huella_producto
+from modules.motor_recomendacion import MotorRecomendacion, mensaje_recomendacion, motor_para, normalizar
+from modules.prompt_recomendacion import TOP_K
+
+COLECCION = 'recommendations'
+# Documento con la versión del catálogo de la última ejecución
+DOC_META = '_meta'
+
+
+def productos_a_recalcular(productos, existentes):
+    """Devuelve los productos sin recomendación o con datos cambiados"""
+    huellas = {p['id']: huella_producto(p) for p in productos}
+    pendientes = []
+    for p in productos:
+        previa = existentes.get(p['id'])
+        if previa is None or previa.get('huella_producto') != huellas[p['id']]:
+            pendientes.append(p)
+            continue
+        # El producto recomendado pudo cambiar, quedarse sin stock o desaparecer;
+        # sin recomendado_id no se puede comprobar (entradas de GPT-4 anteriores)
+        recomendado_id = previa.get('recomendado_id')
+        if not recomendado_id or previa.get('huella_recomendado') != huellas.get(recomendado_id):
+            pendientes.append(p)
+    return pendientes
+
+
+def calcular_local(productos, pendientes):
+    """Recomendaciones con el motor local, en una sola pasada matricial.
+
+    Los productos sin ningún complemento quedan en None: su entrada se borra.
+    """
+    motor = MotorRecomendacion(productos)
+    recomendados = motor.recomendar_lote([p['id'] for p in pendientes])
+    resultado = {}
+    for p in pendientes:
+        elegido = (recomendados.get(p['id']) or [None])[0]
+        resultado[p['id']] = (mensaje_recomendacion(elegido), elegido) if elegido else None
+    return resultado
+
+
+def producto_mencionado(texto, candidatos):
+    """El candidato cuyo nombre aparece en el texto (el más largo si hay varios) o None"""
+    palabras = f" {' '.join(normalizar(texto))} "
+    mencionados = [
+        c for c in candidatos
+        if normalizar(c.get('name')) and f" {' '.join(normalizar(c.get('name')))} " in palabras
+    ]
+    return max(mencionados, key=lambda c: len(c.get('name', '')), default=None)
+
+
+def calcular_llm(productos, pendientes, version_catalogo, hilos):
+    """Recomendaciones con GPT-4, con varias llamadas en paralelo.
+
+    Se guarda qué candidato nombró GPT-4 para poder excluirlo del carrito y
+    detectar cuando cambia; si no nombra ninguno (o falla) se usa el mejor
+    candidato local, y sin candidatos la entrada se borra.
+    """
+    # Import diferido: el recomendador necesita los secretos de OpenAI
+    from modules.recomendador import _pedir_recomendacion
+
+    # Los mismos candidatos que recibe GPT-4 en el prompt (modules/prompt_recomendacion.py)
+    candidatos = motor_para(productos, version_catalogo).recomendar_lote(
+        [p['id'] for p in pendientes], k=TOP_K
+    )
+
+    def pedir(producto):
+        opciones = candidatos.get(producto['id']) or []
+        if not opciones:
+            return producto['id'], None
+        try:
+            texto = _pedir_recomendacion(producto, productos, version_catalogo)
+        except Exception as e:
+            print(f"⚠️ {producto['name']}: {e}")
+            texto = None
+        elegido = producto_mencionado(texto, opciones) if texto else None
+        if elegido is None:
+            return producto['id'], (mensaje_recomendacion(opciones[0]), opciones[0])
+        return producto['id'], (texto, elegido)
+
+    with ThreadPoolExecutor(max_workers=hilos) as ejecutor:
+        return dict(ejecutor.map(pedir, pendientes))
+
+
+def guardar(repo, resultado, productos, version_catalogo, existentes=()):
+    """Escribe las recomendaciones (el repositorio las agrupa en lotes).
+
+    Borra las entradas en None y las de productos que ya no están en el
+    catálogo. Devuelve cuántas entradas se escribieron o borraron.
+    """
+    por_id = {p['id']: p for p in productos}
+    borrar = {i for i in existentes if i not in por_id}
+    escribir = {}
+    for product_id, recomendacion in resultado.items():
+        if recomendacion is None:
+            borrar.add(product_id)
+            continue
+        texto, elegido = recomendacion
+        escribir[product_id] = {
+            'texto': texto,
+            'recomendado_id': elegido['id'],
+            'huella_producto': huella_producto(por_id[product_id]),
+            'huella_recomendado': huella_producto(elegido),
+            'version_catalogo': version_catalogo,
+            'actualizado_en': datetime.now(),
+        }
+    cambios = len(escribir) + len(borrar)
+    # Al final: si la ejecución se corta antes, la próxima vuelve a comparar todo
+    escribir[DOC_META] = {
+        'version_catalogo': version_catalogo,
+        'actualizado_en': datetime.now(),
+    }
+    repo.guardar_recomendaciones(escribir, borrar)
+    return cambios
+
+
+def precalcular(repo, usar_llm=False, hilos=4, forzar=False):
+    """Recalcula las recomendaciones pendientes y devuelve cuántas se escribieron o borraron"""
+    productos = repo.listar_productos()
+    version_catalogo = calcular_huella(productos)
+
+    existentes = repo.recomendaciones_guardadas()
+    meta = existentes.pop(DOC_META, None) or {}
+    if not forzar and meta.get('version_catalogo') == version_catalogo:
+        return 0
+
+    pendientes = productos if forzar else productos_a_recalcular(productos, existentes)
+    if usar_llm:
+        resultado = calcular_llm(productos, pendientes, version_catalogo, hilos)
+    else:
+        resultado = calcular_local(productos, pendientes)
+
+    return guardar(repo, resultado, productos, version_catalogo, existentes)
+
+
+def texto_vigente(datos, excluir=()):
+    """Texto de una recomendación guardada, salvo que recomiende algo ya excluido"""
+    if not datos or datos.get('recomendado_id') in excluir:
+        return None
+    return datos.get('texto')
+
+
+def _cliente_firestore(ruta_credenciales):
+    import firebase_admin
+    from firebase_admin import credentials, firestore
+
+    if not firebase_admin._apps:
+        if ruta_credenciales:
+            cred = credentials.Certificate(ruta_credenciales)
+        else:
+            import streamlit as st
+            cred = credentials.Certificate(dict(st.secrets["firebase"]))
+        firebase_admin.initialize_app(cred)
+    return firestore.client()
+
+
+def _repositorio(backend, credenciales=None, ruta_sqlite=None):
+    # Import diferido: modules.repositorio importa este módulo
+    from modules.repositorio import crear_repositorio
+
+    if backend == 'firestore':
+        return crear_repositorio('firestore', db=_cliente_firestore(credenciales))
+    return crear_repositorio(backend, ruta=ruta_sqlite)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--backend", choices=('firestore', 'sqlite'), default='firestore',
+                        help="backend de datos (ver BACKEND_DATOS en modules/repositorio.py)")
+    parser.add_argument("--credenciales", help="serviceAccountKey.json (por defecto, st.secrets['firebase'])")
+    parser.add_argument("--sqlite", help="archivo SQLite del backend sqlite (por defecto, megamoda.db)")
+    parser.add_argument("--llm", action="store_true", help="usar GPT-4 en lugar del motor local")
+    parser.add_argument("--hilos", type=int, default=4, help="llamadas concurrentes a GPT-4")
+    parser.add_argument("--forzar", action="store_true", help="recalcular todo el catálogo")
+    args = parser.parse_args()
+
+    repo = _repositorio(args.backend, args.credenciales, args.sqlite)
+    escritas = precalcular(repo, args.llm, args.hilos, args.forzar)
+    print(f"✅ {escritas} recomendaciones actualizadas")
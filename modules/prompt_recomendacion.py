@@ -0,0 +1,84 @@
+from modules.motor_recomendacion import MotorRecomendacion, motor_para
+
+# Candidatos preseleccionados localmente que se envían al modelo
+TOP_K = 10
+# Tope aproximado de tokens del prompt completo
+PRESUPUESTO_TOKENS = 700
+# Largo máximo de cada descripción dentro del prompt
+MAX_DESCRIPCION = 80
+# Productos del carrito que se mencionan como contexto
+MAX_CARRITO = 10
+
+ENCABEZADO = """Eres un asesor de moda para una tienda online de ropa.
+Un cliente acaba de agregar a su carrito: {producto}
+Ya tiene en el carrito: {carrito}
+
+Recomienda un único producto de la lista de candidatos (nombre | categoría | descripción) que combine con lo que eligió y mejore su look. Los productos del carrito ya fueron excluidos.
+
+Candidatos:
+"""
+
+FORMATO = """
+Responde con el siguiente formato amistoso, breve y persuasivo:
+
+¡Excelente elección! 👌
+Para completar tu look, te sugerimos agregar [nombre del producto recomendado], que combina a la perfección con lo que ya elegiste.
+"""
+
+
+def estimar_tokens(texto):
+    """Estimación rápida de tokens (≈ 4 caracteres por token en español)"""
+    return len(texto) // 4 + 1
+
+
+def _recortar(texto, largo):
+    texto = " ".join(str(texto or "").split())
+    return texto if len(texto) <= largo else texto[:largo - 1].rstrip() + "…"
+
+
+def linea_producto(producto):
+    """Representación compacta de un producto en una línea"""
+    return " | ".join([
+        _recortar(producto.get('name'), 60),
+        producto.get('category', ''),
+        _recortar(producto.get('description'), MAX_DESCRIPCION),
+    ])
+
+
+def construir_prompt(producto, catalogo, version_catalogo=None, carrito=(), k=TOP_K,
+                     presupuesto_tokens=PRESUPUESTO_TOKENS):
+    """Arma el prompt con los k mejores candidatos locales dentro del presupuesto de tokens.
+
+    carrito es la lista de ítems del carrito; sus productos se excluyen de
+    los candidatos. Devuelve None si no hay ningún candidato.
+    """
+    carrito_ids = [item.get('product_id') for item in carrito]
+    if version_catalogo is None:
+        motor = MotorRecomendacion(catalogo)
+    else:
+        motor = motor_para(catalogo, version_catalogo)
+    candidatos = motor.recomendar(producto.get('id'), excluir=carrito_ids, k=k)
+    if not candidatos:
+        return None
+
+    nombres_carrito = [
+        _recortar(item.get('name'), 40) for item in carrito
+        if item.get('product_id') != producto.get('id')
+    ][:MAX_CARRITO]
+    prompt = ENCABEZADO.format(
+        producto=linea_producto(producto),
+        carrito=", ".join(nombres_carrito) or "nada más",
+    )
+
+    # Los candidatos vienen ordenados por puntaje: se cortan los últimos si no entran
+    disponibles = presupuesto_tokens - estimar_tokens(prompt) - estimar_tokens(FORMATO)
+    lineas = []
+    for candidato in candidatos:
+        linea = f"- {linea_producto(candidato)}\n"
+        costo = estimar_tokens(linea)
+        if lineas and costo > disponibles:
+            break
+        lineas.append(linea)
+        disponibles -= costo
+
+    return prompt + "".join(lineas) + FORMATO
@@ -1,50 +1,255 @@
-
-import os
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as TiempoAgotado
+from contextlib import closing, contextmanager
 from dotenv import load_dotenv
-from openai import OpenAI
 import streamlit as st
+from modules.recursos import obtener_openai
+from modules.cache_recomendaciones import CacheRecomendaciones
+from modules.motor_recomendacion import motor_para, mensaje_recomendacion
+from modules.prompt_recomendacion import construir_prompt
+from modules.instrumentacion import medir, medido, registrar_camino, registrar_tokens
+from modules.limitador import Limitador, SingleFlight
+from modules.tareas import TextoParcial
 
 # Cargar variables de entorno
 load_dotenv()
 #api_key = os.getenv("OPENAI_API_KEY")
-api_key = st.secrets["OPENAI_API_KEY"]  # Prioriza el secreto de Streamlit si está disponible
 
-if not api_key:
-    raise ValueError("❌ OPENAI_API_KEY no está definido. Verifica tu archivo .env.")
+logger = logging.getLogger("megamoda")
 
-client = OpenAI(api_key=api_key)
+# Cliente compartido por proceso (modules/recursos.py)
+client = obtener_openai()
 
-def generar_recomendacion(producto, catalogo):
-    prompt = f"""
-Eres un asesor de moda para una tienda online de ropa.
-Un cliente acaba de agregar el siguiente producto a su carrito:
-- Nombre: {producto['name']}
-- Descripción: {producto['description']}
-- Categoría: {producto['category']}
+# Caché compartida por todas las sesiones; se persiste en disco si hay ruta configurada
+cache = CacheRecomendaciones(ruta=st.secrets.get("RECOMENDACIONES_CACHE_DB"))
+
+# Recomendaciones idénticas (misma clave de caché) en curso en varias
+# sesiones a la vez: se genera una sola y todas reciben su resultado
+vuelos = SingleFlight()
+
+# Tasa y concurrencia de las llamadas a OpenAI de todo el proceso
+try:
+    limitador = Limitador(
+        por_minuto=float(st.secrets.get("OPENAI_POR_MINUTO", 60)),
+        rafaga=int(st.secrets.get("OPENAI_RAFAGA", 10)),
+        concurrencia=int(st.secrets.get("OPENAI_CONCURRENCIA", 4)),
+        espera_max=float(st.secrets.get("OPENAI_ESPERA_MAX", 10)),
+    )
+except ValueError as e:
+    raise ValueError(f"Secretos OPENAI_POR_MINUTO/OPENAI_RAFAGA/OPENAI_CONCURRENCIA inválidos: {e}") from e
+
+# "local": motor por contenido (sin red); "llm": GPT-4 elige el producto
+modo = st.secrets.get("RECOMENDADOR_MODO", "local")
+# En modo local, GPT-4 puede usarse solo para redactar el mensaje final
+redactar_con_llm = bool(st.secrets.get("RECOMENDADOR_REDACTAR_LLM", False))
+# Segundos que se espera a GPT-4 antes de responder con el motor local; la
+# respuesta que llega después queda en la caché para la próxima vez. Si el
+# texto se transmite, limita la espera del primer fragmento
+presupuesto = float(st.secrets.get("RECOMENDADOR_PRESUPUESTO", 3))
+# Segundos máximos de una respuesta transmitida; si el stream se detiene se
+# cancela y se responde con el motor local
+duracion_max = float(st.secrets.get("RECOMENDADOR_DURACION_MAX", 20))
+
+# Llamadas a GPT-4 en curso, en hilos propios para que sigan (y completen la
+# caché) aunque la tarea que las pidió ya haya respondido con el respaldo
+_remotas = ThreadPoolExecutor(max_workers=limitador.concurrencia, thread_name_prefix="megamoda-llm")
+# Llamadas en curso o en la cola de _remotas como máximo: una en curso y una
+# esperando por cupo; las demás se resuelven con el motor local
+MAX_REMOTAS = 2 * limitador.concurrencia
+_en_vuelo = {}  # clave -> (Future, TextoParcial) de la llamada en curso
+_lock_en_vuelo = threading.Lock()
+
+@medido("recomendacion")
+def obtener_recomendacion(producto, catalogo, version_catalogo, carrito=(), flujo=None):
+    """Devuelve la recomendación desde la caché o la genera según el modo configurado.
+
+    La clave incluye la versión del catálogo y los productos del carrito,
+    que además se excluyen de los candidatos. Si se pasa flujo (un
+    TextoParcial de modules/tareas.py), el texto de GPT-4 se agrega ahí a
+    medida que llega; a la caché va el texto completo. Si otra sesión ya
+    está generando la misma recomendación, se espera la suya (sin stream).
+
+    Registra el camino que la resolvió: 'cache', 'local' (sin GPT-4),
+    'remoto' o 'local_fallback' (GPT-4 falló o no terminó dentro del
+    presupuesto). Sin ninguna recomendación devuelve None.
+    """
+    carrito_ids = [item.get('product_id') for item in carrito]
+    clave = cache.clave(producto.get('id'), version_catalogo, carrito_ids)
+    texto = cache.obtener(clave)
+    if texto is not None:
+        registrar_camino("recomendacion", "cache")
+        return texto
+
+    try:
+        texto, camino = vuelos.ejecutar(clave, _generar, clave, producto, catalogo, version_catalogo, carrito, flujo)
+    except Exception:
+        # El error no se muestra al cliente: simplemente no hay recomendación
+        logger.exception("no se pudo generar la recomendación de %s", producto.get('id'))
+        registrar_camino("recomendacion", "error")
+        return None
+    registrar_camino("recomendacion", camino)
+    return texto
+
+def _generar(clave, producto, catalogo, version_catalogo, carrito, flujo=None):
+    """Genera la recomendación según el modo configurado; devuelve (texto, camino)"""
+    carrito_ids = [item.get('product_id') for item in carrito]
+    if modo == "local" and not redactar_con_llm:
+        texto = recomendar_local(producto, catalogo, version_catalogo, carrito_ids)
+        if texto is not None:
+            cache.guardar(clave, texto)
+        return texto, 'local'
+
+    en_vuelo = _pedir_remota(clave, producto, catalogo, version_catalogo, carrito)
+    if en_vuelo is None:
+        logger.warning("demasiadas llamadas a GPT-4 en curso, se usa el motor local para %s", producto.get('id'))
+        return recomendar_local(producto, catalogo, version_catalogo, carrito_ids), 'local_fallback'
+
+    futuro, remoto = en_vuelo
+    inicio = time.monotonic()
+    limite = inicio + presupuesto
+    if flujo is not None and remoto.esperar_inicio(presupuesto):
+        # La respuesta empezó dentro del presupuesto y ya se está mostrando:
+        # se transmite hasta el final (como mucho duracion_max) para que el
+        # texto devuelto sea el mismo
+        limite = inicio + duracion_max
+        for parte in remoto.leer(max(0.0, limite - time.monotonic())):
+            flujo.agregar(parte)
+    try:
+        return futuro.result(timeout=max(0.0, limite - time.monotonic())), 'remoto'
+    except TiempoAgotado:
+        if limite > inicio + presupuesto:
+            # Stream detenido: se corta la llamada para liberar su hilo y su turno
+            logger.warning("GPT-4 no terminó en %gs para %s, se usa el motor local",
+                           duracion_max, producto.get('id'))
+            remoto.cancelar()
+    except Exception as e:
+        # Si falló a mitad del stream, la página reemplaza lo transmitido por este texto
+        logger.warning("GPT-4 falló para %s, se usa el motor local: %s", producto.get('id'), e)
+    # Mismo motor de complementos por categoría que el modo local; no se
+    # guarda en la caché para que lo reemplace la respuesta de GPT-4
+    return recomendar_local(producto, catalogo, version_catalogo, carrito_ids), 'local_fallback'
+
+def _pedir_remota(clave, producto, catalogo, version_catalogo, carrito):
+    """(Future, TextoParcial) de la llamada a GPT-4 para la clave; reutiliza la que ya esté en curso.
 
-Tu tarea es recomendar un único producto adicional del siguiente catálogo que combine con este producto y mejore su look. Solo debes recomendar productos diferentes al seleccionado.
+    Devuelve None si ya hay MAX_REMOTAS llamadas en curso o en cola.
+    """
+    with _lock_en_vuelo:
+        en_vuelo = _en_vuelo.get(clave)
+        if en_vuelo is not None:
+            return en_vuelo
+        if len(_en_vuelo) >= MAX_REMOTAS:
+            return None
+        remoto = TextoParcial()
+        futuro = _remotas.submit(_generar_remota, clave, producto, catalogo, version_catalogo, carrito, remoto)
+        en_vuelo = _en_vuelo[clave] = (futuro, remoto)
+    futuro.add_done_callback(lambda _: _terminar_remota(clave, en_vuelo))
+    return en_vuelo
 
-⚠️ Importante: Si algún producto ya se encuentra en el carrito del cliente, no debes considerarlo en la recomendación.
+def _terminar_remota(clave, en_vuelo):
+    en_vuelo[1].cerrar()
+    with _lock_en_vuelo:
+        if _en_vuelo.get(clave) is en_vuelo:
+            del _en_vuelo[clave]
 
-Catálogo:
-{[
-    {"name": p['name'], "description": p['description'], "category": p['category']} 
-    for p in catalogo if p['name'] != producto['name']
-]}
+@medido("recomendacion.remota")
+def _generar_remota(clave, producto, catalogo, version_catalogo, carrito, remoto):
+    """GPT-4 elige (modo llm) o redacta (modo local) la recomendación y la deja en la caché"""
+    if modo == "local":
+        carrito_ids = [item.get('product_id') for item in carrito]
+        recomendados = motor_para(catalogo, version_catalogo).recomendar(producto.get('id'), excluir=carrito_ids)
+        if not recomendados:
+            return None
+        texto = _redactar_recomendacion(producto, recomendados[0], remoto)
+    else:
+        texto = _pedir_recomendacion(producto, catalogo, version_catalogo, carrito, remoto)
+    if texto is not None:
+        cache.guardar(clave, texto)
+    return texto
 
-Ahora, genera una recomendación con el siguiente formato amistoso, breve y persuasivo:
+@medido("recomendacion.local")
+def recomendar_local(producto, catalogo, version_catalogo, excluir=()):
+    """Elige el complemento con el motor local y arma el mensaje de plantilla (sin red)"""
+    motor = motor_para(catalogo, version_catalogo)
+    recomendados = motor.recomendar(producto.get('id'), excluir=excluir)
+    if not recomendados:
+        return None
+    return mensaje_recomendacion(recomendados[0])
+
+def _redactar_recomendacion(producto, recomendado, flujo=None):
+    """Pide a GPT-4 solo el texto para un producto ya elegido (modo local con RECOMENDADOR_REDACTAR_LLM)"""
+    prompt = f"""
+Eres un asesor de moda para una tienda online de ropa.
+Un cliente agregó a su carrito "{producto['name']}" ({producto['category']}).
+Recomiéndale agregar "{recomendado['name']}": {recomendado['description']}.
+
+Responde con el siguiente formato amistoso, breve y persuasivo:
 
 ¡Excelente elección! 👌  
 Para completar tu look, te sugerimos agregar [nombre del producto recomendado], que combina a la perfección con lo que ya elegiste.
 """
-    try:
+    return _completar(prompt, flujo)
+
+def _pedir_recomendacion(producto, catalogo, version_catalogo=None, carrito=(), flujo=None):
+    """Llama a GPT-4 con los candidatos preseleccionados; propaga los errores"""
+    prompt = construir_prompt(producto, catalogo, version_catalogo, carrito)
+    if prompt is None:
+        return None
+    return _completar(prompt, flujo)
+
+def _completar(prompt, flujo=None):
+    """Envía el prompt a GPT-4 y devuelve el texto de la respuesta.
+
+    Con flujo, la respuesta se pide en streaming y cada fragmento se agrega
+    al flujo apenas llega.
+    """
+    if flujo is not None:
+        partes = []
+        # closing: si el flujo se cancela, el stream se cierra en el acto
+        with closing(transmitir_completado(prompt)) as fragmentos:
+            for fragmento in fragmentos:
+                partes.append(fragmento)
+                flujo.agregar(fragmento)
+        return "".join(partes).strip()
+
+    with _turno_openai(), medir("openai.chat"):
         response = client.chat.completions.create(
             model="gpt-4",
             messages=[{"role": "user", "content": prompt}],
             temperature=0.7,
             max_tokens=150,
         )
-        return response.choices[0].message.content.strip()
+    if response.usage is not None:
+        registrar_tokens(response.model, response.usage.prompt_tokens, response.usage.completion_tokens)
+    return response.choices[0].message.content.strip()
 
-    except Exception as e:
-        return f"⚠️ Error al generar recomendación: {str(e)}"
+@contextmanager
+def _turno_openai():
+    """Turno del limitador para una llamada a OpenAI; la espera queda medida"""
+    with medir("openai.espera"):
+        limitador.entrar()
+    try:
+        yield
+    finally:
+        limitador.salir()
+
+def transmitir_completado(prompt):
+    """Versión en streaming de _completar: genera el texto de GPT-4 a medida que llega"""
+    with _turno_openai(), medir("openai.chat.stream"):
+        stream = client.chat.completions.create(
+            model="gpt-4",
+            messages=[{"role": "user", "content": prompt}],
+            temperature=0.7,
+            max_tokens=150,
+            stream=True,
+            stream_options={"include_usage": True},
+        )
+        with stream:
+            for chunk in stream:
+                # El último fragmento no trae texto, solo el uso de tokens
+                if chunk.usage is not None:
+                    registrar_tokens(chunk.model, chunk.usage.prompt_tokens, chunk.usage.completion_tokens)
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
@@ -0,0 +1,192 @@
+import logging
+import time
+
+import firebase_admin
+import streamlit as st
+from firebase_admin import credentials, firestore
+from openai import OpenAI
+
+from modules.auth_google import ClienteGoogle, USERINFO_URL
+from modules.firestore_instrumentado import instrumentar
+from modules.instrumentacion import servir_metricas
+from modules.pagos_paypal import ClientePayPal, SANDBOX_URL
+from modules.repositorio import crear_repositorio
+
+logger = logging.getLogger("megamoda")
+
+# Segundos que tardó en crearse cada recurso compartido (arranque en frío del proceso)
+metricas_arranque = {}
+
+
+def _medir(nombre, inicio):
+    metricas_arranque[nombre] = time.perf_counter() - inicio
+    logger.info("recurso %s inicializado en %.3fs", nombre, metricas_arranque[nombre])
+
+
+# Firestore y repositorio alternativos para este proceso (p. ej. en los benchmarks)
+_db_sustituta = None
+_repositorio_sustituto = None
+
+
+def usar_db(db):
+    """Hace que obtener_db() devuelva db en lugar de conectarse a Firebase (None lo revierte).
+
+    El repositorio pasa a ser el de Firestore sobre ese cliente.
+    """
+    global _db_sustituta
+    _db_sustituta = instrumentar(db)
+    usar_repositorio(crear_repositorio('firestore', db=_db_sustituta) if db is not None else None)
+
+
+def usar_repositorio(repo):
+    """Hace que obtener_repositorio() devuelva repo en lugar del de BACKEND_DATOS (None lo revierte)"""
+    global _repositorio_sustituto
+    _repositorio_sustituto = repo
+
+
+def obtener_repositorio():
+    """Repositorio de datos único por proceso, del backend del secreto BACKEND_DATOS.
+
+    'firestore' (por defecto), 'memoria' o 'sqlite' (archivo del secreto
+    SQLITE_DB); ver modules/repositorio.py.
+    """
+    if _repositorio_sustituto is not None:
+        return _repositorio_sustituto
+    return _crear_repositorio(st.secrets.get("BACKEND_DATOS", "firestore"))
+
+
+@st.cache_resource(show_spinner=False)
+def _crear_repositorio(backend):
+    if backend == 'firestore':
+        return crear_repositorio('firestore', db=_conectar_firestore())
+    inicio = time.perf_counter()
+    repo = crear_repositorio(backend, ruta=st.secrets.get("SQLITE_DB", "megamoda.db"))
+    _medir(backend, inicio)
+    return repo
+
+
+def obtener_db():
+    """Cliente de Firestore único por proceso, compartido por todas las sesiones.
+
+    Cada operación queda medida (modules/firestore_instrumentado.py).
+    """
+    if _db_sustituta is not None:
+        return _db_sustituta
+    return _conectar_firestore()
+
+
+@st.cache_resource(show_spinner=False)
+def _conectar_firestore():
+    inicio = time.perf_counter()
+    if not firebase_admin._apps:
+        cred = credentials.Certificate(dict(st.secrets["firebase"]))
+        #cred = credentials.Certificate(service_account_key_path)<-- para local
+        firebase_admin.initialize_app(cred)
+    db = instrumentar(firestore.client())
+    _medir('firestore', inicio)
+    return db
+
+
+@st.cache_resource(show_spinner=False)
+def obtener_config():
+    """Secretos y parámetros de la aplicación, leídos una vez por proceso"""
+    inicio = time.perf_counter()
+    config = {
+        'google_client_id': st.secrets["GOOGLE_CLIENT_ID"],
+        'google_client_secret': st.secrets["GOOGLE_SECRET_ID"],
+        'redirect_uri': st.secrets.get("REDIRECT_URI", "https://megamodastore.streamlit.app"),
+        'google_userinfo_url': st.secrets.get("GOOGLE_USERINFO_URL", USERINFO_URL),
+        'paypal_client_id': st.secrets["PAYPAL_CLIENT_ID"],
+        'paypal_client_secret': st.secrets["PAYPAL_SECRET_KEY"],
+        'paypal_api_base': st.secrets.get("PAYPAL_API_BASE", SANDBOX_URL),  # API "live" en producción
+    }
+    _medir('config', inicio)
+    return config
+
+
+@st.cache_resource(show_spinner=False)
+def obtener_cliente_google():
+    """Cliente OAuth de Google con su pool de conexiones, único por proceso"""
+    inicio = time.perf_counter()
+    config = obtener_config()
+    cliente = ClienteGoogle(
+        config['google_client_id'],
+        config['google_client_secret'],
+        config['redirect_uri'],
+        userinfo_url=config['google_userinfo_url'],
+    )
+    _medir('google', inicio)
+    return cliente
+
+
+@st.cache_resource(show_spinner=False)
+def obtener_openai():
+    """Cliente de OpenAI único por proceso"""
+    inicio = time.perf_counter()
+    api_key = st.secrets["OPENAI_API_KEY"]
+    if not api_key:
+        raise ValueError("❌ OPENAI_API_KEY no está definido. Verifica tu archivo .env.")
+    # OPENAI_BASE_URL permite apuntar a un proxy o a un servidor local de pruebas;
+    # OPENAI_TIMEOUT reemplaza los 600s del SDK (por lectura de cada fragmento en streaming)
+    client = OpenAI(
+        api_key=api_key,
+        base_url=st.secrets.get("OPENAI_BASE_URL"),
+        timeout=float(st.secrets.get("OPENAI_TIMEOUT", 20)),
+    )
+    _medir('openai', inicio)
+    return client
+
+
+@st.cache_resource(show_spinner=False)
+def obtener_paypal():
+    """Cliente de PayPal único por proceso (token OAuth y conexiones compartidos)"""
+    inicio = time.perf_counter()
+    config = obtener_config()
+    cliente = ClientePayPal(
+        config['paypal_client_id'],
+        config['paypal_client_secret'],
+        base_url=config['paypal_api_base'],
+    )
+    _medir('paypal', inicio)
+    return cliente
+
+
+@st.cache_resource(show_spinner=False)
+def iniciar_metricas():
+    """Expone las métricas para Prometheus si METRICAS_PUERTO está configurado (una vez por proceso)"""
+    puerto = st.secrets.get("METRICAS_PUERTO")
+    if not puerto:
+        return None
+    try:
+        return servir_metricas(int(puerto), st.secrets.get("METRICAS_HOST", "127.0.0.1"))
+    except OSError as e:
+        # Otro proceso ya usa el puerto: la aplicación sigue sin exportar
+        logger.warning("no se pudo exponer las métricas en el puerto %s: %s", puerto, e)
+        return None
+
+
+def es_admin(usuario):
+    """True si el email del usuario figura en el secreto ADMIN_EMAILS"""
+    admins = st.secrets.get("ADMIN_EMAILS", "")
+    if isinstance(admins, str):
+        admins = admins.split(",")
+    email = (usuario or {}).get('email') or ''
+    return bool(email) and email.strip().lower() in {a.strip().lower() for a in admins if a.strip()}
+
+
+@st.cache_data(show_spinner=False)
+def leer_estilos(ruta):
+    """Contenido de una hoja de estilos, leído del disco una vez por proceso"""
+    with open(ruta, "r") as file:
+        return file.read()
+
+
+def registrar_arranque_sesion(inicio):
+    """Guarda en la sesión cuánto tardó su primera ejecución y los tiempos del proceso"""
+    st.session_state.metricas_arranque = {
+        'sesion': time.perf_counter() - inicio,
+        **metricas_arranque,
+    }
+    logger.info("arranque de sesión: %s", {
+        k: round(v, 4) for k, v in st.session_state.metricas_arranque.items()
+    })
@@ -0,0 +1,70 @@
+from html import escape
+from string import Template
+
+COLUMNAS = 3
+
+# Caracteres que st.markdown interpreta aunque estén dentro del HTML:
+# énfasis, código, enlaces, tachado, tablas y fórmulas de KaTeX ($)
+METACARACTERES_MARKDOWN = "\\`*_~[]()#|$"
+
+# HTML y Markdown en una sola pasada: cada carácter se reemplaza una vez y
+# las entidades que se generan no vuelven a escaparse
+_ENTIDADES = str.maketrans({
+    '&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#x27;',
+    **{c: f'&#{ord(c)};' for c in METACARACTERES_MARKDOWN},
+})
+
+# Una tarjeta por producto; todos los valores se insertan ya escapados. El
+# signo de precio va como &#36; para que Markdown no tome como fórmula el
+# texto entre los precios de dos tarjetas del mismo bloque.
+PLANTILLA_TARJETA = Template("""<div class="product-card">
+    <img src="$imagen" loading="lazy" style="width: 100%; height: 200px; object-fit: cover; border-radius: 10px;">
+    <h3 style="margin: 1rem 0 0.5rem 0; color: #333;">$nombre</h3>
+    <p style="color: #666; margin-bottom: 1rem;">$descripcion</p>
+    <div class="price-tag">&#36;$precio</div>
+    <p style="color: #999; font-size: 0.9rem;">Stock: $stock unidades</p>
+</div>""")
+
+PLANTILLA_FILA = Template('<div class="catalogo-fila">$tarjetas</div>')
+
+
+def _sin_cambios(url):
+    return url
+
+
+def texto_html(valor):
+    """Texto escapado para HTML que st.markdown muestra tal cual.
+
+    Los saltos de línea se vuelven espacios: una línea en blanco cerraría el
+    bloque HTML y el resto se interpretaría como Markdown.
+    """
+    return " ".join(str(valor).split()).translate(_ENTIDADES)
+
+
+def tarjeta_html(product, src_imagen=_sin_cambios):
+    """Markup de la tarjeta de un producto, con sus campos escapados"""
+    return PLANTILLA_TARJETA.substitute(
+        imagen=escape(str(src_imagen(product.get('image', '')))),
+        nombre=texto_html(product.get('name', '')),
+        descripcion=texto_html(product.get('description', '')),
+        precio=f"{product.get('price', 0):.2f}",
+        stock=escape(str(product.get('stock', 0))),
+    )
+
+
+def filas(productos, columnas=COLUMNAS):
+    """Divide los productos en filas de la grilla"""
+    return [productos[i:i + columnas] for i in range(0, len(productos), columnas)]
+
+
+def fila_html(productos, src_imagen=_sin_cambios):
+    """Markup de una fila completa de tarjetas (un solo elemento de Streamlit)"""
+    return PLANTILLA_FILA.substitute(tarjetas="".join(tarjeta_html(p, src_imagen) for p in productos))
+
+
+def grilla_html(productos, columnas=COLUMNAS, src_imagen=_sin_cambios):
+    """Markup de cada fila de la página, construido en una sola pasada.
+
+    src_imagen traduce la URL de cada imagen (por ejemplo, a su miniatura).
+    """
+    return [fila_html(fila, src_imagen) for fila in filas(productos, columnas)]
@@ -0,0 +1,442 @@
+"""Acceso a los datos de la tienda: usuarios, productos, carritos, pagos y órdenes.
+
+Las páginas no conocen la base de datos: usan el repositorio que devuelve
+modules.recursos.obtener_repositorio(), elegido con el secreto BACKEND_DATOS:
+
+    firestore  Firestore (por defecto), modules/repositorio_firestore.py
+    memoria    diccionarios del proceso, para desarrollo y pruebas de carga
+    sqlite     un archivo SQLite (secreto SQLITE_DB), modules/repositorio_sqlite.py
+
+Los backends locales guardan los mismos documentos que Firestore
+(colección -> id -> dict) y aplican las mismas reglas del dominio
+(modules/carrito.py, modules/inventario.py y modules/pedidos.py).
+"""
+import threading
+import uuid
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from datetime import datetime
+
+from modules.carrito import items_como_lista
+from modules.consultas_catalogo import TAMANO_PAGINA
+from modules.instrumentacion import medir
+from modules.inventario import calcular_descuentos
+from modules.pedidos import CarritoVacio, armar_checkout, armar_pedido
+from modules.precomputo import COLECCION as RECOMENDACIONES, texto_vigente
+
+BACKENDS = ('firestore', 'memoria', 'sqlite')
+
+
+class Repositorio(ABC):
+    """Operaciones de datos que usan las páginas (y modules/precomputo.py)"""
+
+    # --- Usuarios ---
+
+    @abstractmethod
+    def guardar_usuario(self, usuario):
+        """Crea o actualiza usuarios/{uid}: marca last_login y, solo al crearlo, created_at"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def obtener_usuario(self, user_id):
+        """Datos del usuario o None"""
+        raise NotImplementedError
+
+    # --- Productos ---
+
+    @abstractmethod
+    def listar_productos(self):
+        """Todos los productos, cada uno con su 'id'"""
+        raise NotImplementedError
+
+    def escuchar_productos(self, callback):
+        """Llama a callback(cambiados, borrados) cada vez que cambia el catálogo.
+
+        cambiados son los productos agregados o modificados (con su 'id') y
+        borrados los ids eliminados. La primera llamada, desde otro hilo
+        como los snapshots de Firestore, trae el catálogo completo.
+        Devuelve la suscripción (con is_active y unsubscribe()) o None si el
+        backend no avisa de los cambios.
+        """
+        return None
+
+    @abstractmethod
+    def pagina_productos(self, categoria=None, cursor=None, tamano=TAMANO_PAGINA):
+        """Página de productos con stock, de mayor a menor stock.
+
+        Devuelve (productos, cursor_siguiente); el cursor es opaco y vale
+        None cuando no hay más páginas.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def agregar_productos(self, productos):
+        """Agrega productos con id automático, en lotes"""
+        raise NotImplementedError
+
+    # --- Carritos ---
+
+    @abstractmethod
+    def agregar_item(self, user_id, product_id, name, price, cantidad=1):
+        """Suma unidades de un producto al carrito"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def quitar_item(self, user_id, product_id):
+        """Elimina un producto del carrito"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def leer_carrito(self, user_id):
+        """Ítems del carrito como lista, en orden de agregado"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def vaciar_carrito(self, user_id):
+        """Elimina el carrito del usuario"""
+        raise NotImplementedError
+
+    # --- Pagos y órdenes ---
+
+    @abstractmethod
+    def guardar_checkout(self, payment_id, usuario, items):
+        """Guarda la copia del checkout que se usará al volver de PayPal"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def obtener_checkout(self, payment_id):
+        """Copia del checkout guardada para el pago o None"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def obtener_pedido(self, payment_id):
+        """Orden ya registrada para el pago o None"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def finalizar_pedido(self, payment_id, usuario):
+        """Registra la orden del pago, descuenta stock, vacía el carrito y marca el pago.
+
+        Todo de forma atómica y una sola vez por payment_id. Lanza
+        CarritoVacio si no hay ítems que registrar.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def registrar_pedido(self, user_id, pedido):
+        """Guarda una orden sin pago, descuenta stock y vacía el carrito; devuelve los faltantes"""
+        raise NotImplementedError
+
+    # --- Recomendaciones precalculadas (modules/precomputo.py) ---
+
+    @abstractmethod
+    def recomendacion_precalculada(self, product_id, excluir=()):
+        """Texto guardado para el producto o None"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def recomendaciones_guardadas(self):
+        """Todas las recomendaciones guardadas {product_id: datos}, con el documento _meta"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def guardar_recomendaciones(self, escribir, borrar=()):
+        """Escribe las recomendaciones {id: datos} y borra los ids de borrar"""
+        raise NotImplementedError
+
+
+class _Suscripcion:
+    """Suscripción a los cambios de productos de un repositorio local"""
+
+    def __init__(self, oyentes, callback):
+        self._oyentes = oyentes
+        self._callback = callback
+        self.is_active = True
+
+    def activar(self):
+        if self.is_active:
+            self._oyentes.append(self._callback)
+
+    def unsubscribe(self):
+        if self.is_active:
+            self.is_active = False
+            if self._callback in self._oyentes:
+                self._oyentes.remove(self._callback)
+
+
+class RepositorioDocumentos(Repositorio):
+    """Repositorio sobre un almacén local de documentos (memoria o SQLite).
+
+    Cada subclase implementa las primitivas _cargar, _guardar, _borrar,
+    _todos y _pagina; aquí están las reglas del dominio. Las operaciones
+    compuestas corren bajo un único lock (_transaccion), así son atómicas
+    entre las sesiones del proceso.
+    """
+
+    nombre = 'local'
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._oyentes = []
+        # Ordena los avisos a los oyentes: cada uno lleva datos más nuevos que el anterior
+        self._lock_avisos = threading.Lock()
+        # Ids de productos escritos o borrados desde el último aviso
+        self._productos_cambiados = set()
+
+    # --- Primitivas del almacén ---
+
+    @abstractmethod
+    def _cargar(self, coleccion, doc_id):
+        raise NotImplementedError
+
+    @abstractmethod
+    def _guardar(self, coleccion, doc_id, datos):
+        raise NotImplementedError
+
+    @abstractmethod
+    def _borrar(self, coleccion, doc_id):
+        raise NotImplementedError
+
+    @abstractmethod
+    def _todos(self, coleccion):
+        """Lista de (id, datos) de la colección"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def _pagina(self, categoria, despues_de, limite):
+        """Hasta limite productos con stock ordenados por (-stock, id), después del cursor (stock, id)"""
+        raise NotImplementedError
+
+    @contextmanager
+    def _transaccion(self):
+        with self._lock:
+            yield
+
+    # --- Lecturas y escrituras medidas (modules/instrumentacion.py) ---
+
+    def _leer(self, coleccion, doc_id):
+        with medir(f'{self.nombre}.get', coleccion, lecturas=1):
+            return self._cargar(coleccion, doc_id)
+
+    def _escribir(self, coleccion, doc_id, datos):
+        with medir(f'{self.nombre}.set', coleccion, escrituras=1):
+            self._guardar(coleccion, doc_id, datos)
+        self._marcar(coleccion, doc_id)
+
+    def _eliminar(self, coleccion, doc_id):
+        with medir(f'{self.nombre}.delete', coleccion, borrados=1):
+            self._borrar(coleccion, doc_id)
+        self._marcar(coleccion, doc_id)
+
+    def _marcar(self, coleccion, doc_id):
+        """Anota el producto para el próximo aviso a los oyentes"""
+        if coleccion == 'products':
+            with self._lock:
+                self._productos_cambiados.add(doc_id)
+
+    def cargar(self, coleccion, documentos):
+        """Carga documentos {id: datos} de una vez (datos de ejemplo o de prueba)"""
+        with self._transaccion():
+            for doc_id, datos in documentos.items():
+                self._guardar(coleccion, doc_id, datos)
+                self._marcar(coleccion, doc_id)
+        if coleccion == 'products':
+            self._avisar_productos()
+
+    def _avisar_productos(self):
+        """Envía a los oyentes solo los productos anotados desde el último aviso"""
+        with self._lock_avisos:
+            with self._lock:
+                ids, self._productos_cambiados = self._productos_cambiados, set()
+                if not ids or not self._oyentes:
+                    return
+                with medir(f'{self.nombre}.get_all', 'products', lecturas=len(ids)):
+                    documentos = {product_id: self._cargar('products', product_id) for product_id in ids}
+            cambiados = [{**datos, 'id': product_id} for product_id, datos in documentos.items() if datos is not None]
+            borrados = [product_id for product_id, datos in documentos.items() if datos is None]
+            # Fuera del lock del repositorio: el callback toma el lock del catálogo
+            for callback in list(self._oyentes):
+                callback(cambiados, borrados)
+
+    def _primer_aviso(self, suscripcion):
+        """Envía el catálogo completo a una suscripción nueva y la activa"""
+        with self._lock_avisos:
+            if not suscripcion.is_active:
+                return
+            productos = self.listar_productos()
+            # Los cambios posteriores a esta lectura le llegan en el próximo aviso
+            suscripcion.activar()
+            suscripcion._callback(productos, ())
+
+    # --- Usuarios ---
+
+    def guardar_usuario(self, usuario):
+        with self._transaccion():
+            previo = self._leer('usuarios', usuario['uid']) or {}
+            ahora = datetime.now()
+            self._escribir('usuarios', usuario['uid'], {
+                'created_at': ahora, **previo, **usuario, 'last_login': ahora,
+            })
+
+    def obtener_usuario(self, user_id):
+        return self._leer('usuarios', user_id)
+
+    # --- Productos ---
+
+    def listar_productos(self):
+        with medir(f'{self.nombre}.query', 'products') as span:
+            productos = [{**datos, 'id': doc_id} for doc_id, datos in self._todos('products')]
+            span.lecturas = max(1, len(productos))
+        return productos
+
+    def escuchar_productos(self, callback):
+        suscripcion = _Suscripcion(self._oyentes, callback)
+        # En otro hilo: quien se suscribe puede tener tomado el lock que usa el callback
+        threading.Thread(target=self._primer_aviso, args=(suscripcion,), daemon=True).start()
+        return suscripcion
+
+    def pagina_productos(self, categoria=None, cursor=None, tamano=TAMANO_PAGINA):
+        if categoria == "todos":
+            categoria = None
+        with medir(f'{self.nombre}.query', 'products') as span:
+            # Un producto extra solo para saber si existe otra página
+            productos = self._pagina(categoria, cursor, tamano + 1)
+            span.lecturas = max(1, len(productos))
+        siguiente = None
+        if len(productos) > tamano:
+            productos = productos[:tamano]
+            siguiente = (productos[-1].get('stock', 0), productos[-1]['id'])
+        return productos, siguiente
+
+    def agregar_productos(self, productos):
+        with self._transaccion():
+            for producto in productos:
+                self._escribir('products', uuid.uuid4().hex[:20], dict(producto))
+        self._avisar_productos()
+
+    # --- Carritos ---
+
+    def agregar_item(self, user_id, product_id, name, price, cantidad=1):
+        with self._transaccion():
+            carrito = self._leer('carts', user_id) or {'user_id': user_id, 'items': {}}
+            previo = carrito['items'].get(product_id, {})
+            ahora = datetime.now()
+            carrito['items'][product_id] = {
+                'product_id': product_id,
+                'name': name,
+                'price': price,
+                'quantity': previo.get('quantity', 0) + cantidad,
+                'added_at': ahora,
+            }
+            carrito['updated_at'] = ahora
+            self._escribir('carts', user_id, carrito)
+
+    def quitar_item(self, user_id, product_id):
+        with self._transaccion():
+            carrito = self._leer('carts', user_id)
+            if carrito is None:
+                return
+            carrito['items'].pop(product_id, None)
+            carrito['updated_at'] = datetime.now()
+            self._escribir('carts', user_id, carrito)
+
+    def leer_carrito(self, user_id):
+        carrito = self._leer('carts', user_id)
+        return items_como_lista(carrito.get('items', {})) if carrito else []
+
+    def vaciar_carrito(self, user_id):
+        self._eliminar('carts', user_id)
+
+    # --- Pagos y órdenes ---
+
+    def guardar_checkout(self, payment_id, usuario, items):
+        checkout = armar_checkout(payment_id, usuario, items)
+        self._escribir('paypal_payments', payment_id, checkout)
+        return checkout
+
+    def obtener_checkout(self, payment_id):
+        return self._leer('paypal_payments', payment_id)
+
+    def obtener_pedido(self, payment_id):
+        return self._leer('orders', payment_id)
+
+    def finalizar_pedido(self, payment_id, usuario):
+        with self._transaccion():
+            pedido = self._leer('orders', payment_id)
+            if pedido is not None:
+                return pedido
+
+            checkout = self._leer('paypal_payments', payment_id) or {}
+            items = checkout.get('items')
+            if not items:
+                # Pagos creados antes de guardar el checkout completo: se usa el carrito
+                items = self.leer_carrito(usuario['uid'])
+            if not items:
+                raise CarritoVacio(f"El carrito del pago {payment_id} está vacío")
+
+            faltantes = self._descontar_stock(items)
+            pedido = armar_pedido(checkout.get('usuario') or usuario, items, payment_id, faltantes)
+            self._escribir('orders', payment_id, pedido)
+            self._eliminar('carts', pedido['user_id'])
+            # El pago se conserva marcado: recargar la URL de regreso muestra la orden
+            self._escribir('paypal_payments', payment_id, {
+                **checkout, 'status': 'completed', 'order_number': pedido['order_number'],
+            })
+        self._avisar_productos()
+        return pedido
+
+    def registrar_pedido(self, user_id, pedido):
+        with self._transaccion():
+            faltantes = self._descontar_stock(pedido['items'])
+            self._escribir('orders', uuid.uuid4().hex[:20], {**pedido, 'faltantes': faltantes})
+            self._eliminar('carts', user_id)
+        self._avisar_productos()
+        return faltantes
+
+    def _descontar_stock(self, items):
+        productos = {}
+        for item in items:
+            if item['product_id'] not in productos:
+                productos[item['product_id']] = self._leer('products', item['product_id'])
+        stock = {pid: datos.get('stock', 0) for pid, datos in productos.items() if datos is not None}
+        descuentos, faltantes = calcular_descuentos(items, stock)
+        for product_id, descuento in descuentos.items():
+            datos = productos[product_id]
+            self._escribir('products', product_id, {**datos, 'stock': datos.get('stock', 0) - descuento})
+        return faltantes
+
+    # --- Recomendaciones precalculadas ---
+
+    def recomendacion_precalculada(self, product_id, excluir=()):
+        return texto_vigente(self._leer(RECOMENDACIONES, product_id), excluir)
+
+    def recomendaciones_guardadas(self):
+        with medir(f'{self.nombre}.query', RECOMENDACIONES) as span:
+            guardadas = dict(self._todos(RECOMENDACIONES))
+            span.lecturas = max(1, len(guardadas))
+        return guardadas
+
+    def guardar_recomendaciones(self, escribir, borrar=()):
+        with self._transaccion():
+            for product_id in borrar:
+                self._eliminar(RECOMENDACIONES, product_id)
+            for product_id, datos in escribir.items():
+                self._escribir(RECOMENDACIONES, product_id, datos)
+
+
+def crear_repositorio(backend='firestore', db=None, ruta=None):
+    """Crea el repositorio del backend indicado.
+
+    db es el cliente de Firestore (backend 'firestore') y ruta el archivo
+    SQLite (backend 'sqlite').
+    """
+    if backend == 'firestore':
+        from modules.repositorio_firestore import RepositorioFirestore
+        return RepositorioFirestore(db)
+    if backend == 'memoria':
+        from modules.repositorio_memoria import RepositorioMemoria
+        return RepositorioMemoria()
+    if backend == 'sqlite':
+        from modules.repositorio_sqlite import RepositorioSQLite
+        return RepositorioSQLite(ruta or 'megamoda.db')
+    raise ValueError(f"BACKEND_DATOS desconocido: {backend!r} (opciones: {', '.join(BACKENDS)})")
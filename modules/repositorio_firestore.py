@@ -0,0 +1,129 @@
+"""Repositorio sobre Firestore (BACKEND_DATOS=firestore, el predeterminado).
+
+Delega en los módulos de cada colección, que ya resuelven cada operación
+con la menor cantidad de lecturas y escrituras: carritos con una escritura
+por cambio (modules/carrito.py), órdenes y stock en una transacción con un
+único get_all (modules/pedidos.py, modules/inventario.py) y el catálogo por
+páginas (modules/consultas_catalogo.py). Las altas de varios productos van
+en lotes, igual que las recomendaciones precalculadas.
+"""
+from firebase_admin import firestore
+from google.api_core.exceptions import AlreadyExists, NotFound
+
+from modules import carrito, pedidos
+from modules.consultas_catalogo import TAMANO_PAGINA, obtener_pagina
+from modules.precomputo import COLECCION as RECOMENDACIONES, texto_vigente
+from modules.repositorio import Repositorio
+
+# Límite de escrituras por lote en Firestore
+TAMANO_LOTE = 500
+
+
+def _producto(doc):
+    product = doc.to_dict()
+    product['id'] = doc.id
+    return product
+
+
+class RepositorioFirestore(Repositorio):
+    """Repositorio de la tienda en un cliente de Firestore"""
+
+    def __init__(self, db):
+        self.db = db
+
+    # --- Usuarios ---
+
+    def guardar_usuario(self, usuario):
+        doc = self.db.collection('usuarios').document(usuario['uid'])
+        datos = {**usuario, 'last_login': firestore.SERVER_TIMESTAMP}
+        try:
+            # Usuario que ya existe (el caso habitual): una sola escritura
+            doc.update(datos)
+        except NotFound:
+            try:
+                doc.create({**datos, 'created_at': firestore.SERVER_TIMESTAMP})
+            except AlreadyExists:
+                # Otro login del mismo usuario lo creó entre medio
+                doc.update(datos)
+
+    def obtener_usuario(self, user_id):
+        doc = self.db.collection('usuarios').document(user_id).get()
+        return doc.to_dict() if doc.exists else None
+
+    # --- Productos ---
+
+    def listar_productos(self):
+        return [_producto(doc) for doc in self.db.collection('products').stream()]
+
+    def escuchar_productos(self, callback):
+        def al_cambiar(docs, changes, read_time):
+            # Solo los documentos que cambiaron; en el primer snapshot, todos (ADDED)
+            borrados = [c.document.id for c in changes if c.type.name == 'REMOVED']
+            cambiados = [_producto(c.document) for c in changes if c.type.name != 'REMOVED']
+            callback(cambiados, borrados)
+
+        return self.db.collection('products').on_snapshot(al_cambiar)
+
+    def pagina_productos(self, categoria=None, cursor=None, tamano=TAMANO_PAGINA):
+        return obtener_pagina(self.db, categoria, cursor, tamano)
+
+    def agregar_productos(self, productos):
+        coleccion = self.db.collection('products')
+        for inicio in range(0, len(productos), TAMANO_LOTE):
+            lote = self.db.batch()
+            for product in productos[inicio:inicio + TAMANO_LOTE]:
+                lote.set(coleccion.document(), product)
+            lote.commit()
+
+    # --- Carritos ---
+
+    def agregar_item(self, user_id, product_id, name, price, cantidad=1):
+        carrito.agregar_item(self.db, user_id, product_id, name, price, cantidad)
+
+    def quitar_item(self, user_id, product_id):
+        carrito.quitar_item(self.db, user_id, product_id)
+
+    def leer_carrito(self, user_id):
+        return carrito.leer_carrito(self.db, user_id)
+
+    def vaciar_carrito(self, user_id):
+        carrito.vaciar_carrito(self.db, user_id)
+
+    # --- Pagos y órdenes ---
+
+    def guardar_checkout(self, payment_id, usuario, items):
+        return pedidos.guardar_checkout(self.db, payment_id, usuario, items)
+
+    def obtener_checkout(self, payment_id):
+        return pedidos.obtener_checkout(self.db, payment_id)
+
+    def obtener_pedido(self, payment_id):
+        return pedidos.obtener_pedido(self.db, payment_id)
+
+    def finalizar_pedido(self, payment_id, usuario):
+        return pedidos.finalizar_pedido(self.db, payment_id, usuario)
+
+    def registrar_pedido(self, user_id, pedido):
+        return pedidos.registrar_pedido(self.db, user_id, pedido)
+
+    # --- Recomendaciones precalculadas ---
+
+    def recomendacion_precalculada(self, product_id, excluir=()):
+        # Una lectura por clave
+        doc = self.db.collection(RECOMENDACIONES).document(product_id).get()
+        return texto_vigente(doc.to_dict() if doc.exists else None, excluir)
+
+    def recomendaciones_guardadas(self):
+        return {doc.id: doc.to_dict() for doc in self.db.collection(RECOMENDACIONES).stream()}
+
+    def guardar_recomendaciones(self, escribir, borrar=()):
+        coleccion = self.db.collection(RECOMENDACIONES)
+        operaciones = [*((i, None) for i in borrar), *escribir.items()]
+        for inicio in range(0, len(operaciones), TAMANO_LOTE):
+            lote = self.db.batch()
+            for product_id, datos in operaciones[inicio:inicio + TAMANO_LOTE]:
+                if datos is None:
+                    lote.delete(coleccion.document(product_id))
+                else:
+                    lote.set(coleccion.document(product_id), datos)
+            lote.commit()
@@ -0,0 +1,52 @@
+"""Repositorio en memoria del proceso (BACKEND_DATOS=memoria).
+
+Los datos viven mientras viva el proceso y los comparten todas sus
+sesiones. Sirve para desarrollo local sin un proyecto de Firebase y para
+pruebas de carga sin la latencia ni el costo de Firestore.
+"""
+import copy
+import heapq
+
+from modules.repositorio import RepositorioDocumentos
+
+
+class RepositorioMemoria(RepositorioDocumentos):
+    """Documentos en diccionarios por colección"""
+
+    nombre = 'memoria'
+
+    def __init__(self):
+        super().__init__()
+        self._colecciones = {}
+
+    def _coleccion(self, nombre):
+        return self._colecciones.setdefault(nombre, {})
+
+    def _cargar(self, coleccion, doc_id):
+        # Copia: quien lee puede modificar el documento sin tocar lo guardado
+        datos = self._coleccion(coleccion).get(doc_id)
+        return copy.deepcopy(datos) if datos is not None else None
+
+    def _guardar(self, coleccion, doc_id, datos):
+        self._coleccion(coleccion)[doc_id] = copy.deepcopy(datos)
+
+    def _borrar(self, coleccion, doc_id):
+        self._coleccion(coleccion).pop(doc_id, None)
+
+    def _todos(self, coleccion):
+        # Sin copia profunda: los productos son planos y listar_productos
+        # devuelve una copia de cada uno
+        with self._lock:
+            return list(self._coleccion(coleccion).items())
+
+    def _pagina(self, categoria, despues_de, limite):
+        candidatos = (
+            (-datos.get('stock', 0), doc_id, datos)
+            for doc_id, datos in self._todos('products')
+            if datos.get('stock', 0) > 0 and (categoria is None or datos.get('category') == categoria)
+        )
+        if despues_de is not None:
+            limite_orden = (-despues_de[0], despues_de[1])
+            candidatos = (c for c in candidatos if c[:2] > limite_orden)
+        # Solo se ordenan los primeros: O(n log limite)
+        return [{**datos, 'id': doc_id} for _, doc_id, datos in heapq.nsmallest(limite, candidatos, key=lambda c: c[:2])]
@@ -0,0 +1,121 @@
+"""Repositorio en un archivo SQLite (BACKEND_DATOS=sqlite, SQLITE_DB=ruta).
+
+Cada documento es una fila (colección, id, JSON); las fechas se guardan
+como {"$fecha": iso} para recuperarlas como datetime. La página de
+productos se resuelve en SQL con un índice sobre el stock, sin cargar la
+colección en Python. Una conexión por proceso, compartida por las sesiones
+bajo el lock del repositorio.
+"""
+import json
+import sqlite3
+from contextlib import contextmanager
+from datetime import datetime
+
+from modules.repositorio import RepositorioDocumentos
+
+_STOCK = "json_extract(datos, '$.stock')"
+
+
+def _codificar(valor):
+    if isinstance(valor, datetime):
+        return {'$fecha': valor.isoformat()}
+    raise TypeError(f"{type(valor).__name__} no se puede guardar en SQLite")
+
+
+def _decodificar(objeto):
+    if len(objeto) == 1 and '$fecha' in objeto:
+        return datetime.fromisoformat(objeto['$fecha'])
+    return objeto
+
+
+def _a_json(datos):
+    return json.dumps(datos, default=_codificar, ensure_ascii=False)
+
+
+def _de_json(texto):
+    return json.loads(texto, object_hook=_decodificar)
+
+
+class RepositorioSQLite(RepositorioDocumentos):
+    """Documentos en la tabla 'documentos' de un archivo SQLite"""
+
+    nombre = 'sqlite'
+
+    def __init__(self, ruta):
+        super().__init__()
+        self._db = sqlite3.connect(ruta, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS documentos "
+            "(coleccion TEXT NOT NULL, id TEXT NOT NULL, datos TEXT NOT NULL, "
+            "PRIMARY KEY (coleccion, id)) WITHOUT ROWID"
+        )
+        # Páginas del catálogo: productos ordenados por stock descendente e id
+        self._db.execute(
+            f"CREATE INDEX IF NOT EXISTS documentos_stock ON documentos (coleccion, {_STOCK} DESC, id)"
+        )
+        self._db.commit()
+        self._anidadas = 0
+
+    @contextmanager
+    def _transaccion(self):
+        # Las escrituras dentro de la transacción se confirman juntas al final
+        with self._lock:
+            self._anidadas += 1
+            try:
+                yield
+            except BaseException:
+                if self._anidadas == 1:
+                    self._db.rollback()
+                raise
+            else:
+                if self._anidadas == 1:
+                    self._db.commit()
+            finally:
+                self._anidadas -= 1
+
+    def _confirmar(self):
+        if not self._anidadas:
+            self._db.commit()
+
+    def _cargar(self, coleccion, doc_id):
+        with self._lock:
+            fila = self._db.execute(
+                "SELECT datos FROM documentos WHERE coleccion = ? AND id = ?", (coleccion, doc_id)
+            ).fetchone()
+        return _de_json(fila[0]) if fila else None
+
+    def _guardar(self, coleccion, doc_id, datos):
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO documentos VALUES (?, ?, ?)", (coleccion, doc_id, _a_json(datos))
+            )
+            self._confirmar()
+
+    def _borrar(self, coleccion, doc_id):
+        with self._lock:
+            self._db.execute("DELETE FROM documentos WHERE coleccion = ? AND id = ?", (coleccion, doc_id))
+            self._confirmar()
+
+    def _todos(self, coleccion):
+        with self._lock:
+            filas = self._db.execute(
+                "SELECT id, datos FROM documentos WHERE coleccion = ?", (coleccion,)
+            ).fetchall()
+        return [(doc_id, _de_json(datos)) for doc_id, datos in filas]
+
+    def _pagina(self, categoria, despues_de, limite):
+        condiciones = ["coleccion = 'products'", f"{_STOCK} > 0"]
+        parametros = []
+        if categoria is not None:
+            condiciones.append("json_extract(datos, '$.category') = ?")
+            parametros.append(categoria)
+        if despues_de is not None:
+            condiciones.append(f"({_STOCK} < ? OR ({_STOCK} = ? AND id > ?))")
+            parametros.extend([despues_de[0], despues_de[0], despues_de[1]])
+        with self._lock:
+            filas = self._db.execute(
+                f"SELECT id, datos FROM documentos WHERE {' AND '.join(condiciones)} "
+                f"ORDER BY {_STOCK} DESC, id LIMIT ?", (*parametros, limite)
+            ).fetchall()
+        return [{**_de_json(datos), 'id': doc_id} for doc_id, datos in filas]
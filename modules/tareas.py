@@ -0,0 +1,111 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Hilos compartidos por todas las sesiones para trabajo fuera del rerun
+MAX_HILOS = 4
+# Tareas aceptadas a la vez (en ejecución + en cola); el resto se descarta
+MAX_PENDIENTES = 32
+
+
+class ColaTareas:
+    """Hilos propios con un tope de tareas aceptadas (en ejecución + en cola).
+
+    Cada tipo de trabajo lento tiene su cola, así no puede llenar la de otro.
+    """
+
+    def __init__(self, hilos, max_pendientes, nombre):
+        self.ejecutor = ThreadPoolExecutor(max_workers=hilos, thread_name_prefix=nombre)
+        self._cupos = threading.BoundedSemaphore(max_pendientes)
+
+    def enviar(self, funcion, *args, **kwargs):
+        """Ejecuta la función en segundo plano y devuelve su Future.
+
+        Devuelve None si la cola está llena, para no acumular trabajo sin límite.
+        """
+        if not self._cupos.acquire(blocking=False):
+            return None
+        try:
+            futuro = self.ejecutor.submit(funcion, *args, **kwargs)
+        except Exception:
+            self._cupos.release()
+            raise
+        futuro.add_done_callback(lambda _: self._cupos.release())
+        return futuro
+
+
+# Cola general (recomendaciones de las sesiones)
+_cola = ColaTareas(MAX_HILOS, MAX_PENDIENTES, "megamoda")
+ejecutor = _cola.ejecutor
+enviar = _cola.enviar
+
+
+class TextoCancelado(Exception):
+    """Quien leía el texto lo canceló: la tarea debe dejar de producirlo"""
+
+
+class TextoParcial:
+    """Texto que una tarea en segundo plano produce de a fragmentos.
+
+    La tarea llama a agregar() con cada fragmento y cerrar() al terminar;
+    el rerun lee lo que ya llegó sin esperar al final (p. ej. con
+    st.write_stream). Si el lector lo cancela, el próximo agregar() lanza
+    TextoCancelado.
+    """
+
+    def __init__(self):
+        self._partes = []
+        self._cerrado = False
+        self._cancelado = False
+        self._cambio = threading.Condition()
+
+    def agregar(self, fragmento):
+        with self._cambio:
+            if self._cancelado:
+                raise TextoCancelado()
+            self._partes.append(fragmento)
+            self._cambio.notify_all()
+
+    def cancelar(self):
+        with self._cambio:
+            self._cancelado = self._cerrado = True
+            self._cambio.notify_all()
+
+    def cerrar(self):
+        with self._cambio:
+            self._cerrado = True
+            self._cambio.notify_all()
+
+    @property
+    def texto(self):
+        with self._cambio:
+            return "".join(self._partes)
+
+    def esperar_inicio(self, espera):
+        """Espera el primer fragmento; True si llegó texto dentro de la espera"""
+        with self._cambio:
+            self._cambio.wait_for(lambda: self._partes or self._cerrado, espera)
+            return bool(self._partes)
+
+    def leer(self, espera=None):
+        """Generador con lo recibido hasta ahora y lo que llegue en los próximos segundos.
+
+        Termina al cerrarse el texto o al pasar la espera, para no retener el
+        rerun hasta el final de la tarea. Sin espera, lee hasta que se cierre.
+        """
+        limite = None if espera is None else time.monotonic() + espera
+        leidas = 0
+        while True:
+            with self._cambio:
+                while leidas == len(self._partes) and not self._cerrado:
+                    restante = None if limite is None else limite - time.monotonic()
+                    if restante is not None and restante <= 0:
+                        return
+                    self._cambio.wait(restante)
+                nuevas = self._partes[leidas:]
+                leidas = len(self._partes)
+            if not nuevas:
+                return
+            yield "".join(nuevas)
+            if limite is not None and time.monotonic() >= limite:
+                return
@@ -0,0 +1,85 @@
+import streamlit as st
+from datetime import datetime
+from modules.instrumentacion import metricas
+from modules.recursos import es_admin
+
+# Página oculta (no figura en la navegación): solo para los emails de ADMIN_EMAILS
+if 'login' not in st.session_state:
+    st.switch_page('app.py')
+
+if not es_admin(st.session_state.get('usuario')):
+    st.error("⛔ No tienes permiso para ver esta página.")
+    st.stop()
+
+st.markdown("## 📈 Métricas del proceso")
+st.caption("Duraciones de las últimas acciones de todas las sesiones de este proceso "
+           "(reruns de página, fragmentos y tareas en segundo plano).")
+
+if st.button("🔄 Actualizar"):
+    st.rerun()
+
+
+def tabla_percentiles(filas):
+    return [{
+        'Nombre': fila['nombre'],
+        'Colección': fila['coleccion'],
+        'Cantidad': fila['cantidad'],
+        'p50 (ms)': round(fila['p50_ms'], 1),
+        'p95 (ms)': round(fila['p95_ms'], 1),
+        'Máx. (ms)': round(fila['max_ms'], 1),
+        'Total (s)': round(fila['total_s'], 2),
+    } for fila in filas]
+
+
+# Acciones: lo que espera el usuario en cada interacción
+st.markdown("### ⏱️ Acciones")
+acciones = metricas.percentiles('accion')
+if acciones:
+    st.dataframe(tabla_percentiles(acciones), hide_index=True, width="stretch")
+else:
+    st.info("Todavía no hay acciones registradas.")
+
+# Operaciones: Firestore, OpenAI, PayPal y Google dentro de las acciones
+st.markdown("### 🔌 Operaciones")
+operaciones = sorted(metricas.percentiles('span'), key=lambda fila: fila['total_s'], reverse=True)
+if operaciones:
+    st.dataframe(tabla_percentiles(operaciones), hide_index=True, width="stretch")
+
+col1, col2 = st.columns(2)
+with col1:
+    st.markdown("### 🔥 Documentos de Firestore")
+    documentos = {}
+    for (coleccion, tipo), cantidad in metricas.documentos().items():
+        documentos.setdefault(coleccion, {'Colección': coleccion, 'lecturas': 0, 'escrituras': 0, 'borrados': 0})
+        documentos[coleccion][tipo] = cantidad
+    if documentos:
+        st.dataframe(sorted(documentos.values(), key=lambda fila: fila['Colección']), hide_index=True, width="stretch")
+with col2:
+    st.markdown("### 🤖 Tokens")
+    tokens = [{'Modelo': modelo, 'Tipo': tipo, 'Tokens': cantidad}
+              for (modelo, tipo), cantidad in sorted(metricas.tokens().items())]
+    if tokens:
+        st.dataframe(tokens, hide_index=True, width="stretch")
+    else:
+        st.caption("Sin llamadas al LLM.")
+    caminos = [{'Operación': operacion, 'Camino': camino, 'Veces': cantidad}
+               for (operacion, camino), cantidad in sorted(metricas.caminos().items())]
+    if caminos:
+        st.markdown("### 🔀 Caminos")
+        st.dataframe(caminos, hide_index=True, width="stretch")
+
+# Últimas acciones, con el detalle de sus operaciones
+st.markdown("### 🧾 Últimas acciones")
+for resumen in reversed(metricas.recientes()):
+    hora = datetime.fromtimestamp(resumen['fecha']).strftime('%H:%M:%S')
+    titulo = (f"{hora} · {resumen['accion']} · {resumen['ms']:.0f} ms · "
+              f"{resumen['lecturas']} lecturas · {resumen['escrituras']} escrituras")
+    with st.expander(titulo):
+        st.json(resumen)
+
+with st.expander("Formato Prometheus"):
+    st.code(metricas.prometheus(), language="text")
+
+if st.button("🧹 Reiniciar métricas"):
+    metricas.reiniciar()
+    st.rerun()
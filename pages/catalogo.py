@@ -1,40 +1,40 @@
 import streamlit as st
-import paypalrestsdk # Importa la librería de PayPal
 import os
 from datetime import datetime
 import time
-from modules.recomendador import generar_recomendacion
+import math
+from modules.recomendador import obtener_recomendacion
+from modules.catalogo_cache import catalogo
+from modules.consultas_catalogo import TAMANO_PAGINA
+from modules.busqueda import ORDENES, indice
+from modules import tareas
+from modules.render_catalogo import COLUMNAS, filas, grilla_html
+from modules.imagenes import miniaturas
+from modules.recursos import leer_estilos, obtener_repositorio, obtener_paypal
+from modules.pagos_paypal import ErrorPayPal, url_aprobacion
+from modules.instrumentacion import iniciar_rerun, finalizar_rerun, instrumentado
+
+iniciar_rerun("catalogo")
 
 
 if 'login' not in st.session_state:
     st.switch_page('app.py')
 
+# Repositorio de datos compartido por todas las sesiones (modules/repositorio.py)
+repo = obtener_repositorio()
+
 # CSS personalizado para el diseño de lujo
-with open("estilos/css_catalogo.html", "r") as file:
-    html_content = file.read()
-st.markdown(html_content, unsafe_allow_html=True)
+st.markdown(leer_estilos("estilos/css_catalogo.html"), unsafe_allow_html=True)
 
 # Configuración de Stripe
 #stripe.api_key = os.environ.get("STRIPE_SECRET_KEY")
-paypalrestsdk.configure({
-    "mode": "sandbox",  # Usa "live" para producción
-    #"client_id": os.environ.get("PAYPAL_CLIENT_ID"),
-    #"client_secret": os.environ.get("PAYPAL_SECRET_KEY")
-    "client_id": st.secrets["PAYPAL_CLIENT_ID"],
-    "client_secret": st.secrets["PAYPAL_SECRET_KEY"]
-})
-# Funciones de Firestore
+# Cliente de PayPal compartido por todas las sesiones (modules/recursos.py)
+paypal = obtener_paypal()
+# Funciones de datos
 def get_products():
-    """Obtiene productos desde Firestore"""
+    """Obtiene productos desde el catálogo compartido (cacheado por proceso)"""
     try:
-        products_ref = st.session_state.db.collection('products')
-        docs = products_ref.stream()
-        
-        products = []
-        for doc in docs:
-            product = doc.to_dict()
-            product['id'] = doc.id
-            products.append(product)
+        products = catalogo.obtener(repo)
         
         # Si no hay productos, crear algunos de ejemplo
         if not products:
@@ -114,11 +114,12 @@ def get_products():
                 
             ]
             
-            # Agregar productos de ejemplo a Firestore
-            for product in sample_products:
-                st.session_state.db.collection('products').add(product)
+            # Agregar productos de ejemplo (en un solo lote)
+            repo.agregar_productos(sample_products)
             
-            return sample_products
+            # Recargar para que los productos de ejemplo tengan su 'id'
+            catalogo.invalidar()
+            return catalogo.obtener(repo)
         
         return products
     
@@ -126,74 +127,74 @@ def get_products():
         st.error(f"Error al obtener productos: {str(e)}")
         return []
 
-def add_to_cart(product_id, product_name, product_price, user_id):
-    """Agrega producto al carrito"""
+def buscar_productos(busqueda, categoria, desde=0):
+    """Consulta el índice de búsqueda en memoria, al día con el catálogo compartido"""
+    get_products()  # carga el catálogo compartido si hace falta
+    indice.sincronizar(catalogo)
+    return indice.buscar(
+        busqueda['texto'],
+        categoria=None if categoria == "todos" else categoria,
+        precio_min=busqueda['precio_min'],
+        precio_max=busqueda['precio_max'],
+        solo_stock=busqueda['solo_stock'],
+        orden=busqueda['orden'],
+        desde=desde,
+        limite=TAMANO_PAGINA,
+    )
+
+def cargar_siguiente_pagina(grid):
+    """Agrega a la grilla la siguiente página de productos de la categoría"""
+    if grid.get('busqueda'):
+        # Con búsqueda o filtros activos el cursor es la posición en los resultados
+        try:
+            desde = grid['cursor'] or 0
+            resultado = buscar_productos(grid['busqueda'], grid['categoria'], desde)
+            grid['productos'].extend(resultado.productos)
+            siguiente = desde + len(resultado.productos)
+            grid['cursor'] = siguiente if siguiente < resultado.total else None
+            grid['total'] = resultado.total
+            grid['por_categoria'] = resultado.por_categoria
+        except Exception as e:
+            st.error(f"Error al buscar productos: {str(e)}")
+            grid['cursor'] = None
+        return
+
     try:
-        cart_ref = st.session_state.db.collection('carts').document(user_id)
-        cart_doc = cart_ref.get()
-        cart_items = []
-        
-        if cart_doc.exists:
-            cart_items = cart_doc.to_dict().get('items', [])
-
-        # Buscar si ya está en el carrito
-        product_found = False
-        for item in cart_items:
-            if item['product_id'] == product_id:
-                item['quantity'] += 1
-                product_found = True
-                break
-        if not product_found:
-            cart_items.append({
-                'product_id': product_id,
-                'name': product_name,
-                'price': product_price,
-                'quantity': 1,
-                'added_at': datetime.now()
-            })
-            
-            
-        # Guardar el carrito actualizado en Firestore
-        # Eliminamos 'session_id' y 'created_at' porque 'updated_at' es más relevante aquí
-        # y 'status' de carrito no es necesario, es un carrito no una orden
-        cart_ref.set({
-            'user_id': user_id,
-            'items': cart_items,
-            'updated_at': datetime.now() # Campo para saber cuándo fue la última modificación
-        })
+        productos, cursor = repo.pagina_productos(grid['categoria'], grid['cursor'])
+
+        # Catálogo vacío: get_products() crea los productos de ejemplo
+        if not productos and grid['cursor'] is None and grid['categoria'] == "todos":
+            if get_products():
+                productos, cursor = repo.pagina_productos(grid['categoria'])
+
+        grid['productos'].extend(productos)
+        grid['cursor'] = cursor
+
+    except Exception as e:
+        st.error(f"Error al obtener productos: {str(e)}")
+        grid['cursor'] = None
 
+def add_to_cart(product_id, product_name, product_price, user_id):
+    """Agrega producto al carrito (una sola escritura atómica)"""
+    try:
+        repo.agregar_item(user_id, product_id, product_name, product_price)
         return True
 
-          
     except Exception as e:
         st.error(f"Error al agregar al carrito: {str(e)}")
         return False
 
-def remove_from_cart(product_name, user_id):
+def remove_from_cart(product_id, user_id):
     """Elimina un producto del carrito"""
     try:
-        cart_ref = st.session_state.db.collection('carts').document(user_id)
-        cart_doc = cart_ref.get()
-
-        if not cart_doc.exists:
-            return
-
-        cart_items = cart_doc.to_dict().get('items', [])
-        # Filtrar fuera el producto a eliminar
-        updated_items = [item for item in cart_items if item['name'] != product_name]
-
-        # Actualizar en Firestore
-        cart_ref.set({
-            'user_id': user_id,
-            'items': updated_items,
-            'updated_at': datetime.now()
-        })
+        repo.quitar_item(user_id, product_id)
 
         # También actualizar session_state
-        st.session_state.cart = updated_items
+        set_cart([item for item in st.session_state.cart if item['product_id'] != product_id])
         
         # 🚨 Marcar recomendación como inactiva tras cualquier modificación
         st.session_state.recomendacion_activa = False
+        cancelar_recomendacion_pendiente()
         
 
     except Exception as e:
@@ -202,17 +203,17 @@ def remove_from_cart(product_name, user_id):
 def get_cart(user_id):
     """Obtiene el carrito del usuario"""
     try:
-        cart_ref = st.session_state.db.collection('carts').document(user_id)
-        cart_doc = cart_ref.get()
-        
-        if cart_doc.exists:
-            return cart_doc.to_dict().get('items', [])
-        return []
+        return repo.leer_carrito(user_id)
     
     except Exception as e:
         st.error(f"Error al obtener carrito: {str(e)}")
         return []
 
+def set_cart(items):
+    """Reemplaza el carrito de la sesión y su índice por product_id"""
+    st.session_state.cart = items
+    st.session_state.cart_index = {item['product_id']: item for item in items}
+
 # NUEVA FUNCIÓN: Para simular la creación de la orden y limpieza de carrito
 def process_order(user_id, cart_items):
     """Procesa la orden: guarda en 'orders' y limpia 'carts'."""
@@ -233,19 +234,15 @@ def process_order(user_id, cart_items):
             'order_number': f"ORD-{int(time.time())}-{user_id[:4]}" # Genera un número de orden único
         }
 
-        # Guardar la orden en la colección 'orders'
-        st.session_state.db.collection('orders').add(order_data)
+        # Guardar la orden, descontar el stock y vaciar el carrito en una sola transacción
+        faltantes = repo.registrar_pedido(user_id, order_data)
         st.success("🎉 ¡Pedido realizado con éxito!")
+        for faltante in faltantes:
+            st.warning(f"Stock insuficiente de {faltante['name']}: se pidieron {faltante['pedido']}, "
+                       f"había {faltante['disponible']}.")
 
-        # Actualizar stock de productos (opcional aquí, pero recomendado)
-        update_product_stock(cart_items)
-
-        # Limpiar el carrito del usuario en Firestore
-        cart_ref = st.session_state.db.collection('carts').document(user_id)
-        cart_ref.delete()
-        
         # Limpiar también el carrito en la sesión de Streamlit
-        st.session_state.cart = []
+        set_cart([])
 
         return True
 
@@ -253,25 +250,6 @@ def process_order(user_id, cart_items):
         st.error(f"Error al procesar la orden: {str(e)}")
         return False
 
-def update_product_stock(items):
-    """Actualiza el stock de los productos comprados en Firestore"""
-    try:
-        for item in items:
-            product_ref = st.session_state.db.collection('products').document(item['product_id'])
-            product_doc = product_ref.get()
-
-            if product_doc.exists:
-                product_data = product_doc.to_dict()
-                current_stock = product_data.get('stock', 0)
-                new_stock = max(0, current_stock - item['quantity'])
-
-                product_ref.update({'stock': new_stock})
-            else:
-                st.warning(f"Producto con ID {item['product_id']} no encontrado para actualizar stock.")
-
-    except Exception as e:
-        st.error(f"Error al actualizar stock: {str(e)}")
-
 # Funciones de Stripe
 #def create_checkout_session(items, user_email):
     #"""Crea una sesión de pago con Stripe"""
@@ -309,96 +287,177 @@ def update_product_stock(items):
         #st.error(f"Error al crear sesión de pago: {str(e)}")
         #return None
 
-def save_paypal_payment_and_user_data(payment_id, user_id):
-    """Guarda una referencia del usuario y el payment_id en Firestore"""
-    db = st.session_state.db
-    #st.write(f"DEBUG: Guardando payment_id {payment_id} para user {user_id}")
-    # Usar payment_id como clave del documento
-    db.collection('paypal_payments').document(payment_id).set({
-        'user_id': user_id,
-        'created_at': datetime.now()
-    })
-    #st.write("DEBUG: Payment ID guardado exitosamente")        
+def save_paypal_payment_and_user_data(payment_id, usuario, items):
+    """Guarda el checkout completo (usuario, ítems y total) con el payment_id como clave"""
+    repo.guardar_checkout(payment_id, usuario, items)
+
 # Función para crear una sesión de pago con PayPal
 def create_paypal_payment(items, user_id):
     """Crea una sesión de pago con PayPal"""
     try:
-        total_amount = sum(item['price'] * item['quantity'] for item in items)
-        
-        # Prepara los artículos en el formato que espera PayPal
-        line_items_paypal = [{
-            "name": item['name'],
-            "sku": item['product_id'],
-            "price": str(item['price']),
-            "currency": "USD",
-            "quantity": item['quantity']
-        } for item in items]
-
-        payment = paypalrestsdk.Payment({
-            "intent": "sale",
-            "payer": {
-                "payment_method": "paypal"
-            },
-            "redirect_urls": {
-                "return_url": "https://megamodastore.streamlit.app?payment=success",
-                "cancel_url": "https://megamodastore.streamlit.app?payment=cancelled"
-            },
-            "transactions": [{
-                "item_list": {
-                    "items": line_items_paypal
-                },
-                "amount": {
-                    "total": f"{total_amount:.2f}",
-                    "currency": "USD"
-                },
-                "description": "Compra en tu tienda Megamoda Store"
-            }]
-        })
-
-        if payment.create():
-            #st.session_state['paypal_payment_id'] = payment.id # Guarda el payment ID
-            # ➡️ RETORNA EL OBJETO 'payment' COMPLETO
-            #st.write(f"DEBUG: Payment ID generado: {payment.id}") 
-            return payment 
-        else:
-            st.error(f"Error al crear el pago en PayPal: {payment.error['message']}")
-            return None
-    
+        return paypal.crear_pago(
+            items,
+            return_url="https://megamodastore.streamlit.app?payment=success",
+            cancel_url="https://megamodastore.streamlit.app?payment=cancelled",
+            descripcion="Compra en tu tienda Megamoda Store"
+        )
+    except ErrorPayPal as e:
+        st.error(f"Error al crear el pago en PayPal: {str(e)}")
+        return None
     except Exception as e:
         st.error(f"Error inesperado al procesar el pago: {str(e)}")
         return None
 
 
-    
-# --- LÓGICA PRINCIPAL DE LA PÁGINA ---
-st.markdown('<div class="main-header"><h1>🛍️ Megamoda Store</h1><p>Bienvenido/a a tu tienda de moda</p></div>', unsafe_allow_html=True)
+# Segundos que cada ejecución del sondeo de la recomendación muestra el texto
+# que va llegando de GPT-4. Mientras dura, los clics en otros fragmentos
+# esperan, así que es corta: el sondeo de cada segundo continúa el texto.
+ESPERA_STREAM = 0.5
 
-# Sidebar con información del usuario y carrito
-with st.sidebar:
-    st.markdown(f"### 👤 {st.session_state['usuario']['nombre']}")
-    
-    if st.button("🚪 Cerrar Sesión"):
-        st.session_state.clear()
-        st.rerun()
-    
-    st.markdown("---")
-    
-    # Carrito de compras
-    st.markdown("### 🛒 Carrito")
-    # Lógica para cargar el carrito desde Firestore una vez por sesión
-    if 'cart_loaded' not in st.session_state or not st.session_state.cart_loaded:
-        if st.session_state.get('usuario') and st.session_state['usuario'].get('uid'):
-            st.session_state.cart = get_cart(st.session_state['usuario']['uid'])
-            st.session_state.cart_loaded = True
+def firma_carrito(cart):
+    """Identifica el contenido del carrito para detectar recomendaciones obsoletas"""
+    return tuple(sorted((item['product_id'], item['quantity']) for item in cart))
+
+@instrumentado("recomendacion.tarea")
+def recomendacion_para(repo, product, all_products, version_catalogo, cart, flujo=None):
+    """Busca la recomendación precalculada; si no sirve, la genera (corre en segundo plano)"""
+    cart_ids = [item['product_id'] for item in cart]
+    try:
+        texto = repo.recomendacion_precalculada(product['id'], cart_ids)
+    except Exception:
+        texto = None
+    if texto is None:
+        texto = obtener_recomendacion(product, all_products, version_catalogo, cart, flujo)
+    return texto
+
+def solicitar_recomendacion(product):
+    """Genera la recomendación en segundo plano; la anterior pendiente se descarta"""
+    cancelar_recomendacion_pendiente()
+    cart = [dict(item) for item in st.session_state.cart]
+    # El texto de GPT-4 llega por partes al flujo mientras la tarea corre
+    flujo = tareas.TextoParcial()
+    futuro = tareas.enviar(
+        recomendacion_para, repo, product, get_products(), catalogo.huella, cart, flujo
+    )
+    if futuro is not None:
+        futuro.add_done_callback(lambda _: flujo.cerrar())
+        st.session_state.recomendacion_pendiente = {
+            'futuro': futuro, 'firma': firma_carrito(cart), 'flujo': flujo,
+        }
+
+def cancelar_recomendacion_pendiente():
+    """Cancela (o ignora, si ya empezó) la recomendación en curso"""
+    pendiente = st.session_state.pop('recomendacion_pendiente', None)
+    if pendiente:
+        pendiente['futuro'].cancel()
+
+def transmitir_recomendacion(flujo):
+    """Muestra el texto que ya llegó del modelo y el que llega durante ESPERA_STREAM.
+
+    Devuelve el contenedor del texto mostrado, para reemplazarlo por la
+    recomendación definitiva, o None si todavía no llegó nada.
+    """
+    contenedor = st.empty()
+    with contenedor.container():
+        st.markdown("---")
+        marcador = st.empty()
+        marcador.caption("🤖 Preparando una recomendación para ti...")
+
+        def partes():
+            for i, parte in enumerate(flujo.leer(ESPERA_STREAM)):
+                if i == 0:
+                    yield lambda: marcador.markdown("### 🤖 Recomendación personalizada")
+                yield parte
+
+        mostrado = bool(st.write_stream(partes()))
+    return contenedor if mostrado else None
+
+@instrumentado("catalogo.recomendacion")
+def mostrar_recomendacion():
+    """Muestra la recomendación activa o la que se está generando en segundo plano.
+
+    Mientras GPT-4 responde, cada ejecución muestra el texto recibido hasta
+    el momento. Después de mostrarla, el sondeo sigue hasta el próximo
+    cambio del carrito, pero cada ejecución solo consulta session_state.
+    """
+    transmitida = None
+    pendiente = st.session_state.get('recomendacion_pendiente')
+    if pendiente:
+        futuro = pendiente['futuro']
+        if pendiente['firma'] != firma_carrito(st.session_state.cart):
+            # El carrito cambió antes de que llegara la respuesta
+            cancelar_recomendacion_pendiente()
         else:
-            st.session_state.cart = []
-            st.session_state.cart_loaded = True
-            
-    # Mostrar recomendación solo si está activa 
+            if not futuro.done():
+                transmitida = transmitir_recomendacion(pendiente['flujo'])
+            if futuro.done():
+                del st.session_state['recomendacion_pendiente']
+                if not futuro.cancelled() and futuro.exception() is None and futuro.result():
+                    st.session_state.recomendacion = futuro.result()
+                    st.session_state.recomendacion_activa = True
+
+    if transmitida is not None:
+        if 'recomendacion_pendiente' in st.session_state:
+            # Sigue llegando: el próximo sondeo lo vuelve a mostrar desde el comienzo
+            return
+        # Terminó en este rerun: lo transmitido se reemplaza por el texto
+        # definitivo (el del motor local si GPT-4 falló a mitad del stream)
+        transmitida.empty()
     if st.session_state.get('recomendacion') and st.session_state.get('recomendacion_activa', False):
         st.markdown("---")
         st.markdown("### 🤖 Recomendación personalizada")
-        st.info(st.session_state.recomendacion) 
+        st.info(st.session_state.recomendacion)
+
+
+def quitar_del_carrito(product_id):
+    """Callback del botón 🗑️: solo se vuelve a ejecutar el carrito"""
+    remove_from_cart(product_id, st.session_state['usuario']['uid'])
+    st.rerun(["carrito"])
+
+def agregar_al_carrito(product):
+    """Callback del botón de agregar: solo se vuelve a ejecutar el carrito"""
+    # Agregar al carrito en memoria
+    cart_item = {
+        'product_id': product.get('id', None),
+        'name': product['name'],
+        'price': product['price'],
+        'quantity': 1,
+        'image': product['image']
+    }
+
+    # Verificar si ya existe en el carrito (búsqueda por índice)
+    existing_item = st.session_state.cart_index.get(product['id'])
+    if existing_item:
+        existing_item['quantity'] += 1
+    else:
+        st.session_state.cart.append(cart_item)
+        st.session_state.cart_index[product['id']] = cart_item
+
+    add_to_cart(product['id'], product['name'], product['price'], st.session_state['usuario']['uid'])
+    # La recomendación se genera en segundo plano y aparece al terminar
+    st.session_state.recomendacion_activa = False
+    solicitar_recomendacion(product)
+
+    # Los callbacks no dibujan elementos: el aviso lo muestra el carrito
+    st.session_state.ultimo_agregado = product['name']
+    st.rerun(["carrito"])
+
+@st.fragment(key="carrito")
+@instrumentado("catalogo.carrito")
+def mostrar_carrito():
+    """Carrito de la barra lateral; se vuelve a ejecutar sin recargar la página"""
+    st.markdown("### 🛒 Carrito")
+
+    agregado = st.session_state.pop('ultimo_agregado', None)
+    if agregado:
+        st.success(f"✅ {agregado} agregado al carrito!")
+
+    # Mostrar recomendación solo si está activa; mientras se genera, el
+    # fragmento anidado se vuelve a ejecutar cada segundo. Al volver a
+    # ejecutarse el carrito sin recomendación pendiente, Streamlit detiene
+    # ese sondeo.
+    sondeando = 'recomendacion_pendiente' in st.session_state
+    st.fragment(run_every=1 if sondeando else None)(mostrar_recomendacion)()
     
     # Lógica para mostrar los items del carrito y el total
     if st.session_state.cart:
@@ -413,9 +472,8 @@ with st.sidebar:
                 </div>
                 """, unsafe_allow_html=True)
             with col2:
-                if st.button("🗑️", key=f"remove_{item['name']}"):
-                    remove_from_cart(item['name'], st.session_state['usuario']['uid'])
-                    st.rerun()
+                st.button("🗑️", key=f"remove_{item['product_id']}",
+                          on_click=quitar_del_carrito, args=(item['product_id'],))
             total += item['price'] * item['quantity']
         
         st.session_state.total = total
@@ -423,21 +481,17 @@ with st.sidebar:
 
         st.markdown("---")
 
-        #st.sidebar.markdown(f"**Total: ${total:.2f}**")
-
         # Este es el único botón de pago que debes tener
-        if st.sidebar.button("✅ Pagar con PayPal", key="process_order_paypal"):
+        if st.button("✅ Pagar con PayPal", key="process_order_paypal"):
             with st.spinner("Redirigiendo a PayPal..."):
-                # So we need to call it and get the `approval_url` from the response.
                 payment = create_paypal_payment(st.session_state.cart,st.session_state['usuario']['uid'])
-               #approval_url = create_paypal_payment(st.session_state.cart, st.session_state['usuario']['uid'])
 
-                if payment and payment.success():
-                    approval_url = next((link.href for link in payment.links if link.rel == "approval_url"), None)
+                if payment:
+                    approval_url = url_aprobacion(payment)
                     
                     if approval_url:
-                        # Guardar el payment_id y el usuario en Firestore
-                        save_paypal_payment_and_user_data(payment.id, st.session_state.usuario['uid'])
+                        # Guardar el payment_id y el usuario (checkout completo)
+                        save_paypal_payment_and_user_data(payment['id'], st.session_state.usuario, st.session_state.cart)
                         
                         # Redirigir al usuario a PayPal
                         st.markdown(
@@ -450,86 +504,121 @@ with st.sidebar:
                     
                 else:
                     st.error("No se pudo crear la sesión de pago con PayPal. Por favor, inténtalo de nuevo.")
-                    st.rerun()
-        # Botón para vaciar carrito (movido para evitar duplicidad)
-        #if st.button("🗑️ Vaciar Carrito", key="vaciar_carrito"):
-            #st.session_state.cart = []
-            # Lógica para limpiar el carrito en Firestore (opcional, pero recomendado)
-            #cart_ref = st.session_state.db.collection('carts').document(st.session_state['usuario']['uid'])
-            #cart_ref.delete()
-            #st.experimental_rerun()
     else:
-        st.sidebar.info("Tu carrito está vacío")
+        st.info("Tu carrito está vacío")
+
+@st.fragment(key="catalogo")
+@instrumentado("catalogo.grilla")
+def mostrar_grilla(grid):
+    """Grilla de productos; "Cargar más" solo vuelve a ejecutar este fragmento"""
+    products = grid['productos']
+
+    if not products:
+        st.info("No se encontraron productos en esta categoría.")
+        return
+
+    # Una fila = un bloque HTML con sus tarjetas + una fila de botones;
+    # el markup de la página se arma en una sola pasada
+    for fila, fila_markup in zip(filas(products), grilla_html(products, src_imagen=miniaturas.src)):
+        st.markdown(fila_markup, unsafe_allow_html=True)
+        cols = st.columns(COLUMNAS)
+        for col, product in zip(cols, fila):
+            with col:
+                st.button(f"🛒 Agregar al Carrito", key=f"add_{product['id']}", width="stretch",
+                          on_click=agregar_al_carrito, args=(product,))
+
+    # Cargar la siguiente página solo cuando el usuario la pide
+    if grid['cursor'] is not None:
+        st.button("⬇️ Cargar más productos", key="cargar_mas",
+                  on_click=cargar_siguiente_pagina, args=(grid,))
+
+    
+# --- LÓGICA PRINCIPAL DE LA PÁGINA ---
+st.markdown('<div class="main-header"><h1>🛍️ Megamoda Store</h1><p>Bienvenido/a a tu tienda de moda</p></div>', unsafe_allow_html=True)
+
+# Sidebar con información del usuario y carrito
+with st.sidebar:
+    st.markdown(f"### 👤 {st.session_state['usuario']['nombre']}")
+    
+    if st.button("🚪 Cerrar Sesión"):
+        st.session_state.clear()
+        st.rerun()
+    
+    st.markdown("---")
+    
+    # Carrito de compras
+    # Lógica para cargar el carrito desde Firestore una vez por sesión
+    if 'cart_loaded' not in st.session_state or not st.session_state.cart_loaded:
+        if st.session_state.get('usuario') and st.session_state['usuario'].get('uid'):
+            set_cart(get_cart(st.session_state['usuario']['uid']))
+            st.session_state.cart_loaded = True
+        else:
+            set_cart([])
+            st.session_state.cart_loaded = True
+
+    # Los cambios del carrito solo vuelven a ejecutar este fragmento
+    mostrar_carrito()
     
     
 # Contenido principal - Catálogo de productos
 st.markdown("## 🛍️ Catálogo de Productos")
 
 # Filtros
+NOMBRES_ORDEN = {
+    'relevancia': "Relevancia",
+    'precio_asc': "Precio: menor a mayor",
+    'precio_desc': "Precio: mayor a menor",
+}
 col1, col2 = st.columns([1, 3])
 with col1:
     categories = ["todos", "vestidos", "blusas", "pantalones", "chaquetas", "calzado", "accesorios",
                   "camisetas"]
     selected_category = st.selectbox("Categoría", categories)
-
-# Obtener productos
-products = get_products()
-
-# Filtrar por categoría
-if selected_category != "todos":
-    products = [p for p in products if p.get('category') == selected_category]
-
-# Mostrar productos en grid
-if products:
-    # Crear grid de productos
-    cols = st.columns(3)
-    
-    for idx, product in enumerate(products):
-        with cols[idx % 3]:
-            st.markdown(f"""
-            <div class="product-card">
-                <img src="{product['image']}" style="width: 100%; height: 200px; object-fit: cover; border-radius: 10px;">
-                <h3 style="margin: 1rem 0 0.5rem 0; color: #333;">{product['name']}</h3>
-                <p style="color: #666; margin-bottom: 1rem;">{product['description']}</p>
-                <div class="price-tag">${product['price']:.2f}</div>
-                <p style="color: #999; font-size: 0.9rem;">Stock: {product['stock']} unidades</p>
-            </div>
-            """, unsafe_allow_html=True)
-            
-            col4, col5, col6 = st.columns([0.5,2,0.5])
-            with col5:
-                if st.button(f"🛒 Agregar al Carrito", key=f"add_{product.get('id', idx)}"):
-                    # Agregar al carrito en memoria (para demo)
-                    cart_item = {
-                        'product_id': product.get('id', None),
-                        'name': product['name'],
-                        'price': product['price'],
-                        'quantity': 1,
-                        'image': product['image']
-                    }
-                    
-                    # Verificar si ya existe en el carrito
-                    existing_item = next((item for item in st.session_state.cart if item['name'] == product['name']), None)
-                    if existing_item:
-                        existing_item['quantity'] += 1
-                    else:
-                        st.session_state.cart.append(cart_item)
-                    
-                    
-                    add_to_cart(product['id'], product['name'], product['price'], st.session_state['usuario']['uid'])
-                    # Generar recomendación solo si aún no está en el carrito
-                    all_products = get_products()
-                    st.session_state.recomendacion = generar_recomendacion(product, all_products)
-                    st.session_state.recomendacion_activa = True
-                    
-                    st.success(f"✅ {product['name']} agregado al carrito!")
-
-                    st.rerun()
-  
-
-   
-else:
-    st.info("No se encontraron productos en esta categoría.")
+with col2:
+    texto_busqueda = st.text_input("🔍 Buscar", placeholder="Ej: vestido negro, zapatillas...")
+
+# Facetas de la búsqueda: rango de precios del catálogo indexado
+get_products()
+indice.sincronizar(catalogo)
+precio_min, precio_max = indice.rango_precios()
+precio_min, precio_max = float(math.floor(precio_min)), float(math.ceil(precio_max))
+with st.expander("Filtros y orden"):
+    col1, col2, col3 = st.columns([2, 1, 1])
+    with col1:
+        if precio_max > precio_min:
+            rango_precio = st.slider("Precio", precio_min, precio_max, (precio_min, precio_max), step=1.0)
+        else:
+            rango_precio = (precio_min, precio_max)
+    with col2:
+        # Como la grilla por defecto (solo productos con stock)
+        solo_stock = st.checkbox("Solo con stock", value=True)
+    with col3:
+        orden = st.selectbox("Ordenar por", ORDENES, format_func=NOMBRES_ORDEN.get)
+
+busqueda = None
+if texto_busqueda.strip() or rango_precio != (precio_min, precio_max) or not solo_stock or orden != ORDENES[0]:
+    busqueda = {
+        'texto': texto_busqueda,
+        'precio_min': rango_precio[0] if rango_precio[0] > precio_min else None,
+        'precio_max': rango_precio[1] if rango_precio[1] < precio_max else None,
+        'solo_stock': solo_stock,
+        'orden': orden,
+    }
+
+# Obtener productos: la grilla se carga por páginas y se reinicia al cambiar
+# de categoría o de búsqueda
+grid = st.session_state.get('catalogo_grid')
+if not grid or grid['categoria'] != selected_category or grid.get('busqueda') != busqueda:
+    grid = {'categoria': selected_category, 'busqueda': busqueda, 'productos': [], 'cursor': None}
+    st.session_state.catalogo_grid = grid
+    cargar_siguiente_pagina(grid)
+
+if busqueda:
+    facetas = " · ".join(f"{categoria} ({cantidad})" for categoria, cantidad
+                         in sorted(grid.get('por_categoria', {}).items()))
+    st.caption(f"{grid.get('total', 0)} productos encontrados" + (f" — {facetas}" if facetas else ""))
+
+mostrar_grilla(grid)
 
 # Footer
 st.markdown("---")
@@ -540,5 +629,4 @@ st.markdown("""
 </div>
 """, unsafe_allow_html=True)
 
-
-
+finalizar_rerun()
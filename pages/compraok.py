@@ -1,64 +1,37 @@
 import streamlit as st
 #import stripe
-import paypalrestsdk
 import os
 from datetime import datetime
 import time
+from modules.pedidos import CarritoVacio
+from modules.recursos import leer_estilos, obtener_repositorio, obtener_paypal
+from modules.pagos_paypal import ErrorPayPal
+from modules.instrumentacion import iniciar_rerun, finalizar_rerun
+
+iniciar_rerun("compraok")
 
 # Verificar si el usuario está logueado
 if 'login' not in st.session_state:
     st.switch_page('app.py')
 
+# Repositorio de datos compartido por todas las sesiones (modules/repositorio.py)
+repo = obtener_repositorio()
+
 # Configuración de Stripe
 #stripe.api_key = os.environ.get("STRIPE_SECRET_KEY")
 
-paypalrestsdk.configure({
-    "mode": "sandbox",
-    #"client_id": os.environ.get("PAYPAL_CLIENT_ID"),
-    #"client_secret": os.environ.get("PAYPAL_SECRET_KEY"),
-    "client_id": st.secrets["PAYPAL_CLIENT_ID"],
-    "client_secret": st.secrets["PAYPAL_SECRET_KEY"]
-})
+# Cliente de PayPal compartido por todas las sesiones (modules/recursos.py)
+paypal = obtener_paypal()
 
 # CSS personalizado para el diseño de lujo
-with open("estilos/css_compra.html", "r") as file:
-    html_content = file.read()
-st.markdown(html_content, unsafe_allow_html=True)
-
-def save_order_to_firestore(payment_id, user_id, items, total):
-    """Guarda la orden en Firestore"""
-    try:
-        order_data = {
-            'user_id': user_id,
-            'user_name': st.session_state['usuario']['nombre'],
-            'user_email': st.session_state['usuario']['email'],
-            'items': items,
-            'total': total,
-            'payment_id': payment_id,
-            'status': 'completed',
-            'created_at': datetime.now(),
-            'order_number': f"ORD-{int(time.time())}"
-        }
-        
-        # Guardar en la colección 'orders'
-        doc_ref = st.session_state.db.collection('orders').add(order_data)
-        
-        return order_data['order_number']
-        
-    except Exception as e:
-        st.error(f"Error al guardar la orden: {str(e)}")
-        return None
+st.markdown(leer_estilos("estilos/css_compra.html"), unsafe_allow_html=True)
 
-def clear_user_cart(user_id):
-    """Limpia el carrito del usuario después de la compra"""
-    try:
-        cart_ref = st.session_state.db.collection('carts').document(user_id)
-        cart_ref.delete()
-        # También limpiar carrito en session_state
-        st.session_state.cart = []
-        
-    except Exception as e:
-        st.error(f"Error al limpiar carrito: {str(e)}")
+def clear_session_cart():
+    """Limpia el carrito de la sesión después de la compra"""
+    st.session_state.cart = []
+    st.session_state.cart_index = {}
+    # El stock cambió: la grilla del catálogo se vuelve a cargar
+    st.session_state.pop('catalogo_grid', None)
 
 #def get_stripe_session_details(session_id):
     #"""Obtiene los detalles de la sesión de Stripe"""
@@ -69,57 +42,57 @@ def clear_user_cart(user_id):
         #st.error(f"Error al obtener detalles de Stripe: {str(e)}")
         #return None
 
-def update_product_stock(items):
-    """Actualiza el stock de los productos comprados"""
-    try:
-        for item in items:
-            # Buscar el producto por nombre (en un sistema real usarías ID)
-            products_ref = st.session_state.db.collection('products')
-            query = products_ref.where('name', '==', item['name'])
-            docs = query.stream()
-            
-            for doc in docs:
-                product_data = doc.to_dict()
-                new_stock = product_data.get('stock', 0) - item['quantity']
-                
-                # Actualizar stock
-                doc.reference.update({'stock': max(0, new_stock)})
-                
-    except Exception as e:
-        st.error(f"Error al actualizar stock: {str(e)}")
-        
 def execute_paypal_payment(payment_id, payer_id):
     """
     Ejecuta el pago con PayPal usando el payment_id y el payer_id
     """
     try:
-        payment = paypalrestsdk.Payment.find(payment_id)
-        if payment.execute({"payer_id": payer_id}):
-            st.success("✅ Pago exitoso con PayPal!")
+        payment = paypal.obtener_pago(payment_id)
+        # Ya ejecutado en un intento anterior: no se vuelve a cobrar
+        if payment.get('state') == "approved":
             return True
-        else:
-            st.error(f"❌ Error al ejecutar el pago: {payment.error['message']}")
-            return False
+        paypal.ejecutar_pago(payment_id, payer_id)
+        st.success("✅ Pago exitoso con PayPal!")
+        return True
+    except ErrorPayPal as e:
+        st.error(f"❌ Error al ejecutar el pago: {str(e)}")
+        return False
     except Exception as e:
         st.error(f"Error de conexión con PayPal: {str(e)}")
         return False
 
-def get_cart_from_firestore(user_id):
-    """Obtiene el carrito desde Firestore para el usuario actual"""
+def finalizar_compra(payment_id, payer_id):
+    """Confirma el pago y registra la orden una sola vez por payment_id.
+
+    Los reruns de la página reutilizan el resultado guardado en la sesión;
+    si la orden ya existe en la base no se vuelve a llamar a PayPal. El
+    checkout leído en app.py indica si el pago ya se completó, así en el
+    camino normal no hace falta consultar la orden antes de la transacción.
+    """
+    finalizados = st.session_state.setdefault('pedidos_finalizados', {})
+    if payment_id in finalizados:
+        return finalizados[payment_id]
+
+    checkout = st.session_state.get('paypal_checkout') or {}
+    pendiente = checkout.get('payment_id') == payment_id and checkout.get('status') == 'pending'
     try:
-        # Primero intentar desde la colección 'carts'
-        cart_ref = st.session_state.db.collection('carts').document(user_id)
-        cart_doc = cart_ref.get()
-        
-        if cart_doc.exists:
-            cart_data = cart_doc.to_dict()
-            return cart_data.get('items', [])
-        else:
-            return []
-            
+        pedido = None
+        if not pendiente:
+            pedido = repo.obtener_pedido(payment_id)
+        if pedido is None:
+            if not execute_paypal_payment(payment_id, payer_id):
+                return None
+            pedido = repo.finalizar_pedido(payment_id, st.session_state['usuario'])
+
+    except CarritoVacio:
+        st.error("❌ No se pudieron recuperar los productos del carrito.")
+        return None
     except Exception as e:
-        st.error(f"Error al obtener carrito de Firestore: {str(e)}")
-        return []
+        st.error(f"Error al guardar la orden: {str(e)}")
+        return None
+
+    finalizados[payment_id] = pedido
+    return pedido
 
 # --- LÓGICA PRINCIPAL ---
 st.markdown('''
@@ -140,24 +113,16 @@ if not payment_id or not payer_id:
         st.switch_page('pages/catalogo.py')
     st.stop()
 
-# Si tenemos los IDs, ejecutamos el pago
+# Si tenemos los IDs, ejecutamos el pago y registramos la orden (una sola vez)
 with st.spinner('Confirmando el pago con PayPal...'):
-    payment_successful = execute_paypal_payment(payment_id, payer_id)
-    if not payment_successful:
+    pedido = finalizar_compra(payment_id, payer_id)
+    if not pedido:
         st.error("❌ El pago no pudo ser confirmado. Por favor, inténtalo de nuevo.")
         if st.button("🔙 Volver al Catálogo"):
             st.switch_page('pages/catalogo.py')
         st.stop()
-        
-    # Obtener el carrito desde Firestore
-    items_to_save = get_cart_from_firestore(st.session_state['usuario']['uid'])
-    if not items_to_save:
-        st.error("❌ No se pudieron recuperar los productos del carrito.")
-        if st.button("🔙 Volver al Catálogo"):
-            st.switch_page('pages/catalogo.py')
-        st.stop()
-    # Mantener sincronizado session_state
-    st.session_state.cart = items_to_save
+
+    items_to_save = pedido['items']
 
     # Restaurar el carrito del usuario desde Firestore
     #if not st.session_state.get('cart') or len(st.session_state.cart) == 0:
@@ -251,28 +216,18 @@ for item in items_to_save:
 st.markdown(products_html, unsafe_allow_html=True)
 st.markdown(f'<div class="total-amount">Total: ${total:.2f}</div>', unsafe_allow_html=True)
 
-# Guardar orden en Firestore
-order_number = save_order_to_firestore(
-    payment_id, 
-    st.session_state['usuario']['uid'], 
-    items_to_save, 
-    total
-)
+# La orden, el stock y el carrito ya se guardaron juntos en Firestore
+st.success(f"📝 Número de orden: {pedido['order_number']}")
 
-if order_number:
-    st.success(f"📝 Número de orden: {order_number}")
-    
-    # Actualizar stock de productos
-    update_product_stock(items_to_save)
+for faltante in pedido.get('faltantes', []):
+    st.warning(f"Stock insuficiente de {faltante['name']}: se pidieron {faltante['pedido']}, "
+               f"había {faltante['disponible']}.")
 
-    # Limpiar carrito después de guardar la orden
-    clear_user_cart(st.session_state['usuario']['uid'])
+# Limpiar carrito de la sesión
+clear_session_cart()
 
-    # Mostrar mensaje de confirmación
-    st.info("📧 Se ha enviado un email de confirmación a tu dirección de correo.")
-    
-else:
-    st.error("❌ Hubo un problema al guardar la orden. Por favor, contacta al soporte.")
+# Mostrar mensaje de confirmación
+st.info("📧 Se ha enviado un email de confirmación a tu dirección de correo.")
 
 
 # Botón para continuar comprando
@@ -291,4 +246,6 @@ st.markdown("""
 <div style="text-align: center; padding: 1rem;">
     <p>🛍️ Fashion Store - Gracias por confiar en nosotros</p>
 </div>
-""", unsafe_allow_html=True)
\ No newline at end of file
+""", unsafe_allow_html=True)
+
+finalizar_rerun()
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# Las pruebas importan los módulos de la tienda como en la aplicación (modules.x)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
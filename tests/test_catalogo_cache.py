@@ -0,0 +1,103 @@
+import threading
+
+from modules.catalogo_cache import CatalogoCache, calcular_huella
+
+
+def producto(product_id, stock=5, **datos):
+    return {'id': product_id, 'name': f'Producto {product_id}', 'description': 'algodón',
+            'category': 'ropa', 'price': 10.0, 'stock': stock, **datos}
+
+
+class RepoSinListener:
+    def __init__(self, productos):
+        self.productos = productos
+        self.lecturas = 0
+
+    def listar_productos(self):
+        self.lecturas += 1
+        return [dict(p) for p in self.productos]
+
+    def escuchar_productos(self, callback):
+        return None
+
+
+class Suscripcion:
+    is_active = True
+
+    def unsubscribe(self):
+        self.is_active = False
+
+
+class RepoConListener(RepoSinListener):
+    """Como Firestore: la primera llamada, desde otro hilo, trae todo el catálogo"""
+
+    def escuchar_productos(self, callback):
+        self.callback = callback
+        threading.Thread(target=callback, args=(self.listar_productos(), ())).start()
+        return Suscripcion()
+
+
+def test_huella_igual_a_calcular_huella_y_sin_orden():
+    productos = [producto('a'), producto('b'), producto('c')]
+    cache = CatalogoCache()
+    cache.obtener(RepoSinListener(productos))
+    assert cache.huella == calcular_huella(productos) == calcular_huella(productos[::-1])
+
+
+def test_huella_ignora_precio_y_unidades_pero_no_quedarse_sin_stock():
+    base = calcular_huella([producto('a', stock=5), producto('b')])
+    assert calcular_huella([producto('a', stock=2, price=99.0), producto('b')]) == base
+    assert calcular_huella([producto('a', stock=0), producto('b')]) != base
+    assert calcular_huella([producto('a', name='Otro nombre'), producto('b')]) != base
+
+
+def test_listener_aplica_solo_los_cambios():
+    repo = RepoConListener([producto('a'), producto('b')])
+    cache = CatalogoCache()
+    productos = cache.obtener(repo)
+    assert {p['id'] for p in productos} == {'a', 'b'}
+    version, huella = cache.version, cache.huella
+
+    repo.callback([producto('a', stock=3)], ['b'])
+    assert cache.version == version + 1
+    assert {p['id'] for p in cache.obtener(repo)} == {'a'}
+    assert cache.huella == calcular_huella([producto('a')]) != huella
+    # Con el listener activo no se vuelve a leer la colección
+    assert repo.lecturas == 1
+
+
+def test_listener_ignora_productos_sin_cambios():
+    repo = RepoConListener([producto('a')])
+    cache = CatalogoCache()
+    cache.obtener(repo)
+    version = cache.version
+    repo.callback([producto('a')], [])
+    assert cache.version == version
+
+
+def test_cambios_para_devuelve_lo_cambiado_desde_una_version():
+    repo = RepoConListener([producto('a'), producto('b'), producto('c')])
+    cache = CatalogoCache()
+    cache.obtener(repo)
+    inicial = cache.version
+
+    repo.callback([producto('a', stock=1)], [])
+    repo.callback([producto('d')], ['b'])
+
+    version, productos, cambios = cache.cambios_para(inicial)
+    assert version == cache.version == inicial + 2
+    assert {p['id'] for p in productos} == {'a', 'c', 'd'}
+    assert cambios == {'a': producto('a', stock=1), 'b': None, 'd': producto('d')}
+
+    assert cache.cambios_para(version)[2] == {}
+    # Sin versión previa (o demasiado vieja) hay que reconstruir todo
+    assert cache.cambios_para(None)[2] is None
+    assert cache.cambios_para(-100)[2] is None
+
+
+def test_sin_listener_lee_la_coleccion_y_recarga_al_vencer_el_ttl():
+    repo = RepoSinListener([producto('a')])
+    cache = CatalogoCache(ttl=0)
+    cache.obtener(repo)
+    cache.obtener(repo)
+    assert repo.lecturas == 2
@@ -0,0 +1,110 @@
+import threading
+import time
+
+import pytest
+
+from modules.limitador import CuboTokens, LimiteExcedido, Limitador, SingleFlight
+
+
+@pytest.mark.parametrize("tasa", [0, -1])
+def test_cubo_rechaza_tasa_no_positiva(tasa):
+    with pytest.raises(ValueError):
+        CuboTokens(tasa)
+
+
+def test_cubo_rechaza_capacidad_menor_que_uno():
+    with pytest.raises(ValueError):
+        CuboTokens(1, capacidad=0.5)
+
+
+def test_cubo_admite_la_rafaga_y_despues_espera_la_recarga():
+    cubo = CuboTokens(tasa=20, capacidad=3)
+    assert all(cubo.adquirir(timeout=0) for _ in range(3))
+    assert not cubo.adquirir(timeout=0)
+    inicio = time.monotonic()
+    assert cubo.adquirir(timeout=1)
+    # Un token se recarga en 1/20 s
+    assert 0.02 < time.monotonic() - inicio < 0.5
+
+
+def test_cubo_con_cola_llena_no_espera():
+    cubo = CuboTokens(tasa=0.1, capacidad=1, max_cola=1)
+    assert cubo.adquirir(timeout=0)
+    esperando = threading.Thread(target=cubo.adquirir, kwargs={'timeout': 0.5})
+    esperando.start()
+    time.sleep(0.05)
+    inicio = time.monotonic()
+    assert not cubo.adquirir(timeout=5)
+    assert time.monotonic() - inicio < 0.1
+    esperando.join()
+
+
+def test_limitador_valida_sus_parametros():
+    with pytest.raises(ValueError):
+        Limitador(por_minuto=0)
+    with pytest.raises(ValueError):
+        Limitador(concurrencia=0)
+
+
+def test_limitador_rechaza_cuando_no_hay_cupo_de_concurrencia():
+    limitador = Limitador(por_minuto=6000, rafaga=10, concurrencia=1, espera_max=0.05)
+    with limitador.turno():
+        with pytest.raises(LimiteExcedido):
+            limitador.entrar()
+    assert limitador.estadisticas()['rechazadas'] == 1
+    # Al salir el cupo se libera
+    with limitador.turno():
+        pass
+
+
+def test_single_flight_ejecuta_una_vez_por_clave():
+    vuelos = SingleFlight()
+    llamadas = []
+    liberar = threading.Event()
+
+    def lenta():
+        llamadas.append(1)
+        liberar.wait(2)
+        return 'resultado'
+
+    resultados = []
+    hilos = [threading.Thread(target=lambda: resultados.append(vuelos.ejecutar('k', lenta))) for _ in range(5)]
+    for hilo in hilos:
+        hilo.start()
+    time.sleep(0.1)
+    liberar.set()
+    for hilo in hilos:
+        hilo.join()
+
+    assert resultados == ['resultado'] * 5
+    assert len(llamadas) == 1
+    assert vuelos.estadisticas() == {'ejecutadas': 1, 'compartidas': 4, 'en_curso': 0}
+
+
+def test_single_flight_comparte_la_excepcion_y_libera_la_clave():
+    vuelos = SingleFlight()
+    liberar = threading.Event()
+
+    def falla():
+        liberar.wait(2)
+        raise RuntimeError("sin servicio")
+
+    errores = []
+
+    def llamar():
+        try:
+            vuelos.ejecutar('k', falla)
+        except RuntimeError as e:
+            errores.append(str(e))
+
+    hilos = [threading.Thread(target=llamar) for _ in range(3)]
+    for hilo in hilos:
+        hilo.start()
+    time.sleep(0.1)
+    liberar.set()
+    for hilo in hilos:
+        hilo.join()
+
+    assert errores == ["sin servicio"] * 3
+    # No es una caché: la próxima llamada vuelve a ejecutar
+    assert vuelos.ejecutar('k', lambda: 'otra vez') == 'otra vez'
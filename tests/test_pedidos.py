@@ -0,0 +1,55 @@
+import pytest
+
+from benchmarks.firestore_falso import FirestoreFalso
+from modules import pedidos
+
+USUARIO = {'uid': 'u1', 'nombre': 'Ana', 'email': 'ana@example.com'}
+
+
+@pytest.fixture
+def db():
+    db = FirestoreFalso()
+    db.cargar('products', [
+        ('p1', {'name': 'Camisa', 'price': 10.0, 'stock': 5}),
+        ('p2', {'name': 'Zapato', 'price': 30.0, 'stock': 1}),
+    ])
+    db.cargar('carts', [('u1', {'user_id': 'u1', 'items': {}})])
+    return db
+
+
+def items(*cantidades):
+    nombres = {'p1': ('Camisa', 10.0), 'p2': ('Zapato', 30.0)}
+    return [{'product_id': pid, 'name': nombres[pid][0], 'price': nombres[pid][1], 'quantity': n}
+            for pid, n in cantidades]
+
+
+def test_finalizar_dos_veces_registra_una_sola_orden(db):
+    pedidos.guardar_checkout(db, 'PAY-1', USUARIO, items(('p1', 2), ('p2', 1)))
+
+    primera = pedidos.finalizar_pedido(db, 'PAY-1', USUARIO)
+    escrituras = db.contadores.escrituras
+    segunda = pedidos.finalizar_pedido(db, 'PAY-1', USUARIO)
+
+    assert segunda['order_number'] == primera['order_number']
+    assert primera['total'] == 50.0
+    assert list(db.datos('orders')) == ['PAY-1']
+    # El segundo intento no escribe nada ni vuelve a descontar stock
+    assert db.contadores.escrituras == escrituras
+    stock = {pid: datos['stock'] for pid, datos in db.datos('products').items()}
+    assert stock == {'p1': 3, 'p2': 0}
+    assert 'u1' not in db.datos('carts')
+    pago = db.datos('paypal_payments')['PAY-1']
+    assert pago['status'] == 'completed' and pago['order_number'] == primera['order_number']
+
+
+def test_finalizar_anota_los_faltantes_sin_stock_negativo(db):
+    pedidos.guardar_checkout(db, 'PAY-2', USUARIO, items(('p2', 3)))
+    orden = pedidos.finalizar_pedido(db, 'PAY-2', USUARIO)
+    assert orden['faltantes']
+    assert db.datos('products')['p2']['stock'] == 0
+
+
+def test_finalizar_sin_items_lanza_carrito_vacio(db):
+    with pytest.raises(pedidos.CarritoVacio):
+        pedidos.finalizar_pedido(db, 'PAY-3', USUARIO)
+    assert db.datos('orders') == {}
@@ -0,0 +1,44 @@
+import pytest
+
+from modules.render_catalogo import METACARACTERES_MARKDOWN, tarjeta_html, texto_html
+
+
+def test_texto_html_escapa_html():
+    assert texto_html('<script>alert("x")</script> & \'') == (
+        '&lt;script&gt;alert&#40;&quot;x&quot;&#41;&lt;/script&gt; &amp; &#x27;'
+    )
+
+
+@pytest.mark.parametrize("caracter", list(METACARACTERES_MARKDOWN))
+def test_texto_html_neutraliza_cada_metacaracter_de_markdown(caracter):
+    assert texto_html(f"a{caracter}b") == f"a&#{ord(caracter)};b"
+
+
+def test_texto_html_no_escapa_dos_veces():
+    # El & de las entidades generadas no vuelve a escaparse
+    assert texto_html("&lt;") == "&amp;lt;"
+    assert texto_html("$") == "&#36;"
+
+
+def test_texto_html_une_las_lineas():
+    # Una línea en blanco cerraría el bloque HTML de st.markdown
+    assert texto_html("uno\n\n  dos\ttres ") == "uno dos tres"
+
+
+def test_tarjeta_sin_markdown_ni_html_del_producto():
+    html = tarjeta_html({
+        'name': '**Oferta** [clic](http://x)',
+        'description': 'Vale $10 y $20\n\n<img src=x onerror=alert(1)>',
+        'price': 12.5,
+        'stock': 3,
+        'image': 'https://ejemplo.com/a.jpg?x=1&y="2"',
+    })
+    for texto in ('**', '[clic]', '(http', '$10', '<img src=x', '\n\n'):
+        assert texto not in html
+    assert 'src="https://ejemplo.com/a.jpg?x=1&amp;y=&quot;2&quot;"' in html
+    assert '&#36;12.50' in html
+
+
+def test_tarjeta_usa_el_src_de_la_miniatura():
+    html = tarjeta_html({'name': 'a', 'image': 'orig.jpg'}, src_imagen=lambda url: f"mini/{url}")
+    assert 'src="mini/orig.jpg"' in html
@@ -0,0 +1,63 @@
+import threading
+
+import pytest
+
+from modules.repositorio import Repositorio, crear_repositorio
+
+PRODUCTOS = {
+    'p1': {'name': 'Camisa', 'description': 'algodón', 'category': 'ropa', 'price': 10.0, 'stock': 5},
+    'p2': {'name': 'Zapato', 'description': 'cuero', 'category': 'calzado', 'price': 30.0, 'stock': 1},
+}
+USUARIO = {'uid': 'u1', 'nombre': 'Ana', 'email': 'ana@example.com'}
+
+
+@pytest.fixture(params=['memoria', 'sqlite'])
+def repo(request, tmp_path):
+    repo = crear_repositorio(request.param, ruta=str(tmp_path / 'tienda.db'))
+    repo.cargar('products', PRODUCTOS)
+    return repo
+
+
+def test_repositorio_es_abstracto():
+    with pytest.raises(TypeError):
+        Repositorio()
+
+
+def test_finalizar_pedido_una_sola_vez(repo):
+    repo.agregar_item('u1', 'p1', 'Camisa', 10.0, cantidad=2)
+    repo.guardar_checkout('PAY-1', USUARIO, repo.leer_carrito('u1'))
+
+    primera = repo.finalizar_pedido('PAY-1', USUARIO)
+    segunda = repo.finalizar_pedido('PAY-1', USUARIO)
+
+    assert segunda['order_number'] == primera['order_number']
+    assert {p['id']: p['stock'] for p in repo.listar_productos()} == {'p1': 3, 'p2': 1}
+    assert repo.leer_carrito('u1') == []
+
+
+def test_el_listener_recibe_solo_los_productos_cambiados(repo):
+    avisos = []
+    primer_aviso = threading.Event()
+
+    def callback(cambiados, borrados):
+        avisos.append(({p['id']: p['stock'] for p in cambiados}, list(borrados)))
+        primer_aviso.set()
+
+    suscripcion = repo.escuchar_productos(callback)
+    assert primer_aviso.wait(2)
+    repo.registrar_pedido('u1', {'items': [
+        {'product_id': 'p2', 'name': 'Zapato', 'price': 30.0, 'quantity': 1},
+    ]})
+    suscripcion.unsubscribe()
+    repo.cargar('products', {'p3': {'name': 'Gorra', 'stock': 1}})
+
+    assert avisos == [({'p1': 5, 'p2': 1}, []), ({'p2': 0}, [])]
+
+
+def test_recomendaciones_guardadas(repo):
+    repo.guardar_recomendaciones({'p1': {'texto': 'Lleva el zapato', 'recomendado_id': 'p2'}})
+    assert repo.recomendacion_precalculada('p1') == 'Lleva el zapato'
+    assert repo.recomendacion_precalculada('p1', excluir=['p2']) is None
+
+    repo.guardar_recomendaciones({}, borrar=['p1'])
+    assert repo.recomendaciones_guardadas() == {}